@@ -1,4 +1,6 @@
 from medihelp.system import System
+from medihelp.watcher import FileWatcher
+from medihelp.dose_log import DoseLog
 from medihelp.gui.gui import GUI
 from medihelp.errors import DataLoadingError
 from tkinter import messagebox
@@ -16,7 +18,15 @@ def main():
     # Load medicine database from data/medicines.csv on default
     system.load_medicines_database_from('data/medicines.csv')
 
-    GUI(system)
+    # Every dose taken in the application is recorded in data/doses.log
+    try:
+        system.set_dose_log(DoseLog('data/doses.log'))
+    except OSError as e:
+        messagebox.showwarning(title="Uwaga!",
+                               message=f"Nie można otworzyć historii przyjętych dawek, dawki nie będą zapisywane:\n{e}")
+
+    # Picks up changes of the data files made by other programs (e.g. the command line interface)
+    GUI(system, FileWatcher(system))
 
 
 if __name__ == '__main__':
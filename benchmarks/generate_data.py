@@ -0,0 +1,162 @@
+'''
+Generator of realistic data files (medicines.csv and users.json) for benchmarks.
+
+Medicines and users are drawn from pools of real medicine names, manufacturers, substances and illnesses
+with a seeded random generator, so the same arguments always give the same data
+(byte-identical files also need a fixed PYTHONHASHSEED, which decides the order of names in sets).
+Files are written with MedicinesDatabase and UsersDatabase, so they have exactly the format of the application.
+
+    python benchmarks/generate_data.py --medicines 100000 --users 300 --prescriptions 30 --output-dir /tmp/medihelp
+'''
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from medihelp.medicines_database import MedicinesDatabase  # noqa: E402
+from medihelp.users_database import UsersDatabase  # noqa: E402
+from medihelp.medicine import Medicine  # noqa: E402
+from medihelp.prescription import Prescription  # noqa: E402
+from medihelp.user import User  # noqa: E402
+from datetime import date, timedelta  # noqa: E402
+import argparse  # noqa: E402
+import json  # noqa: E402
+import random  # noqa: E402
+import time  # noqa: E402
+
+
+NAMES = ['Apap', 'Ibuprom', 'Nurofen', 'Paracetamol', 'Polopiryna', 'Rutinoscorbin', 'Magnez', 'Witamina C',
+         'Witamina D3', 'Stoperan', 'Xylometazolin', 'Amotaks', 'Euthyrox', 'Metformax', 'Bisocard', 'Polprazol',
+         'Controloc', 'Zyrtec', 'Claritine', 'Ketonal', 'Nimesil', 'Gripex', 'Theraflu', 'Acc', 'Mucosolvan',
+         'Sinupret', 'Espumisan', 'Smecta', 'Loperamid', 'Aspirin', 'Etopiryna', 'Diclac', 'Voltaren', 'Tantum',
+         'Strepsils', 'Neosine', 'Acard', 'Atoris', 'Polocard', 'Prestarium']
+
+SUFFIXES = ['', '', '', ' Forte', ' Max', ' Junior', ' Extra', ' Duo']
+
+MANUFACTURERS = ['Polpharma', 'Adamed', 'Hasco-Lek', 'Bayer', 'Sandoz', 'Teva', 'Krka', 'Aflofarm',
+                 'Polfa', 'Usp Zdrowie', 'Gedeon Richter', 'Servier', 'Berlin-Chemie', 'Zentiva']
+
+ACTIVE_SUBSTANCES = ['paracetamolum', 'ibuprofenum', 'kwas acetylosalicylowy', 'metforminum', 'bisoprololum',
+                     'pantoprazolum', 'cetyryzyna', 'loratadyna', 'ketoprofenum', 'nimesulidum', 'diklofenak',
+                     'ambroksol', 'acetylocysteina', 'loperamid', 'symetykon', 'lewotyroksyna', 'atorwastatyna',
+                     'perindopryl', 'amoksycylina', 'kwas askorbinowy', 'cholekalcyferol', 'magnezu cytrynian',
+                     'ksylometazolina', 'pseudoefedryna', 'inozyna pranobeks']
+
+EXCIPIENTS = ['skrobia kukurydziana', 'laktoza jednowodna', 'celuloza mikrokrystaliczna', 'magnezu stearynian',
+              'krzemionka koloidalna', 'powidon k30', 'kroskarmeloza sodowa', 'talk', 'tytanu dwutlenek',
+              'hypromeloza', 'makrogol 4000', 'sacharoza', 'aspartam', 'kwas stearynowy']
+
+ILLNESSES = ['ból głowy', 'gorączka', 'przeziębienie', 'grypa', 'kaszel', 'katar', 'ból gardła', 'alergia',
+             'nadciśnienie', 'cukrzyca', 'niedoczynność tarczycy', 'refluks', 'biegunka', 'wzdęcia', 'ból mięśni',
+             'ból stawów', 'zapalenie zatok', 'infekcja bakteryjna', 'niedobór magnezu', 'hipercholesterolemia']
+
+RECOMMENDED_AGES = [0, 0, 3, 6, 12, 12, 16, 18]
+
+NOTES = ['Brać po jedzeniu', 'Pomaga szybko', 'Nie działa na mnie', 'Kupić nowe opakowanie',
+         'Lekarz zalecił 2 razy dziennie', 'Trzymać w lodówce']
+
+
+def generate_users(count: int, prescriptions: int, random_generator: random.Random):
+    '''
+    :param count: Number of users
+    :param prescriptions: Average number of prescriptions of a user
+    :rtype: list[User]
+    '''
+    today = date.today()
+    users = []
+    for id in range(count):
+        birth_date = today - timedelta(days=random_generator.randint(2 * 365, 90 * 365))
+        # Every tenth user is allergic to something
+        allergies = random_generator.sample(ACTIVE_SUBSTANCES, 1) if random_generator.random() < 0.1 else []
+        user_prescriptions = [
+            Prescription(number, medicine_name=random_generator.choice(NAMES),
+                         dosage=random_generator.randint(1, 3), weekday=random_generator.randint(1, 7))
+            for number in range(random_generator.randint(prescriptions // 2, prescriptions * 3 // 2))]
+        users.append(User(id, name=f'Użytkownik {id}', birth_date=birth_date,
+                          illnesses=random_generator.sample(ILLNESSES, random_generator.randint(0, 3)),
+                          allergies=allergies, prescriptions=user_prescriptions))
+    return users
+
+
+def generate_medicine(id: int, users: int, random_generator: random.Random):
+    today = date.today()
+    doses = random_generator.choice([10, 20, 28, 30, 50, 60, 100])
+    recipients = random_generator.sample(range(users), min(users, random_generator.randint(1, 3)))
+    notes = {}
+    if random_generator.random() < 0.05:
+        notes = {author_id: random_generator.choice(NOTES) for author_id in recipients[:2]}
+    name = random_generator.choice(NAMES)
+    suffix = random_generator.choice(SUFFIXES)
+    # Names can have at most 16 characters
+    if len(name + suffix) <= 16:
+        name += suffix
+    return Medicine(id, name=name,
+                    manufacturer=random_generator.choice(MANUFACTURERS),
+                    illnesses=random_generator.sample(ILLNESSES, random_generator.randint(1, 3)),
+                    substances=random_generator.sample(ACTIVE_SUBSTANCES, random_generator.randint(1, 2))
+                    + random_generator.sample(EXCIPIENTS, random_generator.randint(2, 5)),
+                    recommended_age=random_generator.choice(RECOMMENDED_AGES), doses=doses,
+                    doses_left=random_generator.randint(1, doses),
+                    # About a tenth of the medicines is expired
+                    expiration_date=today + timedelta(days=random_generator.randint(-200, 1800)),
+                    recipients=recipients, notes=notes)
+
+
+def generate(directory: str, medicines: int, users: int, prescriptions: int, seed: int = 0):
+    '''
+    Writes medicines.csv and users.json into the directory
+
+    :param directory: Existing directory for the files
+    :type directory: str
+    :param medicines: Number of medicines
+    :type medicines: int
+    :param users: Number of users
+    :type users: int
+    :param prescriptions: Average number of prescriptions of a user
+    :type prescriptions: int
+    :param seed: Seed of the random generator
+    :type seed: int
+
+    :return: Pair (path to medicines.csv, path to users.json)
+    :rtype: tuple[str, str]
+    '''
+    random_generator = random.Random(seed)
+    users_database = UsersDatabase()
+    for user in generate_users(users, prescriptions, random_generator):
+        users_database.add_user(user)
+    users_path = os.path.join(directory, 'users.json')
+    with open(users_path, 'w') as file:
+        users_database.write_to_file(file)
+
+    medicines_database = MedicinesDatabase()
+    for id in range(medicines):
+        medicines_database.add_medicine(generate_medicine(id, users, random_generator))
+    medicines_path = os.path.join(directory, 'medicines.csv')
+    with open(medicines_path, 'w') as file:
+        medicines_database.write_to_file(file)
+    return medicines_path, users_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--medicines', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=300)
+    parser.add_argument('--prescriptions', type=int, default=30, help='average number of prescriptions of a user')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output-dir', default='.')
+    arguments = parser.parse_args()
+
+    os.makedirs(arguments.output_dir, exist_ok=True)
+    start = time.perf_counter()
+    medicines_path, users_path = generate(arguments.output_dir, arguments.medicines, arguments.users,
+                                          arguments.prescriptions, arguments.seed)
+    print(json.dumps({
+        'medicines_path': medicines_path,
+        'users_path': users_path,
+        'medicines_mb': os.path.getsize(medicines_path) / 2 ** 20,
+        'users_mb': os.path.getsize(users_path) / 2 ** 20,
+        'seconds': time.perf_counter() - start,
+    }, indent=4))
+
+
+if __name__ == '__main__':
+    main()
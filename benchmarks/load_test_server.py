@@ -0,0 +1,113 @@
+'''
+Load test of the Medihelp JSON API server (medihelp.server).
+
+Starts a server with a generated in-memory database on a free port (or uses --url of a running one),
+runs client threads which send a mix of reads and dose-taking requests over persistent connections
+and reports requests per second and latency percentiles.
+
+    python benchmarks/load_test_server.py --clients 8 --requests 2000
+'''
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from medihelp.server import MedihelpServer  # noqa: E402
+from medihelp.system import System  # noqa: E402
+from medihelp.user import User  # noqa: E402
+from datetime import date  # noqa: E402
+from urllib.parse import urlparse  # noqa: E402
+import argparse  # noqa: E402
+import http.client  # noqa: E402
+import json  # noqa: E402
+import random  # noqa: E402
+import tempfile  # noqa: E402
+import threading  # noqa: E402
+import time  # noqa: E402
+
+
+def create_system(medicines: int, users_file_path: str):
+    system = System(users_file_path=users_file_path)
+    system.users_database().add_user(User(0, name='Dad', birth_date=date(1982, 7, 12)))
+    for number in range(medicines):
+        system.add_medicine(name=f'Medicine {number % 1000}', manufacturer='polfarm',
+                            illnesses=['Illness1'], substances=['nicoTine'],
+                            recommended_age=0, doses=10 ** 6, doses_left=10 ** 6,
+                            expiration_date=date(2099, 12, 31), recipients=[0])
+    system.clear_history()
+    return system
+
+
+def client(host, port, requests, medicines, write_ratio, seed, latencies):
+    generator = random.Random(seed)
+    connection = http.client.HTTPConnection(host, port)
+    for _ in range(requests):
+        medicine_id = generator.randrange(medicines)
+        if generator.random() < write_ratio:
+            method, path, body = 'POST', f'/medicines/{medicine_id}/take_dose', json.dumps({'user_id': 0})
+        else:
+            method, path, body = 'GET', f'/medicines/{medicine_id}', None
+        start = time.perf_counter()
+        connection.request(method, path, body=body)
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        if response.status != 200:
+            raise RuntimeError(f'{method} {path} returned {response.status}')
+    connection.close()
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='URL of a running server (a local one is started if not given)')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=1000, help='Requests sent by every client')
+    parser.add_argument('--medicines', type=int, default=1000, help='Size of the generated database')
+    parser.add_argument('--write-ratio', type=float, default=0.1, help='Part of requests taking a dose')
+    parser.add_argument('--seed', type=int, default=0)
+    arguments = parser.parse_args(argv)
+
+    server = None
+    if arguments.url:
+        url = urlparse(arguments.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        directory = tempfile.mkdtemp()
+        system = create_system(arguments.medicines, os.path.join(directory, 'users.json'))
+        server = MedihelpServer(('127.0.0.1', 0), system)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address
+
+    latencies = []
+    threads = [threading.Thread(target=client, args=(host, port, arguments.requests, arguments.medicines,
+                                                     arguments.write_ratio, arguments.seed + number, latencies))
+               for number in range(arguments.clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if server:
+        server.shutdown()
+        server.server_close()
+
+    latencies.sort()
+    result = {
+        'clients': arguments.clients,
+        'requests': len(latencies),
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3),
+    }
+    print(json.dumps(result, indent=4))
+    return result
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+'''
+Benchmark of planned queries (medihelp.query) against hand-written loops over System.medicines().
+
+Generates a database of random medicines, runs every query with the planner and with a naive loop,
+checks that both give the same result and reports the times as JSON.
+
+    python benchmarks/query_planner.py --medicines 100000 --repeat 5
+'''
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from medihelp.query import Query, field, expired  # noqa: E402
+from medihelp.system import System  # noqa: E402
+from medihelp.medicine import Medicine  # noqa: E402
+from datetime import date, timedelta  # noqa: E402
+import argparse  # noqa: E402
+import json  # noqa: E402
+import random  # noqa: E402
+import time  # noqa: E402
+
+
+SUBSTANCES = [f'substance{number}' for number in range(2000)] + ['paracetamolum']
+
+
+def create_system(medicines: int, seed: int):
+    random_generator = random.Random(seed)
+    system = System()
+    today = date.today()
+    # Medicines are added to the database directly, System.add_medicine searches for a free ID every time
+    database = system.medicines_database()
+    for id in range(medicines):
+        doses = random_generator.randint(1, 100)
+        database.add_medicine(Medicine(
+            id, name=f'Medicine {random_generator.randrange(5000)}',
+            manufacturer=f'Maker {random_generator.randrange(200)}',
+            illnesses=[f'illness {random_generator.randrange(300)}'],
+            substances=random_generator.sample(SUBSTANCES, 3),
+            recommended_age=random_generator.randint(0, 18), doses=doses,
+            doses_left=random_generator.randint(1, doses),
+            expiration_date=today + timedelta(days=random_generator.randint(-1000, 2000)),
+            recipients=random_generator.sample(range(20), random_generator.randint(0, 3))))
+    return system
+
+
+def queries():
+    return {
+        'substance_age_recipient': Query(~expired() & field('substances').contains('paracetamolum')
+                                         & (field('recommended_age') <= 12) & field('recipients').contains(2)),
+        'manufacturer': Query(field('manufacturer') == 'Maker 7'),
+        'expiring_soon': Query((field('expiration_date') >= date.today())
+                               & (field('expiration_date') < date.today() + timedelta(days=7)))
+        .order_by('expiration_date'),
+        'low_stock_scan': Query(field('doses_left') <= 1).limit(50),
+    }
+
+
+def naive(system, query):
+    '''
+    Same query as a loop over all medicines
+    '''
+    order_by = query._order_by or 'id'
+    rows = [medicine for medicine in system.medicines().values() if query._predicate.matches(medicine)]
+    rows.sort(key=lambda medicine: (getattr(medicine, order_by)(), medicine.id()), reverse=query._descending)
+    return rows[:query._limit] if query._limit is not None else rows
+
+
+def measure(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--medicines', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    arguments = parser.parse_args()
+
+    system = create_system(arguments.medicines, arguments.seed)
+    start = time.perf_counter()
+    system.query_index()
+    results = {'medicines': arguments.medicines, 'index_build_s': time.perf_counter() - start, 'queries': {}}
+    for name, query in queries().items():
+        planned_time, planned = measure(lambda: query.execute(system), arguments.repeat)
+        naive_time, expected = measure(lambda: naive(system, query), arguments.repeat)
+        assert planned == expected, name
+        results['queries'][name] = {
+            'plan': query.explain(system).splitlines()[0],
+            'rows': len(planned),
+            'planned_ms': planned_time * 1000,
+            'naive_ms': naive_time * 1000,
+            'speedup': naive_time / planned_time if planned_time else None,
+        }
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+'''
+Benchmark suite of System at realistic scale, results are written as JSON for regression comparison.
+
+For every database size the data files are generated with benchmarks/generate_data.py and the suite measures:
+loading (eager and memory-mapped), memory used by a loaded database (tracemalloc), add_medicine, take_dose,
+add_prescription (which saves users.json when it commits), saving both files and rendering of the medicine list view.
+The list view needs customtkinter and a display, without them its result records why it was skipped.
+
+    python benchmarks/suite.py --sizes 10000 100000 1000000 --output results.json
+'''
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generate_data import generate, generate_medicine  # noqa: E402
+from medihelp.system import System  # noqa: E402
+import argparse  # noqa: E402
+import json  # noqa: E402
+import platform  # noqa: E402
+import random  # noqa: E402
+import statistics  # noqa: E402
+import tempfile  # noqa: E402
+import time  # noqa: E402
+import tracemalloc  # noqa: E402
+
+
+def load_system(medicines_path, users_path, lazy=False):
+    system = System()
+    system.load_users_data(users_path)
+    system.load_medicines_database_from(medicines_path, lazy=lazy)
+    return system
+
+
+def timed(function):
+    '''
+    :return: Pair (seconds, result of the function)
+    '''
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def summary(times):
+    '''
+    :return: Statistics of the times of single operations in microseconds
+    :rtype: dict
+    '''
+    times = sorted(times)
+    if not times:
+        return {'operations': 0}
+    return {
+        'operations': len(times),
+        'mean_us': statistics.fmean(times) * 10 ** 6,
+        'p50_us': times[len(times) // 2] * 10 ** 6,
+        'p99_us': times[min(len(times) - 1, len(times) * 99 // 100)] * 10 ** 6,
+    }
+
+
+def measure_memory(medicines_path, users_path):
+    tracemalloc.start()
+    system = load_system(medicines_path, users_path)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'loaded_mb': current / 2 ** 20,
+        'peak_during_load_mb': peak / 2 ** 20,
+        'bytes_per_medicine': current / max(len(system.medicines()), 1),
+    }
+
+
+def measure_add_medicine(system, operations, random_generator):
+    users = len(system.users())
+    times = []
+    for _ in range(operations):
+        # Medicine is generated with a throwaway ID, only its data is used
+        medicine = generate_medicine(0, users, random_generator)
+        start = time.perf_counter()
+        system.add_medicine(name=medicine.name(), manufacturer=medicine.manufacturer(),
+                            illnesses=medicine.illnesses(), substances=medicine.substances(),
+                            recommended_age=medicine.recommended_age(), doses=medicine.doses(),
+                            doses_left=medicine.doses_left(), expiration_date=medicine.expiration_date(),
+                            recipients=medicine.recipients(), notes=medicine.notes())
+        times.append(time.perf_counter() - start)
+    return summary(times)
+
+
+def dose_candidates(system, operations):
+    '''
+    :return: Pairs (medicine ID, user) where the user can take a dose of the medicine
+    :rtype: list[tuple[int, User]]
+    '''
+    users = system.users()
+    pairs = []
+    for medicine in system.medicines().values():
+        if medicine.is_expired() or medicine.doses_left() < 1:
+            continue
+        for user_id in medicine.recipients():
+            user = users.get(user_id)
+            if user and user.age() >= medicine.recommended_age() \
+                    and not medicine.substances().intersection(user.allergies()):
+                pairs.append((medicine.id(), user))
+                break
+        if len(pairs) == operations:
+            break
+    return pairs
+
+
+def measure_take_dose(system, operations):
+    times = []
+    for medicine_id, user in dose_candidates(system, operations):
+        start = time.perf_counter()
+        system.take_dose(medicine_id, user)
+        times.append(time.perf_counter() - start)
+    return summary(times)
+
+
+def measure_add_prescription(system, operations, random_generator):
+    user_ids = list(system.users())
+    times = []
+    for _ in range(operations):
+        user_id = random_generator.choice(user_ids)
+        start = time.perf_counter()
+        system.add_prescription(user_id, 'Apap', dosage=1, weekday=random_generator.randint(1, 7))
+        times.append(time.perf_counter() - start)
+    return summary(times)
+
+
+def measure_render(medicines_path, users_path, tiles):
+    '''
+    Renders the medicine list view of a database with the given number of medicines in a hidden window
+    '''
+    try:
+        import customtkinter as ctk
+        from medihelp.gui.medicine_list_view.medicine_list_view import MedicineListView
+    except ImportError as e:
+        return {'skipped': f'GUI dependencies are missing: {e}'}
+
+    class Window(ctk.CTk):
+        # Stands in for GUI, which starts the main loop in its constructor
+        def current_user_id(self):
+            return 0
+
+        def update_view(self, view_name, medicine_id=None):
+            pass
+
+    try:
+        window = Window()
+    except Exception as e:
+        return {'skipped': f'No display: {e}'}
+    try:
+        window.withdraw()
+        system = load_system(medicines_path, users_path)
+        for id in list(system.medicines())[tiles:]:
+            system.medicines_database().delete_medicine(id)
+        seconds, view = timed(lambda: MedicineListView(system, window, window))
+        window.update_idletasks()
+        update_seconds, _ = timed(view.update_view)
+        window.update_idletasks()
+        return {'tiles': len(system.medicines()), 'first_render_s': seconds, 'update_view_s': update_seconds}
+    finally:
+        window.destroy()
+
+
+def run(size, arguments, directory):
+    random_generator = random.Random(arguments.seed)
+    generate_seconds, (medicines_path, users_path) = timed(
+        lambda: generate(directory, size, arguments.users, arguments.prescriptions, arguments.seed))
+    result = {
+        'medicines': size,
+        'users': arguments.users,
+        'generate_s': generate_seconds,
+        'medicines_file_mb': os.path.getsize(medicines_path) / 2 ** 20,
+        'users_file_mb': os.path.getsize(users_path) / 2 ** 20,
+    }
+    result['load_lazy_s'], _ = timed(lambda: load_system(medicines_path, users_path, lazy=True))
+    result['load_s'], system = timed(lambda: load_system(medicines_path, users_path))
+    result['prescriptions'] = sum(len(user.prescriptions()) for user in system.users().values())
+    result['memory'] = measure_memory(medicines_path, users_path)
+
+    result['save_unchanged_s'], _ = timed(system.save_medicines_database)
+    result['take_dose'] = measure_take_dose(system, arguments.operations)
+    result['add_medicine'] = measure_add_medicine(system, arguments.operations, random_generator)
+    result['save_after_changes_s'], _ = timed(system.save_medicines_database)
+    result['add_prescription'] = measure_add_prescription(system, arguments.prescription_operations,
+                                                          random_generator)
+    result['save_users_s'], _ = timed(system.save_users_data)
+    result['render'] = measure_render(medicines_path, users_path, arguments.render)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000],
+                        help='numbers of medicines in the generated databases')
+    parser.add_argument('--users', type=int, default=300)
+    parser.add_argument('--prescriptions', type=int, default=30, help='average number of prescriptions of a user')
+    parser.add_argument('--operations', type=int, default=1000, help='number of measured operations of every kind')
+    parser.add_argument('--prescription-operations', type=int, default=200,
+                        help='number of measured add_prescription calls, every one of them saves users.json')
+    parser.add_argument('--render', type=int, default=200, help='number of medicines shown in the list view')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='path to the JSON file with results (printed if not given)')
+    arguments = parser.parse_args()
+
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': arguments.seed,
+        'runs': [],
+    }
+    for size in arguments.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            results['runs'].append(run(size, arguments, directory))
+    output = json.dumps(results, indent=4)
+    if arguments.output:
+        with open(arguments.output, 'w') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+'''
+Analytical queries over the columnar representation of a medicines database (see MedicinesDatabase.columns()).
+Every function works on whole columns at once instead of looping over Medicine objects.
+'''
+from .columnar import MedicineColumns
+from datetime import date
+from itertools import compress
+
+
+def total_doses_left(columns: MedicineColumns, mask: bytes = None):
+    '''
+    :param mask: Mask selecting rows that are taken into account (optional)
+    :type mask: bytes
+
+    :return: Sum of doses left in the selected medicines
+    :rtype: int
+    '''
+    if mask is None:
+        return sum(columns.doses_left)
+    return sum(compress(columns.doses_left, mask))
+
+
+def doses_left_per_manufacturer(columns: MedicineColumns, mask: bytes = None):
+    '''
+    :param mask: Mask selecting rows that are taken into account (optional)
+    :type mask: bytes
+
+    :return: Dictionary where names of manufacturers are the keys and sums of doses left are the values
+    :rtype: dict[str, int]
+    '''
+    manufacturers = columns.manufacturers.values()
+    totals = [0] * len(manufacturers)
+    codes = columns.manufacturer
+    doses_left = columns.doses_left
+    if mask is not None:
+        codes = compress(codes, mask)
+        doses_left = compress(doses_left, mask)
+    for code, doses in zip(codes, doses_left):
+        totals[code] += doses
+    return {manufacturers[code]: total for code, total in enumerate(totals) if total}
+
+
+def expired_stock_percentage(columns: MedicineColumns, today: date = None):
+    '''
+    :return: Percentage of doses left that belong to expired medicines
+    :rtype: float
+    '''
+    total = total_doses_left(columns)
+    if not total:
+        return 0.0
+    return 100 * total_doses_left(columns, columns.expired_mask(today)) / total
+
+
+def doses_left_for_users(columns: MedicineColumns, user_ids):
+    '''
+    Sums doses left of medicines that are taken by at least one of the given users.
+        For example doses left for users over 65:
+        doses_left_for_users(columns, [user.id() for user in users.values() if user.age() > 65])
+
+    :param user_ids: IDs of the users
+    :type user_ids: iterable of int
+
+    :rtype: int
+    '''
+    return total_doses_left(columns, columns.recipients_mask(user_ids))
+
+
+def doses_left_of_substance(columns: MedicineColumns, substance: str, include_expired: bool = False):
+    '''
+    :return: Sum of doses left of medicines containing the given substance
+    :rtype: int
+    '''
+    mask = columns.substance_mask(substance)
+    if not include_expired:
+        mask = bytes(map(int.__gt__, mask, columns.expired_mask()))
+    return total_doses_left(columns, mask)
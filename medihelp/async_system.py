@@ -0,0 +1,141 @@
+from .system import System
+from .errors import NoFileOpenedError
+import asyncio
+import os
+
+
+class AsyncSystem:
+    '''
+    asyncio facade of System for embedding Medihelp in asynchronous services.
+        Loading, saving and changes of the databases run in worker threads (asyncio.to_thread),
+        so the event loop is never blocked by file I/O or by waiting for the lock of the databases.
+        Operations on the same file are serialized by per-file asyncio locks, so concurrent saves
+        don't occupy worker threads while they wait for each other.
+        Reads are served from copy-on-write snapshots and don't wait for saves.
+
+    Attributes
+    ----------
+    :ivar _system: Wrapped system
+    :vartype _system: System
+
+    :ivar _file_locks: Locks of files, where absolute paths are the keys
+    :vartype _file_locks: dict[str, asyncio.Lock]
+    '''
+
+    def __init__(self, system: System = None):
+        '''
+        :param system: System to be wrapped. A new one is created if not given (optional)
+        :type system: System
+        '''
+        self._system = system if system is not None else System()
+        self._file_locks = {}
+
+    def system(self):
+        return self._system
+
+    def _file_lock(self, path: str):
+        return self._file_locks.setdefault(os.path.abspath(path), asyncio.Lock())
+
+    async def _run(self, function, *args, **kwargs):
+        return await asyncio.to_thread(function, *args, **kwargs)
+
+    async def _run_on_users_file(self, function, *args, **kwargs):
+        '''
+        Runs a change which saves users data, serialized with other operations on the users file
+        '''
+        async with self._file_lock(self._system.users_file_path()):
+            return await asyncio.to_thread(function, *args, **kwargs)
+
+    async def medicines(self):
+        '''
+        Returns read-only snapshot of the medicines (see System.medicines_snapshot).
+            Taking it waits for a change in progress, so it is done in a worker thread.
+
+        :rtype: Mapping[int, Medicine]
+        '''
+        return await self._run(self._system.medicines_snapshot)
+
+    async def users(self):
+        '''
+        Returns read-only snapshot of the users (see System.users_snapshot).
+            Taking it waits for a change in progress, so it is done in a worker thread.
+
+        :rtype: Mapping[int, User]
+        '''
+        return await self._run(self._system.users_snapshot)
+
+    async def load_users_data(self, path: str = None):
+        async with self._file_lock(path or self._system.users_file_path()):
+            await self._run(self._system.load_users_data, path)
+
+    async def save_users_data(self):
+        await self._run_on_users_file(self._system.save_users_data)
+
+    async def load_medicines_database_from(self, path: str, lazy: bool = False):
+        async with self._file_lock(path):
+            await self._run(self._system.load_medicines_database_from, path, lazy)
+
+    async def save_medicines_database(self, path: str = None):
+        '''
+        Saves medicines database like System.save_medicines_database.
+            Saves of the same file are done one after another.
+        '''
+        target = path or self._system.medicines_file_path()
+        if not target:
+            raise NoFileOpenedError
+        async with self._file_lock(target):
+            await self._run(self._system.save_medicines_database, path)
+
+    async def transaction(self, function):
+        '''
+        Runs function(system) in a worker thread inside System.transaction(),
+            so that all its changes are committed or rolled back together
+
+        :param function: Function making changes through the given System
+        :type function: callable
+
+        :return: Value returned by the function
+        '''
+        def run():
+            with self._system.transaction():
+                return function(self._system)
+        return await self._run_on_users_file(run)
+
+    async def occurrences(self, user_ids, start, end):
+        return await self._run(self._system.occurrences, user_ids, start, end)
+
+    async def add_medicine(self, *args, **kwargs):
+        return await self._run(self._system.add_medicine, *args, **kwargs)
+
+    async def del_medicine(self, medicine_id: int):
+        await self._run(self._system.del_medicine, medicine_id)
+
+    async def change_medicine(self, *args, **kwargs):
+        await self._run(self._system.change_medicine, *args, **kwargs)
+
+    async def take_dose(self, medicine_id: int, user):
+        await self._run(self._system.take_dose, medicine_id, user)
+
+    async def set_note(self, medicine_id: int, author_id: int, content: str):
+        await self._run(self._system.set_note, medicine_id, author_id, content)
+
+    async def del_note(self, medicine_id: int, author_id: int):
+        await self._run(self._system.del_note, medicine_id, author_id)
+
+    async def change_user(self, *args, **kwargs):
+        await self._run_on_users_file(self._system.change_user, *args, **kwargs)
+
+    async def add_prescription(self, *args, **kwargs):
+        await self._run_on_users_file(self._system.add_prescription, *args, **kwargs)
+
+    async def del_prescription(self, user_id: int, prescription_id: int):
+        await self._run_on_users_file(self._system.del_prescription, user_id, prescription_id)
+
+    async def change_prescription(self, *args, **kwargs):
+        await self._run_on_users_file(self._system.change_prescription, *args, **kwargs)
+
+    async def undo(self):
+        return await self._run_on_users_file(self._system.undo)
+
+    async def redo(self):
+        return await self._run_on_users_file(self._system.redo)
@@ -0,0 +1,263 @@
+'''
+Command line interface for batch operations on the data of Medihelp, meant to be run without a display (e.g. from cron).
+It is built only on System and never imports the GUI.
+Every command writes JSON to the standard output: commands listing medicines write one JSON object per line,
+    the other ones write a single JSON object. Errors are written to the standard error as {"error": message}.
+Exit status is 0 on success, 1 if the command failed or found invalid data and 2 if the arguments are wrong.
+Medicine files are memory-mapped, so only the medicines which are used are parsed.
+'''
+from .system import System
+from .medicines_database import MedicinesDatabase, HEADER
+from .serialization import medicine_to_dict, medicine_arguments
+from .compression import open_data_file
+from .forecast import StockForecast
+from .errors import UserDoesNotExistError
+from datetime import date
+import argparse
+import json
+import csv
+import os
+import sys
+
+
+def _write(result, output=None):
+    output = output or sys.stdout
+    output.write(json.dumps(result, ensure_ascii=False))
+    output.write('\n')
+
+
+def _error_message(error):
+    if error.__cause__ is not None:
+        return f'{error} -> {error.__cause__}'
+    return str(error)
+
+
+def _paths(arguments):
+    medicines = arguments.medicines or os.path.join(arguments.data_dir, 'medicines.csv')
+    users = arguments.users or os.path.join(arguments.data_dir, 'users.json')
+    return medicines, users
+
+
+def _load(arguments, users=True, medicines=True):
+    '''
+    Creates System with the data given by the arguments
+    '''
+    medicines_path, users_path = _paths(arguments)
+    system = System()
+    if users:
+        system.load_users_data(users_path)
+    if medicines:
+        system.load_medicines_database_from(medicines_path, lazy=True)
+    return system
+
+
+def _read_medicines(path):
+    '''
+    Yields pairs (row number, dictionary in the format of medicine_to_dict) read from a .csv file
+        with the header of the medicines database or from a file of JSON objects, one per line (.jsonl)
+    '''
+    with open_data_file(path, 'r') as file:
+        if '.jsonl' in os.path.basename(path).lower():
+            for row_number, line in enumerate(file, start=1):
+                if line.strip():
+                    yield row_number, json.loads(line)
+            return
+        for row_number, row in enumerate(csv.DictReader(file), start=2):
+            yield row_number, medicine_to_dict(MedicinesDatabase._medicine_from_row(row))
+
+
+def import_medicines(arguments):
+    '''
+    Adds medicines from a file to the database, new IDs are assigned to them.
+        Either all medicines are imported or none if any of them is invalid.
+    '''
+    system = _load(arguments, users=False)
+    row_number = 0
+    imported = 0
+    try:
+        with system.transaction():
+            for row_number, data in _read_medicines(arguments.file):
+                system.add_medicine(**medicine_arguments(data))
+                imported += 1
+    except Exception as e:
+        raise ValueError(f'{arguments.file}, row {row_number}: {_error_message(e)}') from None
+    system.save_medicines_database()
+    _write({'imported': imported})
+    return 0
+
+
+def export_medicines(arguments):
+    '''
+    Writes all medicines in the order of IDs as JSON objects (one per line) or as .csv file
+    '''
+    system = _load(arguments, users=False)
+    database = system.medicines_database()
+    if arguments.format == 'csv':
+        database.write_to_file(sys.stdout)
+        return 0
+    medicines = database.medicines()
+    for id in sorted(medicines):
+        _write(medicine_to_dict(medicines[id]))
+    return 0
+
+
+def validate(arguments):
+    '''
+    Checks every row of the medicines file and the users file and writes a JSON object for every problem found.
+        Unlike loading, validation doesn't stop at the first malformed row.
+    '''
+    medicines_path, users_path = _paths(arguments)
+    problems = 0
+    rows = 0
+
+    def problem(path, row, error):
+        nonlocal problems
+        problems += 1
+        _write({'file': path, 'row': row, 'error': _error_message(error)})
+
+    ids = set()
+    try:
+        with open_data_file(medicines_path, 'r') as file:
+            reader = csv.DictReader(file)
+            if reader.fieldnames != HEADER:
+                problem(medicines_path, 1, ValueError(f'Header differs from {",".join(HEADER)}'))
+            for row_number, row in enumerate(reader, start=2):
+                rows += 1
+                try:
+                    medicine = MedicinesDatabase._medicine_from_row(row)
+                except Exception as e:
+                    problem(medicines_path, row_number, e)
+                    continue
+                if medicine.id() in ids:
+                    problem(medicines_path, row_number, ValueError(f'Duplicated ID {medicine.id()}'))
+                ids.add(medicine.id())
+    except Exception as e:
+        problem(medicines_path, None, e)
+
+    try:
+        System().load_users_data(users_path)
+    except Exception as e:
+        problem(users_path, None, e)
+    _write({'valid': not problems, 'medicines': rows, 'problems': problems})
+    return 1 if problems else 0
+
+
+def list_expired(arguments):
+    '''
+    Writes medicines which expired before the given date (today by default), one JSON object per line
+    '''
+    system = _load(arguments, users=False)
+    day = date.fromisoformat(arguments.date) if arguments.date else date.today()
+    medicines = system.medicines()
+    for id in sorted(medicines):
+        medicine = medicines[id]
+        if medicine.expiration_date() < day:
+            _write(medicine_to_dict(medicine))
+    return 0
+
+
+def take_dose(arguments):
+    system = _load(arguments)
+    user = system.users().get(arguments.user_id)
+    if user is None:
+        raise UserDoesNotExistError(arguments.user_id)
+    system.take_dose(arguments.medicine_id, user)
+    system.save_medicines_database()
+    _write(medicine_to_dict(system.medicines()[arguments.medicine_id]))
+    return 0
+
+
+def add_prescription(arguments):
+    system = _load(arguments, medicines=False)
+    user = system.users().get(arguments.user_id)
+    if user is None:
+        raise UserDoesNotExistError(arguments.user_id)
+    old_ids = set(user.prescriptions())
+    system.add_prescription(arguments.user_id, arguments.medicine_name, arguments.dosage, arguments.weekday)
+    prescriptions = system.users()[arguments.user_id].prescriptions()
+    prescription = next(prescription for id, prescription in prescriptions.items() if id not in old_ids)
+    _write({
+        'user_id': arguments.user_id,
+        'id': prescription.id(),
+        'medicine_name': prescription.medicine_name(),
+        'dosage': prescription.dosage(),
+        'weekday': prescription.weekday(),
+    })
+    return 0
+
+
+def report(arguments):
+    '''
+    Writes a summary of the inventory: number of medicines, expired ones, doses left
+        and medicines which are going to run out within the given number of days
+    '''
+    system = _load(arguments)
+    today = date.today()
+    medicines = system.medicines()
+    expired = []
+    doses_left = 0
+    for id in sorted(medicines):
+        medicine = medicines[id]
+        if medicine.expiration_date() < today:
+            expired.append(id)
+        else:
+            doses_left += medicine.doses_left()
+    running_low = StockForecast(system).running_low(arguments.days)
+    _write({
+        'date': str(today),
+        'medicines': len(medicines),
+        'expired': expired,
+        'doses_left': doses_left,
+        'running_low': [{'id': id, 'name': medicines[id].name(), 'run_out_date': str(run_out)}
+                        for id, run_out in running_low],
+    })
+    return 0
+
+
+def _parser():
+    parser = argparse.ArgumentParser(prog='python -m medihelp', description='Batch operations on Medihelp data')
+    parser.add_argument('--data-dir', default='data', help='Directory with medicines.csv and users.json (default: data)')
+    parser.add_argument('--medicines', help='Medicines database file (default: DATA_DIR/medicines.csv)')
+    parser.add_argument('--users', help='Users data file (default: DATA_DIR/users.json)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('import', help='Add medicines from a .csv or .jsonl file')
+    command.add_argument('file')
+    command.set_defaults(function=import_medicines)
+
+    command = commands.add_parser('export', help='Write all medicines')
+    command.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl')
+    command.set_defaults(function=export_medicines)
+
+    command = commands.add_parser('validate', help='Check data files and list all problems')
+    command.set_defaults(function=validate)
+
+    command = commands.add_parser('list-expired', help='Write expired medicines')
+    command.add_argument('--date', help='ISO date, medicines expired before it are listed (default: today)')
+    command.set_defaults(function=list_expired)
+
+    command = commands.add_parser('take-dose', help='Take one dose of a medicine')
+    command.add_argument('medicine_id', type=int)
+    command.add_argument('user_id', type=int)
+    command.set_defaults(function=take_dose)
+
+    command = commands.add_parser('add-prescription', help='Add prescription to a user')
+    command.add_argument('user_id', type=int)
+    command.add_argument('medicine_name')
+    command.add_argument('dosage', type=int)
+    command.add_argument('weekday', type=int, help='1 (Monday) to 7 (Sunday)')
+    command.set_defaults(function=add_prescription)
+
+    command = commands.add_parser('report', help='Write summary of the inventory')
+    command.add_argument('--days', type=int, default=14, help='Horizon of the running low forecast (default: 14)')
+    command.set_defaults(function=report)
+    return parser
+
+
+def main(argv=None):
+    arguments = _parser().parse_args(argv)
+    try:
+        return arguments.function(arguments)
+    except Exception as e:
+        _write({'error': _error_message(e)}, sys.stderr)
+        return 1
@@ -0,0 +1,198 @@
+from array import array
+from datetime import date
+from itertools import repeat
+from operator import lt, ge
+
+
+class DictionaryEncoder:
+    '''
+    Assigns consecutive integer codes to strings.
+
+    Attributes
+    ----------
+    :ivar _codes: Dictionary mapping strings to their codes
+    :vartype _codes: dict[str, int]
+
+    :ivar _values: List of encoded strings where the code is an index
+    :vartype _values: list[str]
+    '''
+
+    def __init__(self):
+        self._codes = {}
+        self._values = []
+
+    def encode(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self._values)
+            self._codes[value] = code
+            self._values.append(value)
+        return code
+
+    def code(self, value):
+        '''
+        :return: Code of the value or None if the value was never encoded
+        :rtype: int
+        '''
+        return self._codes.get(value)
+
+    def values(self):
+        return self._values
+
+
+class MedicineColumns:
+    '''
+    Columnar representation of a medicines database used by analytical queries.
+        Scalar attributes are kept in typed arrays, manufacturers are dictionary-encoded
+        and substances and recipients are kept as CSR encoded lists (offsets + values).
+        Rows are updated incrementally when a medicine is added, deleted or modified.
+        Order of rows is not related to the order of medicine IDs.
+
+    Attributes
+    ----------
+    :ivar _rows: Dictionary mapping IDs of medicines to row numbers
+    :vartype _rows: dict[int, int]
+
+    :ivar id, doses, doses_left, recommended_age, expiration, manufacturer: Columns of the table
+    :vartype id, doses, doses_left, recommended_age, expiration, manufacturer: array
+
+    :ivar _row_substances: Codes of substances of each row, source of the CSR substances column
+    :vartype _row_substances: list[tuple[int]]
+
+    :ivar _row_recipients: IDs of recipients of each row, source of the CSR recipients column
+    :vartype _row_recipients: list[tuple[int]]
+    '''
+
+    def __init__(self, medicines=()):
+        '''
+        :param medicines: Medicines the table is built from
+        :type medicines: iterable of Medicine
+        '''
+        self.manufacturers = DictionaryEncoder()
+        self.substances = DictionaryEncoder()
+        self._rows = {}
+        self.id = array('q')
+        self.doses = array('q')
+        self.doses_left = array('q')
+        self.recommended_age = array('q')
+        self.expiration = array('q')
+        self.manufacturer = array('q')
+        self._row_substances = []
+        self._row_recipients = []
+        self._substances_csr = None
+        self._recipients_csr = None
+        for medicine in medicines:
+            self.add(medicine)
+
+    def __len__(self):
+        return len(self.id)
+
+    def _scalar_columns(self):
+        return (self.id, self.doses, self.doses_left, self.recommended_age, self.expiration, self.manufacturer)
+
+    def add(self, medicine):
+        '''
+        Appends a row describing the medicine
+        '''
+        self._rows[medicine.id()] = len(self.id)
+        self.id.append(medicine.id())
+        self.doses.append(medicine.doses())
+        self.doses_left.append(medicine.doses_left())
+        self.recommended_age.append(medicine.recommended_age())
+        self.expiration.append(medicine.expiration_date().toordinal())
+        self.manufacturer.append(self.manufacturers.encode(medicine.manufacturer()))
+        self._row_substances.append(tuple(self.substances.encode(name) for name in sorted(medicine.substances())))
+        self._row_recipients.append(tuple(sorted(medicine.recipients())))
+        self._substances_csr = None
+        self._recipients_csr = None
+
+    def remove(self, medicine_id):
+        '''
+        Removes the row of the medicine with given ID. The last row takes its place.
+        '''
+        row = self._rows.pop(medicine_id)
+        last = len(self.id) - 1
+        for column in self._scalar_columns() + (self._row_substances, self._row_recipients):
+            column[row] = column[last]
+            column.pop()
+        if row != last:
+            self._rows[self.id[row]] = row
+        self._substances_csr = None
+        self._recipients_csr = None
+
+    def update(self, medicine):
+        '''
+        Updates the row of a medicine that was modified in place
+        '''
+        row = self._rows.get(medicine.id())
+        if row is None:
+            self.add(medicine)
+            return
+        self.doses_left[row] = medicine.doses_left()
+        recipients = tuple(sorted(medicine.recipients()))
+        if recipients != self._row_recipients[row]:
+            self._row_recipients[row] = recipients
+            self._recipients_csr = None
+
+    def row(self, medicine_id):
+        return self._rows[medicine_id]
+
+    @staticmethod
+    def _csr(lists):
+        offsets = array('q', [0])
+        values = array('q')
+        for values_of_row in lists:
+            values.extend(values_of_row)
+            offsets.append(len(values))
+        return offsets, values
+
+    def substances_csr(self):
+        '''
+        :return: Offsets and substance codes. Substances of row i are values[offsets[i]:offsets[i + 1]]
+        :rtype: tuple[array, array]
+        '''
+        if self._substances_csr is None:
+            self._substances_csr = self._csr(self._row_substances)
+        return self._substances_csr
+
+    def recipients_csr(self):
+        '''
+        :return: Offsets and recipient IDs. Recipients of row i are values[offsets[i]:offsets[i + 1]]
+        :rtype: tuple[array, array]
+        '''
+        if self._recipients_csr is None:
+            self._recipients_csr = self._csr(self._row_recipients)
+        return self._recipients_csr
+
+    def expired_mask(self, today: date = None):
+        '''
+        :return: Mask with 1 for every row of an expired medicine
+        :rtype: bytes
+        '''
+        today = (today or date.today()).toordinal()
+        return bytes(map(lt, self.expiration, repeat(today, len(self.expiration))))
+
+    def age_mask(self, max_age: int):
+        '''
+        :return: Mask with 1 for every row of a medicine with recommended age lower or equal to max_age
+        :rtype: bytes
+        '''
+        return bytes(map(ge, repeat(max_age, len(self.recommended_age)), self.recommended_age))
+
+    def recipients_mask(self, user_ids):
+        '''
+        :return: Mask with 1 for every row of a medicine taken by at least one of the given users
+        :rtype: bytes
+        '''
+        user_ids = set(user_ids)
+        return bytes(map(bool, map(user_ids.intersection, self._row_recipients)))
+
+    def substance_mask(self, substance: str):
+        '''
+        :return: Mask with 1 for every row of a medicine containing the given substance
+        :rtype: bytes
+        '''
+        code = self.substances.code(substance)
+        if code is None:
+            return bytes(len(self.id))
+        return bytes(code in codes for codes in self._row_substances)
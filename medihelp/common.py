@@ -1,5 +1,6 @@
 from medihelp.errors import IllegalCharactersInANameError
 from typing import Iterable
+import sys
 
 
 def set_of_strings_to_string(set_of_strings: Iterable[str]):
@@ -14,7 +15,9 @@ def normalize_name(name: str):
     for char in ["'", '"', '\n', ',']:
         if char in name:
             raise IllegalCharactersInANameError
-    return name
+    # Names of substances, illnesses, manufacturers etc. repeat across medicines, users and databases,
+    #   interning keeps one copy of each in the process
+    return sys.intern(name)
 
 
 def normalize_list_of_names(list_of_names):
@@ -0,0 +1,72 @@
+'''
+Transparent support for compressed data files.
+Compression is detected by the file extension or, when reading a file with an unknown extension, by its magic bytes.
+Compressed files are always read and written as a stream, they are never buffered as a whole.
+'''
+import bz2
+import gzip
+import lzma
+import os
+
+
+# File extensions of supported compression formats
+EXTENSIONS = {
+    '.gz': gzip,
+    '.xz': lzma,
+    '.bz2': bz2
+}
+
+# Magic bytes at the beginning of files of supported compression formats
+MAGIC_BYTES = [
+    (b'\x1f\x8b', gzip),
+    (b'\xfd7zXZ\x00', lzma),
+    (b'BZh', bz2)
+]
+
+
+def compression_module(path: str, mode: str = 'r'):
+    '''
+    Returns the module (gzip, lzma or bz2) that handles compression of the file under the given path
+        or None if the file is not compressed.
+
+    :param path: Path to the file
+    :type path: str
+    :param mode: Mode the file is going to be opened in. Magic bytes are only checked when reading.
+    :type mode: str
+    '''
+    for extension, module in EXTENSIONS.items():
+        if str(path).lower().endswith(extension):
+            return module
+    if 'r' in mode and os.path.isfile(path):
+        descriptor = os.open(path, os.O_RDONLY)
+        try:
+            head = os.read(descriptor, 6)
+        finally:
+            os.close(descriptor)
+        for magic, module in MAGIC_BYTES:
+            if head.startswith(magic):
+                return module
+    return None
+
+
+def is_compressed(path: str):
+    '''
+    :return: True if the file under the given path is (or is going to be) compressed
+    :rtype: bool
+    '''
+    return compression_module(path) is not None
+
+
+def open_data_file(path: str, mode: str = 'r'):
+    '''
+    Opens a data file in text mode. Compressed files are decompressed/compressed on the fly.
+
+    :param path: Path to the file
+    :type path: str
+    :param mode: 'r' for reading, 'w' for writing
+    :type mode: str
+    '''
+    module = compression_module(path, mode)
+    if module is None:
+        return open(path, mode)
+    return module.open(path, mode + 't', encoding='utf-8')
@@ -0,0 +1,162 @@
+from bisect import bisect_right
+from datetime import datetime
+from typing import NamedTuple
+import os
+import struct
+
+
+# timestamp (seconds since the epoch), user ID, medicine ID, number of doses
+RECORD = struct.Struct('<qiii')
+
+
+class DoseEvent(NamedTuple):
+    time: datetime
+    user_id: int
+    medicine_id: int
+    doses: int
+
+
+class DoseLog:
+    '''
+    Append-only log of taken doses stored in a binary file of fixed-size records.
+        Records are kept in chronological order. The first timestamp of every block of records
+        is kept in memory (sparse index), so a time-range scan only reads blocks overlapping the range.
+
+    Attributes
+    ----------
+    :ivar _path: Path to the log file
+    :vartype _path: str
+
+    :ivar _block_size: Number of records in a block of the sparse index
+    :vartype _block_size: int
+
+    :ivar _index: Timestamp of the first record of every block
+    :vartype _index: list[int]
+
+    :ivar _count: Number of records in the log
+    :vartype _count: int
+
+    :ivar _last_timestamp: Timestamp of the last record
+    :vartype _last_timestamp: int
+    '''
+
+    def __init__(self, path: str, block_size: int = 1024):
+        '''
+        :param path: Path to the log file. The file is created if it doesn't exist.
+        :type path: str
+        :param block_size: Number of records in a block of the sparse index (optional)
+        :type block_size: int
+        '''
+        self._path = path
+        self._block_size = block_size
+        self._index = []
+        self._count = 0
+        self._last_timestamp = None
+        self._file = open(path, 'ab', buffering=0)
+        self._build_index()
+
+    def _build_index(self):
+        '''
+        Reads the first record of every block. A partially written record at the end of the file is dropped.
+        '''
+        size = os.path.getsize(self._path)
+        if size % RECORD.size:
+            os.truncate(self._path, size - size % RECORD.size)
+        self._count = size // RECORD.size
+        with open(self._path, 'rb') as file:
+            for block_start in range(0, self._count, self._block_size):
+                file.seek(block_start * RECORD.size)
+                self._index.append(RECORD.unpack(file.read(RECORD.size))[0])
+            if self._count:
+                file.seek((self._count - 1) * RECORD.size)
+                self._last_timestamp = RECORD.unpack(file.read(RECORD.size))[0]
+
+    def path(self):
+        return self._path
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        self._file.close()
+
+    def append(self, user_id: int, medicine_id: int, doses: int = 1, time: datetime = None):
+        '''
+        Appends an event to the log. Time of the event can't be earlier than the time of the last event,
+            an earlier time is replaced with the time of the last event.
+
+        :param user_id: ID of the user who took the doses
+        :type user_id: int
+        :param medicine_id: ID of the medicine
+        :type medicine_id: int
+        :param doses: Number of doses taken (optional)
+        :type doses: int
+        :param time: Time of the event. Current time if not given (optional)
+        :type time: datetime
+        '''
+        timestamp = int((time or datetime.now()).timestamp())
+        if self._last_timestamp is not None and timestamp < self._last_timestamp:
+            timestamp = self._last_timestamp
+        self._file.write(RECORD.pack(timestamp, user_id, medicine_id, doses))
+        if self._count % self._block_size == 0:
+            self._index.append(timestamp)
+        self._count += 1
+        self._last_timestamp = timestamp
+
+    def scan(self, start: datetime = None, end: datetime = None):
+        '''
+        Generates events from the given time range in chronological order.
+
+        :param start: Beginning of the range, inclusive (optional)
+        :type start: datetime
+        :param end: End of the range, exclusive (optional)
+        :type end: datetime
+
+        :rtype: generator of DoseEvent
+        '''
+        start_timestamp = int(start.timestamp()) if start else None
+        end_timestamp = int(end.timestamp()) if end else None
+        first_block = 0
+        if start_timestamp is not None:
+            # The last block starting before the range may still contain events from the range
+            first_block = max(bisect_right(self._index, start_timestamp - 1) - 1, 0)
+        position = first_block * self._block_size
+        count = self._count
+        with open(self._path, 'rb') as file:
+            file.seek(position * RECORD.size)
+            while position < count:
+                records = min(self._block_size, count - position)
+                data = file.read(records * RECORD.size)
+                for timestamp, user_id, medicine_id, doses in RECORD.iter_unpack(data):
+                    if end_timestamp is not None and timestamp >= end_timestamp:
+                        return
+                    if start_timestamp is None or timestamp >= start_timestamp:
+                        yield DoseEvent(datetime.fromtimestamp(timestamp), user_id, medicine_id, doses)
+                position += records
+
+    def doses_per_user_per_week(self, start: datetime = None, end: datetime = None):
+        '''
+        Sums doses taken by each user in each week of the given time range.
+
+        :return: Dictionary where keys are tuples (user ID, ISO year, ISO week number) and values are numbers of doses
+        :rtype: dict[tuple[int, int, int], int]
+        '''
+        result = {}
+        for event in self.scan(start, end):
+            year, week, _ = event.time.isocalendar()
+            key = (event.user_id, year, week)
+            result[key] = result.get(key, 0) + event.doses
+        return result
+
+    def doses_per_medicine_per_month(self, start: datetime = None, end: datetime = None):
+        '''
+        Sums doses of each medicine taken in each month of the given time range.
+
+        :return: Dictionary where keys are tuples (medicine ID, year, month) and values are numbers of doses
+        :rtype: dict[tuple[int, int, int], int]
+        '''
+        result = {}
+        for event in self.scan(start, end):
+            key = (event.medicine_id, event.time.year, event.time.month)
+            result[key] = result.get(key, 0) + event.doses
+        return result
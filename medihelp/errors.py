@@ -165,3 +165,18 @@ class ViewDoesNotExist(Exception):
 class IllegalCharactersInANameError(Exception):
     def __init__(self):
         super().__init__('Nazwa nie może zawierać następujących znaków: "\'", """, ",", "\\n"!')
+
+
+class FileLockTimeoutError(Exception):
+    def __init__(self, path):
+        super().__init__(f'Plik {path} jest używany przez inny program!')
+
+
+class TransactionInProgressError(Exception):
+    def __init__(self):
+        super().__init__('Nie można zapisać danych przed zakończeniem transakcji!')
+
+
+class SystemClosedError(Exception):
+    def __init__(self):
+        super().__init__('Dane zostały zamknięte, zmiana nie może zostać zapisana!')
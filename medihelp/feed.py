@@ -0,0 +1,333 @@
+'''
+Change feed for read-only replicas of the databases of System (e.g. a reporting process).
+
+ChangeFeed appends a record to a file after every change of the databases of the primary System.
+    Records are JSON objects, one per line:
+    {"seq": sequence number, "time": UNIX time of the change, "kind": kind, "key": key, "payload": payload}
+    where kind and key are the arguments of System change listeners and payload is the new version
+    of the medicine or user (in the format of medihelp.serialization, null when it was deleted)
+    or the whole database when it was loaded.
+Follower reads the feed and applies it to its own databases. It starts from a snapshot
+    written by ChangeFeed.write_snapshot and reads only the records with higher sequence numbers,
+    so catching up doesn't require reading the whole feed or the data files.
+'''
+from .medicines_database import MedicinesDatabase
+from .users_database import UsersDatabase
+from .serialization import medicine_to_dict, medicine_from_dict, user_to_dict
+import threading
+import logging
+import json
+import time
+import os
+
+
+logger = logging.getLogger(__name__)
+
+# Payloads are made while the lock of the system is held, so the databases are read directly.
+#   Taking a copy-on-write snapshot would make the next change copy the whole database.
+def _medicines_payload(system, key):
+    if key is None:
+        return [medicine_to_dict(medicine) for medicine in system.medicines().values()]
+    medicine = system.medicines().get(key)
+    return medicine_to_dict(medicine) if medicine is not None else None
+
+
+def _users_payload(system, key):
+    if key is None:
+        return [user_to_dict(user) for user in system.users().values()]
+    user = system.users().get(key)
+    return user_to_dict(user) if user is not None else None
+
+
+# Size of the blocks in which the feed file is read backwards
+_BLOCK_SIZE = 65536
+
+
+def _seq_of_line(file, start, end):
+    '''
+    :return: Sequence number of the record between the given positions of the feed file
+        or None if it is empty or partially written
+    '''
+    if end <= start:
+        return None
+    file.seek(start)
+    try:
+        return json.loads(file.read(end - start))['seq']
+    except (ValueError, KeyError):
+        return None
+
+
+def _last_seq(path):
+    '''
+    Searches the feed file backwards for the last complete record.
+        Records of a whole database can be much longer than a block, only their boundaries are searched in blocks.
+
+    :return: Sequence number of the last record in the feed file or 0 if there is none
+    :rtype: int
+    '''
+    try:
+        file = open(path, 'rb')
+    except FileNotFoundError:
+        return 0
+    with file:
+        position = line_end = file.seek(0, os.SEEK_END)
+        while position > 0:
+            start = max(position - _BLOCK_SIZE, 0)
+            file.seek(start)
+            block = file.read(position - start)
+            position = start
+            index = len(block)
+            while (newline := block.rfind(b'\n', 0, index)) >= 0:
+                seq = _seq_of_line(file, start + newline + 1, line_end)
+                if seq is not None:
+                    return seq
+                line_end = start + newline
+                index = newline
+        seq = _seq_of_line(file, 0, line_end)
+    return seq if seq is not None else 0
+
+
+class ChangeFeed:
+    '''
+    Appends a record to the feed file after every change of the databases of the system.
+        Records are written by the thread making the change while it still holds the lock of the system,
+        so they are in the order of changes. Numbering continues after the last record of an existing file.
+
+    Attributes
+    ----------
+    :ivar _system: Primary system
+    :vartype _system: System
+
+    :ivar _path: Path to the feed file
+    :vartype _path: str
+
+    :ivar _file: Feed file opened for appending
+    :vartype _file: file
+
+    :ivar _seq: Sequence number of the last record
+    :vartype _seq: int
+    '''
+
+    def __init__(self, system, path: str):
+        '''
+        :param system: Primary system
+        :type system: System
+
+        :param path: Path to the feed file
+        :type path: str
+        '''
+        self._system = system
+        self._path = path
+        self._seq = _last_seq(path)
+        self._file = open(path, 'a', encoding='utf-8')
+        system.add_change_listener(self._on_change)
+
+    def path(self):
+        return self._path
+
+    def seq(self):
+        return self._seq
+
+    def close(self):
+        self._system.remove_change_listener(self._on_change)
+        self._file.close()
+
+    def _on_change(self, kind, key):
+        if kind in ('medicine', 'medicines'):
+            payload = _medicines_payload(self._system, key)
+        elif kind in ('user', 'users'):
+            payload = _users_payload(self._system, key)
+        else:
+            return
+        self._seq += 1
+        record = {'seq': self._seq, 'time': time.time(), 'kind': kind, 'key': key, 'payload': payload}
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def write_snapshot(self, path: str):
+        '''
+        Writes both databases with the sequence number of the last record included in them
+            and the position in the feed file where the following records start.
+            The file is replaced atomically, so a follower never reads a partial snapshot.
+
+        :param path: Path to the snapshot file
+        :type path: str
+        '''
+        with self._system.read_lock():
+            snapshot = {
+                'seq': self._seq,
+                'offset': self._file.tell(),
+                'medicines': _medicines_payload(self._system, None),
+                'users': _users_payload(self._system, None),
+            }
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as file:
+            json.dump(snapshot, file, ensure_ascii=False)
+        os.replace(temporary_path, path)
+
+
+class Follower:
+    '''
+    Read-only replica of the databases of a primary System, following its change feed
+
+    Attributes
+    ----------
+    :ivar _medicines_database: Replica of the medicines database
+    :vartype _medicines_database: MedicinesDatabase
+
+    :ivar _users_database: Replica of the users database
+    :vartype _users_database: UsersDatabase
+
+    :ivar _path: Path to the feed file
+    :vartype _path: str
+
+    :ivar _offset: Position in the feed file after the last complete line that was read
+    :vartype _offset: int
+
+    :ivar _seq: Sequence number of the last applied record
+    :vartype _seq: int
+
+    :ivar _last_time: Time of the change of the last applied record
+    :vartype _last_time: float
+
+    :ivar _lock: Lock held while records are applied, readers of the replica can hold it to see a consistent state
+    :vartype _lock: threading.Lock
+    '''
+
+    def __init__(self, path: str, snapshot_path: str = None):
+        '''
+        :param path: Path to the feed file
+        :type path: str
+
+        :param snapshot_path: Path to the snapshot written by ChangeFeed.write_snapshot.
+            Only the part of the feed written after it is read. If not given the whole feed is applied. (optional)
+        :type snapshot_path: str
+        '''
+        self._medicines_database = MedicinesDatabase()
+        self._users_database = UsersDatabase()
+        self._path = path
+        self._offset = 0
+        self._seq = 0
+        self._last_time = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = threading.Event()
+        if snapshot_path:
+            with open(snapshot_path, encoding='utf-8') as file:
+                snapshot = json.load(file)
+            self._load_medicines(snapshot['medicines'])
+            self._load_users(snapshot['users'])
+            self._seq = snapshot['seq']
+            self._offset = snapshot['offset']
+
+    def medicines_database(self):
+        return self._medicines_database
+
+    def users_database(self):
+        return self._users_database
+
+    def medicines(self):
+        return self._medicines_database.medicines()
+
+    def users(self):
+        return self._users_database.users()
+
+    def lock(self):
+        return self._lock
+
+    def seq(self):
+        return self._seq
+
+    def lag(self):
+        '''
+        :return: Pair (number of records in the feed which are not applied yet,
+            seconds between the change of the last applied record and now or None if nothing was applied)
+        :rtype: tuple[int, float]
+        '''
+        behind = max(_last_seq(self._path) - self._seq, 0)
+        if self._last_time is None:
+            return behind, None
+        return behind, time.time() - self._last_time
+
+    def _load_medicines(self, payload):
+        self._medicines_database.clear()
+        for data in payload:
+            self._medicines_database.add_medicine(medicine_from_dict(data))
+
+    def _load_users(self, payload):
+        self._users_database.clear()
+        for data in payload:
+            self._users_database.add_user(UsersDatabase._user_from_dict(data))
+
+    def _apply(self, record):
+        kind, key, payload = record['kind'], record['key'], record['payload']
+        if kind == 'medicines':
+            self._load_medicines(payload)
+        elif kind == 'users':
+            self._load_users(payload)
+        elif kind == 'medicine':
+            if payload is None:
+                if key in self._medicines_database.medicines():
+                    self._medicines_database.delete_medicine(key)
+            elif key in self._medicines_database.medicines():
+                self._medicines_database.replace_medicine(medicine_from_dict(payload))
+            else:
+                self._medicines_database.add_medicine(medicine_from_dict(payload))
+        elif kind == 'user':
+            if key in self._users_database.users():
+                self._users_database.delete_user(key)
+            if payload is not None:
+                self._users_database.add_user(UsersDatabase._user_from_dict(payload))
+
+    def poll(self):
+        '''
+        Applies records appended to the feed since the last poll
+
+        :return: Number of applied records
+        :rtype: int
+        '''
+        try:
+            with open(self._path, 'rb') as file:
+                file.seek(self._offset)
+                data = file.read()
+        except FileNotFoundError:
+            return 0
+        # Last line may be still being written
+        end = data.rfind(b'\n') + 1
+        applied = 0
+        with self._lock:
+            for line in data[:end].splitlines():
+                record = json.loads(line)
+                if record['seq'] <= self._seq:
+                    continue
+                self._apply(record)
+                self._seq = record['seq']
+                self._last_time = record['time']
+                applied += 1
+        self._offset += end
+        return applied
+
+    def follow(self, interval: float = 0.1):
+        '''
+        Starts polling the feed in a daemon thread every interval seconds
+        '''
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self, interval):
+        while not self._stopped.wait(interval):
+            try:
+                self.poll()
+            except Exception:
+                # The feed is read again from the same position next time
+                logger.exception('Reading the change feed %s failed', self._path)
@@ -0,0 +1,74 @@
+'''
+Advisory locking of data files shared by many processes (e.g. the GUI and a CLI run from cron).
+A file is locked through a separate file with .lock appended to its name, because writing truncates the data file
+    as it is opened, before a lock on it could be acquired. Processes reading a file hold a shared lock,
+    a process writing it holds an exclusive one, so a reader never sees a partially written file.
+Locks are released by the operating system when the process holding them dies.
+'''
+from .errors import FileLockTimeoutError
+from contextlib import contextmanager
+import time
+import os
+try:
+    import fcntl
+except ImportError:
+    # Advisory locks are not available (e.g. on Windows), files are used without them
+    fcntl = None
+
+
+# How long locking waits for other processes by default, in seconds
+DEFAULT_TIMEOUT = 10.0
+
+# Delay between attempts to acquire a lock, in seconds
+RETRY_DELAY = 0.005
+
+
+def lock_path(path: str):
+    return str(path) + '.lock'
+
+
+@contextmanager
+def locked(path: str, exclusive: bool, timeout: float = DEFAULT_TIMEOUT):
+    '''
+    Context manager holding an advisory lock of the file under the given path
+
+    :param path: Path to the data file
+    :type path: str
+
+    :param exclusive: True for writing (exclusive lock), False for reading (shared lock)
+    :type exclusive: bool
+
+    :param timeout: Maximal time in seconds of waiting for other processes. None means waiting forever. (optional)
+    :type timeout: float
+
+    :raises FileLockTimeoutError: If the lock wasn't acquired in time
+
+    A file which doesn't exist is not locked, so no lock file is left next to a path that never held data.
+        Only the first write of a new file is not protected.
+    '''
+    if fcntl is None or not os.path.exists(path):
+        yield
+        return
+    try:
+        descriptor = os.open(lock_path(path), os.O_RDWR | os.O_CREAT, 0o666)
+    except OSError:
+        if exclusive:
+            raise
+        # Data in a read-only directory can still be read, but nobody can write it either
+        yield
+        return
+    try:
+        operation = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(descriptor, operation | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise FileLockTimeoutError(path)
+                time.sleep(RETRY_DELAY)
+        yield
+    finally:
+        # Closing the descriptor releases the lock
+        os.close(descriptor)
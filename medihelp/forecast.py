@@ -0,0 +1,176 @@
+from datetime import date, timedelta
+
+
+class StockForecast:
+    '''
+    Joins prescriptions of all users with the medicines inventory
+        and projects when every medicine is going to run out.
+
+    Medicines are matched with prescriptions by name. Medicines sharing a name form a pool that is consumed
+        box after box in the order of expiration dates. Expired medicines are not part of any pool.
+    Forecast is updated incrementally: a change of one medicine or of one user's prescriptions
+        only recomputes pools of the affected medicine names.
+
+    Attributes
+    ----------
+    :ivar _system: System whose databases are forecasted
+    :vartype _system: System
+
+    :ivar _medicines_by_name: Dictionary mapping medicine names to IDs of medicines with that name
+    :vartype _medicines_by_name: dict[str, set[int]]
+
+    :ivar _medicine_names: Dictionary mapping medicine IDs to names (needed when the medicine gets deleted)
+    :vartype _medicine_names: dict[int, str]
+
+    :ivar _user_demand: Weekly demand of each user, where user IDs are the keys
+        and values are dictionaries mapping medicine names to weekly number of doses
+    :vartype _user_demand: dict[int, dict[str, int]]
+
+    :ivar _weekly_demand: Dictionary mapping medicine names to weekly number of doses taken by all users
+    :vartype _weekly_demand: dict[str, int]
+
+    :ivar _days_left: Number of days after which the medicine runs out. Medicine IDs are the keys.
+        Medicines that are never going to run out don't have an entry.
+    :vartype _days_left: dict[int, float]
+
+    :ivar _stale_names: Names of medicines which pools have to be recomputed
+    :vartype _stale_names: set[str]
+    '''
+
+    def __init__(self, system):
+        '''
+        :param system: System whose databases are forecasted
+        :type system: System
+        '''
+        self._system = system
+        self._medicines_by_name = {}
+        self._medicine_names = {}
+        self._user_demand = {}
+        self._weekly_demand = {}
+        self._days_left = {}
+        self._stale_names = set()
+        self._rebuild_medicines()
+        self._rebuild_users()
+        system.add_change_listener(self._on_change)
+
+    def _rebuild_medicines(self):
+        self._medicines_by_name.clear()
+        self._medicine_names.clear()
+        self._days_left.clear()
+        for medicine in self._system.medicines().values():
+            self._index_medicine(medicine.id(), medicine.name())
+        self._stale_names.update(self._medicines_by_name.keys())
+
+    def _rebuild_users(self):
+        for user_id in list(self._user_demand.keys()):
+            if user_id not in self._system.users():
+                self._update_user(user_id)
+        for user_id in self._system.users().keys():
+            self._update_user(user_id)
+
+    def _index_medicine(self, medicine_id, name):
+        self._medicine_names[medicine_id] = name
+        self._medicines_by_name.setdefault(name, set()).add(medicine_id)
+
+    def _update_medicine(self, medicine_id):
+        old_name = self._medicine_names.pop(medicine_id, None)
+        if old_name is not None:
+            self._medicines_by_name[old_name].discard(medicine_id)
+            if not self._medicines_by_name[old_name]:
+                del self._medicines_by_name[old_name]
+            self._stale_names.add(old_name)
+        self._days_left.pop(medicine_id, None)
+        medicine = self._system.medicines().get(medicine_id)
+        if medicine:
+            self._index_medicine(medicine_id, medicine.name())
+            self._stale_names.add(medicine.name())
+
+    def _update_user(self, user_id):
+        old_demand = self._user_demand.pop(user_id, {})
+        new_demand = {}
+        user = self._system.users().get(user_id)
+        if user:
+            for prescription in user.prescriptions().values():
+                name = prescription.medicine_name()
+                new_demand[name] = new_demand.get(name, 0) + prescription.dosage()
+            self._user_demand[user_id] = new_demand
+        for name in set(old_demand.keys()).union(new_demand.keys()):
+            difference = new_demand.get(name, 0) - old_demand.get(name, 0)
+            if difference:
+                self._weekly_demand[name] = self._weekly_demand.get(name, 0) + difference
+                if not self._weekly_demand[name]:
+                    del self._weekly_demand[name]
+                self._stale_names.add(name)
+
+    def _on_change(self, kind, key):
+        if kind == 'medicine':
+            self._update_medicine(key)
+        elif kind == 'user':
+            self._update_user(key)
+        elif kind == 'medicines':
+            self._rebuild_medicines()
+        elif kind == 'users':
+            self._rebuild_users()
+
+    def _recompute(self):
+        '''
+        Recomputes pools of all stale medicine names
+        '''
+        today = date.today()
+        for name in self._stale_names:
+            ids = self._medicines_by_name.get(name, ())
+            for medicine_id in ids:
+                self._days_left.pop(medicine_id, None)
+            daily_demand = self._weekly_demand.get(name, 0) / 7
+            if daily_demand <= 0:
+                continue
+            medicines = [self._system.medicines()[medicine_id] for medicine_id in ids]
+            medicines = [medicine for medicine in medicines if medicine.expiration_date() >= today]
+            medicines.sort(key=lambda medicine: (medicine.expiration_date(), medicine.id()))
+            doses = 0
+            for medicine in medicines:
+                doses += medicine.doses_left()
+                self._days_left[medicine.id()] = doses / daily_demand
+        self._stale_names.clear()
+
+    def weekly_demand(self, medicine_name: str):
+        '''
+        :return: Number of doses of the medicine with given name taken by all users in a week
+        :rtype: int
+        '''
+        return self._weekly_demand.get(str(medicine_name).title(), 0)
+
+    def run_out_date(self, medicine_id: int):
+        '''
+        :return: Projected date when the medicine runs out or None if it is not taken by anyone (or is expired)
+        :rtype: date
+        '''
+        self._recompute()
+        days = self._days_left.get(medicine_id)
+        if days is None:
+            return None
+        return date.today() + timedelta(days=int(days))
+
+    def run_out_dates(self):
+        '''
+        :return: Dictionary mapping IDs of all medicines that are being taken to their projected run-out dates
+        :rtype: dict[int, date]
+        '''
+        self._recompute()
+        today = date.today()
+        return {medicine_id: today + timedelta(days=int(days)) for medicine_id, days in self._days_left.items()}
+
+    def running_low(self, days: int = 14):
+        '''
+        :param days: Horizon of the forecast in days
+        :type days: int
+
+        :return: List of pairs (medicine ID, run-out date) of medicines that run out within given number of days,
+            sorted by the run-out date
+        :rtype: list[tuple[int, date]]
+        '''
+        dates = self.run_out_dates()
+        limit = date.today() + timedelta(days=days)
+        result = [(medicine_id, run_out) for medicine_id, run_out in dates.items() if run_out <= limit]
+        result.sort(key=lambda pair: (pair[1], pair[0]))
+        return result
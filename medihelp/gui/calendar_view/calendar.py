@@ -54,38 +54,63 @@ class Calendar(ctk.CTkFrame):
                                                          corner_radius=5, font=(gs.font_name, 12, 'bold'))
             self._weekday_labels[weekday].grid(row=0, column=weekday, padx=2, pady=2, sticky='we')
 
-        # Free row counter for each column
-        #   (weekdays are indexed from 1 so ther is one additional value in the list)
-        self._free_row = [1, 1, 1, 1, 1, 1, 1, 1]
-        # Calendar tiles lists for each column
-        #   (weekdays are indexed from 1 so ther is one additional value in the list)
-        self._calendar_tiles = [[], [], [], [], [], [], [], []]
+        # Calendar tiles where keys are tuples (user ID, prescription ID)
+        self._calendar_tiles = {}
 
     def clear_calendar(self):
-        for row in range(1, 8):
-            for tile in self._calendar_tiles[row]:
-                tile.destroy()
-            self._calendar_tiles[row].clear()
-        self._free_row = [1, 1, 1, 1, 1, 1, 1, 1]
+        for tile in self._calendar_tiles.values():
+            tile.destroy()
+        self._calendar_tiles.clear()
 
     def load_prescriptions(self, users_list: Iterable[User]):
         '''
-        Creates and displays calendar tiles based of users' prescriptions
-        1) When ther is only one user in the users_list create calendar tiles without user names
-        2) Otherwise creates calendar tiles with user names
+        Displays calendar tiles based of users' prescriptions.
+            Only the difference with currently displayed tiles is applied:
+            tiles of removed prescriptions are destroyed, tiles of changed prescriptions are updated
+            and tiles are created only for new prescriptions.
+        1) When ther is only one user in the users_list tiles are shown without user names
+        2) Otherwise tiles are shown with user names
 
         :param users_list: List of users whose prescriptions are to be displayed
         :type users_list: iterable of User
         '''
+        users_list = list(users_list)
+        wanted = {}
         for user in users_list:
+            user_name = user.name() if len(users_list) != 1 else None
             for prescription in user.prescriptions().values():
-                if len(users_list) == 1:
-                    tile = CalendarTile(self._system, self._gui, self,
-                                        color=gs.lime__color, prescription=prescription)
-                else:
-                    tile = CalendarTile(self._system, self._gui, self,
-                                        color=gs.lime__color, prescription=prescription,
-                                        user_name=user.name())
-                self._calendar_tiles[tile.weekday()].append(tile)
-                tile.grid(row=self._free_row[tile.weekday()], column=tile.weekday(), sticky='we')
-                self._free_row[tile.weekday()] += 1
+                wanted[(user.id(), prescription.id())] = (prescription, user_name)
+
+        # Weekdays which columns have to be laid out again
+        changed_weekdays = set()
+        for key in list(self._calendar_tiles.keys()):
+            if key not in wanted:
+                tile = self._calendar_tiles.pop(key)
+                changed_weekdays.add(tile.weekday())
+                tile.destroy()
+        for key, (prescription, user_name) in wanted.items():
+            tile = self._calendar_tiles.get(key)
+            if tile is None:
+                self._calendar_tiles[key] = CalendarTile(self._system, self._gui, self,
+                                                         color=gs.lime__color, prescription=prescription,
+                                                         user_name=user_name)
+                changed_weekdays.add(prescription.weekday())
+            elif tile.prescription() is not prescription or tile.user_name() != user_name:
+                if tile.weekday() != prescription.weekday():
+                    changed_weekdays.add(tile.weekday())
+                    changed_weekdays.add(prescription.weekday())
+                tile.update_tile(prescription, user_name)
+
+        for weekday in changed_weekdays:
+            self._layout_column(weekday)
+
+    def _layout_column(self, weekday: int):
+        '''
+        Grids tiles of the given weekday one under another, ordered by user ID and prescription ID
+        '''
+        row = 1
+        for key in sorted(self._calendar_tiles.keys()):
+            tile = self._calendar_tiles[key]
+            if tile.weekday() == weekday:
+                tile.grid(row=row, column=weekday, sticky='we')
+                row += 1
@@ -12,6 +12,12 @@ class CalendarTile(ctk.CTkFrame):
 
     :ivar weekday: Prescription's weekday (Number from 1 to 7)
     :vartype weekday: int
+
+    :ivar _prescription: Displayed prescription
+    :vartype _prescription: Prescription
+
+    :ivar _user_name: Displayed user name or None if it is not shown
+    :vartype _user_name: str
     '''
     def __init__(self, system_handler: System, gui_handler: GUI, parent,
                  color: str, prescription: Prescription, user_name: str = None):
@@ -42,21 +48,48 @@ class CalendarTile(ctk.CTkFrame):
         self.padx = 2
         self.pady = 5
 
-        self._weekday = prescription.weekday()
+        self._user_name_label = ctk.CTkLabel(self, text='', justify='left',
+                                             font=(gs.font_name, 12, 'bold'))
+        self._medicine_name_label = ctk.CTkLabel(self, justify='left', text='',
+                                                 font=(gs.font_name, 12))
+        self._dosage_label = ctk.CTkLabel(self, text='', justify='left', font=(gs.font_name, 12))
 
-        if user_name:
-            self._user_name_label = ctk.CTkLabel(self, text=user_name, justify='left',
-                                                 font=(gs.font_name, 12, 'bold'))
-            self._user_name_label.pack(padx=self.padx, pady=self.pady, anchor='w')
+        self._prescription = None
+        self._user_name = None
+        self.update_tile(prescription, user_name)
 
-        self._medicine_name_label = ctk.CTkLabel(self, justify='left',
-                                                 text=f'Lek:\n{prescription.medicine_name()}',
-                                                 font=(gs.font_name, 12))
-        self._medicine_name_label.pack(padx=self.padx, pady=self.pady, anchor='w')
+    def update_tile(self, prescription: Prescription, user_name: str = None):
+        '''
+        Changes displayed prescription and user name. Only labels whose text changed are reconfigured.
+
+        :param prescription: prescription object to be visualized
+        :type prescription: Prescription
+
+        :param user_name: Name of the user if it is to be shown (optional)
+        :type user_name: str
+        '''
+        if user_name != self._user_name or self._prescription is None:
+            self._user_name_label.pack_forget()
+            self._medicine_name_label.pack_forget()
+            self._dosage_label.pack_forget()
+            if user_name:
+                self._user_name_label.configure(text=user_name)
+                self._user_name_label.pack(padx=self.padx, pady=self.pady, anchor='w')
+            self._medicine_name_label.pack(padx=self.padx, pady=self.pady, anchor='w')
+            self._dosage_label.pack(padx=self.padx, pady=self.pady, anchor='w')
+            self._user_name = user_name
+        if self._prescription is None or prescription.medicine_name() != self._prescription.medicine_name():
+            self._medicine_name_label.configure(text=f'Lek:\n{prescription.medicine_name()}')
+        if self._prescription is None or prescription.dosage() != self._prescription.dosage():
+            self._dosage_label.configure(text=f'Dawkowanie: {prescription.dosage()}')
+        self._prescription = prescription
+        self._weekday = prescription.weekday()
+
+    def prescription(self):
+        return self._prescription
 
-        self._dosage_label = ctk.CTkLabel(self, text=f'Dawkowanie: {prescription.dosage()}',
-                                          justify='left', font=(gs.font_name, 12))
-        self._dosage_label.pack(padx=self.padx, pady=self.pady, anchor='w')
+    def user_name(self):
+        return self._user_name
 
     def weekday(self):
         return self._weekday
\ No newline at end of file
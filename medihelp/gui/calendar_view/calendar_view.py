@@ -24,9 +24,8 @@ class CalendarView(View):
 
         # Choose user dropdown
         self._name_to_id_map = {}
-        for user_id, user in self._system.users().items():
-            self._name_to_id_map[user.name()] = user_id
-        self._name_to_id_map['Wszyscy użytkownicy'] = None
+        self._users_version = None
+        self._update_name_to_id_map()
         self._selected_name = ctk.StringVar(value='Wszyscy użytkownicy')
         self._choose_user_dropdown = ctk.CTkOptionMenu(self._welcome_frame, variable=self._selected_name,
                                                        values=list(self._name_to_id_map.keys()),
@@ -47,7 +46,6 @@ class CalendarView(View):
         '''
         Loads prescription tiles to the calendar based on user's choice
         '''
-        self._calendar.clear_calendar()
         user_id = self._name_to_id_map[self._selected_name.get()]
         if user_id is None:
             self._calendar.load_prescriptions(self._system.users().values())
@@ -58,17 +56,27 @@ class CalendarView(View):
                 raise UserDoesNotExistError(user_id)
             self._calendar.load_prescriptions([user])
 
-    def update_view(self):
-        super().update_view()
+    def _update_name_to_id_map(self):
+        '''
+        Recreates _name_to_id_map if the users database changed since the last call
 
-        # recreate _name_to_id_map
-        self._name_to_id_map.clear()
-        for user_id, user in self._system.users().items():
-            self._name_to_id_map[user.name()] = user_id
+        :return: True if the map was recreated
+        :rtype: bool
+        '''
+        users_database = self._system.users_database()
+        if self._users_version == users_database.version():
+            return False
+        self._users_version = users_database.version()
+        self._name_to_id_map = dict(users_database.name_to_id())
         self._name_to_id_map['Wszyscy użytkownicy'] = None
+        return True
+
+    def update_view(self):
+        super().update_view()
 
         # Update choose user dropdown
-        self._choose_user_dropdown.configure(values=list(self._name_to_id_map.keys()))
+        if self._update_name_to_id_map():
+            self._choose_user_dropdown.configure(values=list(self._name_to_id_map.keys()))
         user = self._system.users().get(self._gui.current_user_id())
         if not user:
             self._selected_name.set('Wszyscy użytkownicy')
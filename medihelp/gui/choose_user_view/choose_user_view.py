@@ -19,11 +19,7 @@ class ChooseUserView(View):
         self._welcome_label = ctk.CTkLabel(self, text="Witaj w Medihelp!", font=(gs.font_name, 30, 'bold'))
         self._welcome_label.pack(pady=80)
 
-        self._name_to_id_map = {}
-        names = []
-        for user_id, user in self._system.users().items():
-            names.append(user.name())
-            self._name_to_id_map[user.name()] = user_id
+        self._name_to_id_map = dict(self._system.users_database().name_to_id())
         self._selected_name = ctk.StringVar(value='Wybierz użytkownika')
         self._choose_user_dropdown = ctk.CTkOptionMenu(self, variable=self._selected_name,
                                                        values=list(self._name_to_id_map.keys()),
@@ -1,5 +1,6 @@
 import customtkinter as ctk
 import tkinter as tk
+from tkinter import messagebox
 from medihelp.system import System
 from . import global_settings as gs
 from medihelp.errors import WrongArgumentsError, ViewDoesNotExist, UserDoesNotExistError
@@ -20,7 +21,14 @@ class GUI(ctk.CTk):
     :vartype _current_user_id: int
     '''
 
-    def __init__(self, system_handler: System):
+    def __init__(self, system_handler: System, watcher=None):
+        '''
+        :param system_handler: System object handler
+        :type system_handler: System
+
+        :param watcher: Watcher of the data files which merges changes made by other programs (optional)
+        :type watcher: FileWatcher
+        '''
         ctk.set_appearance_mode("light")
 
         # Imports here in order to avoid circular import
@@ -60,8 +68,35 @@ class GUI(ctk.CTk):
         # For Linux scroll down
         self.bind_all("<Button-5>", lambda e: self._views[self._current_view].scroll_down(e))
 
+        # Reminders about prescriptions of the current user
+        self._system.scheduler().add_callback(self._reminder_handler)
+        self._system.scheduler().attach(self)
+
+        # Changes of the data files made by other programs, checked in the main loop
+        if watcher is not None:
+            watcher.add_merge_listener(lambda merged: self.update_views())
+            watcher.add_conflict_listener(self._conflict_handler)
+            watcher.attach(self)
+
         self.mainloop()
 
+    def _reminder_handler(self, reminder):
+        '''
+        Shows a reminder about a prescription if it belongs to the current user
+        '''
+        if reminder.user_id != self._current_user_id:
+            return
+        messagebox.showinfo(title='Przypomnienie',
+                            message=f'Czas przyjąć lek {reminder.medicine_name} (dawkowanie: {reminder.dosage}).')
+
+    def _conflict_handler(self, conflicts):
+        '''
+        Warns that records were changed both in the application and in the files by another program
+        '''
+        messagebox.showwarning(title='Konflikt',
+                               message=f'Liczba rekordów zmienionych jednocześnie przez inny program: {len(conflicts)}.'
+                                       ' Zachowano wersję z aplikacji, zapisanie bazy nadpisze zmiany w pliku.')
+
     def current_user_id(self):
         return self._current_user_id
 
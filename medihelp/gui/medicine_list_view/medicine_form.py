@@ -90,6 +90,21 @@ class MedicineForm(ctk.CTkFrame):
         # Create a dictionary of checkboxes where user id is the key and chackbox is the value
         self._recipients_checkboxes_variables = {}
         self._recipients_checkboxes = {}
+        self._users_version = None
+        self._update_recipients_checkboxes()
+
+    def _update_recipients_checkboxes(self):
+        '''
+        Recreates recipients checkboxes if the users database changed since they were created
+        '''
+        users_database = self._system.users_database()
+        if self._users_version == users_database.version():
+            return
+        self._users_version = users_database.version()
+        for checkbox in self._recipients_checkboxes.values():
+            checkbox.destroy()
+        self._recipients_checkboxes.clear()
+        self._recipients_checkboxes_variables.clear()
         for user_id, user in self._system.users().items():
             variable = ctk.IntVar(value=0)
             checkbox = ctk.CTkCheckBox(self, text=user.name(), variable=variable,
@@ -114,6 +129,7 @@ class MedicineForm(ctk.CTkFrame):
         self._substances_textbox.insert('0.0', 'Podaj nazwy substancji oddzielone przecinkiem.')
         self._illnesses_textbox.delete('0.0', ctk.END)
         self._illnesses_textbox.insert('0.0', 'Podaj nazwy chorób i dolegliwości oddzielone przecinkiem.')
+        self._update_recipients_checkboxes()
         for int_var in self._recipients_checkboxes_variables.values():
             int_var.set(0)
 
@@ -134,7 +150,9 @@ class MedicineForm(ctk.CTkFrame):
             self._illnesses_textbox.insert('0.0', illnesses_str)
 
             for user_id in medicine.recipients():
-                self._recipients_checkboxes_variables[user_id].set(1)
+                variable = self._recipients_checkboxes_variables.get(user_id)
+                if variable:
+                    variable.set(1)
 
     def name(self):
         '''
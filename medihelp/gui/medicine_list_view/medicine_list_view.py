@@ -1,5 +1,6 @@
 from .medicine_tile import MedicineTile
 from .add_medicine_tile import AddMedicineTile
+from .running_low_tile import RunningLowTile
 from medihelp.gui.gui import GUI
 from medihelp.gui.view import View
 from medihelp.errors import MedicineDoesNotExistError
@@ -29,12 +30,15 @@ class MedicineListView(View):
 
         self.columnconfigure(0, weight=1)
 
+        # Shown only when there are medicines running low
+        self._running_low_tile = RunningLowTile(self._system, self._gui, self)
+
         self._add_medicine_tile = AddMedicineTile(self._system, self._gui, self)
-        self._add_medicine_tile.grid(row=0, column=0, padx=20, pady=10, sticky='we')
+        self._add_medicine_tile.grid(row=1, column=0, padx=20, pady=10, sticky='we')
 
         # _free_row attribute is important when adding new medicine tiles.
         #   It's not decremented when a tile is deleted.
-        self._free_row = 1
+        self._free_row = 2
 
         self._medicine_tiles = {}
 
@@ -45,6 +49,7 @@ class MedicineListView(View):
         Called when system informations like databases data change so that the view can update it's content.
         '''
         super().update_view()
+        self._update_running_low_tile()
 
         for tile in self._medicine_tiles.values():
             tile.destroy()
@@ -74,6 +79,7 @@ class MedicineListView(View):
         :param medicine_id: ID of the medicine whose tile is to be updated
         :type medicine_id: int
         '''
+        self._update_running_low_tile()
         medicine = self._system.medicines().get(medicine_id)
         try:
             tile = self._medicine_tiles.pop(medicine_id)
@@ -94,6 +100,15 @@ class MedicineListView(View):
             except Exception:
                 raise MedicineDoesNotExistError(medicine_id)
 
+    def _update_running_low_tile(self):
+        '''
+        Shows the running low tile if there are medicines that are going to run out soon, otherwise hides it
+        '''
+        if self._running_low_tile.update_tile():
+            self._running_low_tile.grid(row=0, column=0, padx=20, pady=10, sticky='we')
+        else:
+            self._running_low_tile.grid_forget()
+
     def _add_tile(self, medicine_id):
         '''
         Adds tile responsible for displaying info about the medicine with given id
@@ -144,14 +144,8 @@ class MedicineInfoTile(ctk.CTkFrame):
                                                    font=(gs.font_name, 10, "bold"))
         self._expiration_date_label.pack(padx=self.padx, pady=self.pady, anchor='w')
 
-        recipients = set()
-        for id in self._medicine.recipients():
-            user = self._system.users().get(id)
-            if user:
-                name = user.name()
-            else:
-                name = "Nieznany użytkownik"
-            recipients.add(name)
+        recipients = set(self._system.users_database().names_of(self._medicine.recipients(),
+                                                                 default="Nieznany użytkownik"))
         self._recipients_label = ctk.CTkLabel(self, justify='left', wraplength=gs.min_width - 100,
                                               text=f'Użytkownicy przyjmujący lek: {set_of_strings_to_string(recipients)}',
                                               font=(gs.font_name, 10))
@@ -0,0 +1,59 @@
+import customtkinter as ctk
+from medihelp.gui import global_settings as gs
+from medihelp.gui.gui import GUI
+from medihelp.system import System
+
+
+class RunningLowTile(ctk.CTkFrame):
+    '''
+    Class RunningLowTile represents a tile listing medicines that are going to run out soon
+        according to the users' prescriptions. Displayed at the top of the medicine list view.
+
+    :ivar _days: Horizon of the forecast in days
+    :vartype _days: int
+    '''
+    def __init__(self, system_handler: System, gui_handler: GUI, parent, days: int = 14):
+        '''
+        :param system_handler: System object handler
+        :type system_handler: System
+
+        :param gui_handler: gui object handler
+        :type gui_handler: GUI
+
+        :param parent: parent object used for initialization of tkinter objects
+        :type parent: tkinter.Misc
+
+        :param days: Horizon of the forecast in days (optional)
+        :type days: int
+        '''
+        super().__init__(parent, border_width=1)
+
+        self._system = system_handler
+        self._gui = gui_handler
+        self._days = days
+
+        self.columnconfigure(0, weight=1)
+
+        self._title_label = ctk.CTkLabel(self, justify='left', wraplength=gs.min_width - 100,
+                                         text=f'Leki, które skończą się w ciągu {self._days} dni',
+                                         font=(gs.font_name, 14, 'bold'))
+        self._title_label.grid(row=0, column=0, padx=20, pady=10, sticky='w')
+
+        self._medicines_label = ctk.CTkLabel(self, justify='left', wraplength=gs.min_width - 100,
+                                             text='', font=(gs.font_name, 10))
+        self._medicines_label.grid(row=1, column=0, padx=20, pady=(0, 10), sticky='w')
+
+    def update_tile(self):
+        '''
+        Refreshes the list of medicines that are running low.
+
+        :return: True if there is at least one medicine running low, else False
+        :rtype: bool
+        '''
+        lines = []
+        for medicine_id, run_out_date in self._system.forecast().running_low(self._days):
+            medicine = self._system.medicines().get(medicine_id)
+            if medicine:
+                lines.append(f'{medicine.name()} (pozostałe dawki: {medicine.doses_left()}) - skończy się około {run_out_date}')
+        self._medicines_label.configure(text='\n'.join(lines))
+        return bool(lines)
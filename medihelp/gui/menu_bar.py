@@ -7,6 +7,14 @@ from medihelp.system import System
 from .global_settings import font_name
 
 
+# File types offered by the file dialogs
+MEDICINES_FILE_TYPES = [
+    ("CSV Files", "*.csv"),
+    ("Compressed CSV Files", "*.csv.gz *.csv.xz *.csv.bz2"),
+    ("All Files", "*")
+]
+
+
 class MenuBar(tk.Menu):
     '''
     Class representing menu bar at the top of the screen.
@@ -33,6 +41,14 @@ class MenuBar(tk.Menu):
         self._file_menu.add_command(label='Załaduj bazę leków', command=self.load_file_button_handler)
         self.add_cascade(menu=self._file_menu, label="Plik")
 
+        # Edit menu
+        self._edit_menu = tk.Menu(self, font=self._font, tearoff=False)
+        self._edit_menu.add_command(label='Cofnij', accelerator='Ctrl+Z', command=self.undo_button_handler)
+        self._edit_menu.add_command(label='Ponów', accelerator='Ctrl+Y', command=self.redo_button_handler)
+        self.add_cascade(menu=self._edit_menu, label="Edycja")
+        self._gui.bind('<Control-z>', self._shortcut(self.undo_button_handler))
+        self._gui.bind('<Control-y>', self._shortcut(self.redo_button_handler))
+
         # View menu
         self._view_menu = tk.Menu(self, font=self._font, tearoff=False)
         self._view_menu.add_command(label='Wyświetl listę leków', command=self.show_medicine_list_button_handler)
@@ -50,7 +66,7 @@ class MenuBar(tk.Menu):
             if not messagebox.askyesno(title="Załaduj inny plik",
                                        message="Czy na pewno chcesz załadować nowy plik, bez zapisania zmian w pliku obecnym?"):
                 return
-        path = askopenfilename(title="Wybierz plik do odczytu", filetypes=[("CSV Files", "*.csv")])
+        path = askopenfilename(title="Wybierz plik do odczytu", filetypes=MEDICINES_FILE_TYPES)
         if not path:
             return
         try:
@@ -74,7 +90,7 @@ class MenuBar(tk.Menu):
         '''
         Asks user to choose path and saves medicine database under it.
         '''
-        path = asksaveasfilename(title="Wybierz plik do zapisu", defaultextension=".csv", filetypes=[("CSV Files", "*.csv")])
+        path = asksaveasfilename(title="Wybierz plik do zapisu", defaultextension=".csv", filetypes=MEDICINES_FILE_TYPES)
         if not path:
             return
         try:
@@ -82,6 +98,37 @@ class MenuBar(tk.Menu):
         except DataSavingError as e:
             messagebox.showerror(title="Błąd", message=str(e))
 
+    def undo_button_handler(self):
+        '''
+        Reverts the latest change of the databases
+        '''
+        self._history_step(self._system.undo)
+
+    def redo_button_handler(self):
+        '''
+        Applies again the latest reverted change of the databases
+        '''
+        self._history_step(self._system.redo)
+
+    def _shortcut(self, handler):
+        '''
+        Returns a handler of a keyboard shortcut of the main window which does nothing while a text field has focus,
+            so text fields keep their own undo and redo
+        '''
+        def run(event):
+            if isinstance(event.widget, (tk.Entry, tk.Text)):
+                return
+            handler()
+        return run
+
+    def _history_step(self, step):
+        try:
+            if not step():
+                return
+        except DataSavingError as e:
+            messagebox.showerror(title="Błąd", message=str(e))
+        self._gui.update_views()
+
     def modify_users_info_button_handler(self):
         '''
         Changes view to modify-user-view
@@ -18,6 +18,7 @@ from .errors import (InvalidMedicineNameError,
                      InvalidIllnessNameError)
 from medihelp.common import normalize_name
 from typing import Iterable
+import copy
 
 
 class Medicine:
@@ -180,6 +181,19 @@ class Medicine:
     def __hash__(self):
         return hash((self.id, self.name))
 
+    def copy(self):
+        '''
+        Returns a copy of the medicine which can be modified without affecting this one
+
+        :rtype: Medicine
+        '''
+        medicine = copy.copy(self)
+        medicine._illnesses = set(self._illnesses)
+        medicine._recipients = set(self._recipients)
+        medicine._substances = set(self._substances)
+        medicine._notes = dict(self._notes)
+        return medicine
+
     def id(self):
         return self._id
 
@@ -297,5 +311,11 @@ class Medicine:
             raise UserIsNotARecipientWarning
         self._doses_left -= doses
 
+    def restore_doses(self, doses):
+        '''
+        Adds back doses that were taken with take_doses. Used when a taken dose is rolled back or undone.
+        '''
+        self._doses_left += doses
+
     def is_expired(self) -> bool:
         return date.today() > self.expiration_date()
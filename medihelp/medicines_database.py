@@ -1,10 +1,210 @@
 from .medicine import Medicine
 from .errors import MalformedDataError, IdAlreadyInUseError, NoSuchIdInTheDatabaseError
+from .columnar import MedicineColumns
 from datetime import date
+from io import StringIO
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from types import MappingProxyType
+import threading
+import mmap
 import csv
 import ast
 
 
+# Order of the columns in a .csv file with medicines database
+HEADER = [
+    'id',
+    'name',
+    'manufacturer',
+    'illnesses',
+    'recipients',
+    'substances',
+    'recommended_age',
+    'doses',
+    'doses_left',
+    'expiration_date',
+    'notes'
+]
+
+
+class LazyMedicines(MutableMapping):
+    '''
+    Dictionary-like collection of medicines backed by a memory-mapped .csv file.
+        Loading only indexes where rows start, a Medicine object is created on the first access to it.
+        Materialized medicines are kept in an LRU cache of limited size.
+        Medicines that were added or modified are pinned in memory and never evicted.
+
+    Attributes
+    ----------
+    :ivar _path: Path to the mapped file
+    :vartype _path: str
+
+    :ivar _offsets: Offsets of rows in the mapped file of medicines that were not modified. Medicine IDs are the keys.
+    :vartype _offsets: dict[int, int]
+
+    :ivar _cache: Recently used medicines materialized from the mapped file
+    :vartype _cache: OrderedDict[int, Medicine]
+
+    :ivar _pinned: Medicines that were added or modified since the file was mapped
+    :vartype _pinned: dict[int, Medicine]
+
+    :ivar _cache_size: Maximal number of medicines in _cache
+    :vartype _cache_size: int
+    '''
+
+    def __init__(self, path: str, cache_size: int = 1024):
+        '''
+        :param path: Path to the .csv file
+        :type path: str
+        :param cache_size: Maximal number of not modified medicines kept in memory
+        :type cache_size: int
+        '''
+        self._path = path
+        self._cache_size = cache_size
+        self._offsets = {}
+        self._cache = OrderedDict()
+        self._pinned = {}
+        self._map = None
+        with open(path, 'rb') as file:
+            try:
+                self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty file can't be mapped
+                return
+        self._index_rows()
+
+    def _index_rows(self):
+        '''
+        Reads the header and builds the index of row offsets
+        '''
+        header_end = self._line_end(0)
+        try:
+            self._fieldnames = next(csv.reader([self._map[:header_end].decode('utf-8')]))
+            id_column = self._fieldnames.index('id')
+        except Exception as e:
+            raise MalformedDataError(self._path, 1) from e
+        self._standard_header = self._fieldnames == HEADER
+        start = header_end + 1
+        size = len(self._map)
+        while start < size:
+            end = self._line_end(start)
+            if self._map[start:end].strip():
+                try:
+                    if id_column == 0:
+                        id = int(self._map[start:self._map.find(b',', start, end)])
+                    else:
+                        id = int(self._parse_line(start, end)['id'])
+                except Exception as e:
+                    raise MalformedDataError(self._path, self._row_number(start)) from e
+                if id in self._offsets:
+                    raise MalformedDataError(self._path, self._row_number(start)) from IdAlreadyInUseError()
+                self._offsets[id] = start
+            start = end + 1
+
+    def _line_end(self, start):
+        '''
+        Returns the offset of the newline ending the row which starts at start.
+            A quoted field can contain newlines, a newline ends the row only if the quotes before it are balanced
+            (quotes inside fields are doubled, so they don't change the parity).
+        '''
+        end = self._map.find(b'\n', start)
+        quotes = self._map[start:end].count(b'"') if end != -1 else 0
+        while quotes % 2:
+            previous = end
+            end = self._map.find(b'\n', previous + 1)
+            if end == -1:
+                break
+            quotes += self._map[previous:end].count(b'"')
+        return len(self._map) if end == -1 else end
+
+    def _row_number(self, start):
+        return self._map[:start].count(b'\n') + 1
+
+    def _parse_line(self, start, end):
+        line = self._map[start:end].decode('utf-8')
+        return dict(zip(self._fieldnames, next(csv.reader([line]))))
+
+    def _materialize(self, id):
+        start = self._offsets[id]
+        try:
+            medicine = MedicinesDatabase._medicine_from_row(self._parse_line(start, self._line_end(start)))
+        except Exception as e:
+            raise MalformedDataError(self._path, self._row_number(start)) from e
+        self._cache[id] = medicine
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return medicine
+
+    def path(self):
+        return self._path
+
+    def raw_row(self, id):
+        '''
+        Returns the row of a not modified medicine exactly as it is written in the mapped file.
+        Returns None if the medicine was modified or the file doesn't have the standard header.
+
+        :param id: ID of the medicine
+        :type id: int
+        '''
+        start = self._offsets.get(id)
+        if start is None or not self._standard_header:
+            return None
+        return self._map[start:self._line_end(start)].rstrip(b'\r').decode('utf-8') + '\n'
+
+    def pin(self, id):
+        '''
+        Keeps the medicine with given ID in memory for good. Called when the medicine is modified in place.
+        '''
+        if id in self._pinned:
+            return
+        self._pinned[id] = self[id]
+        self._cache.pop(id, None)
+        del self._offsets[id]
+
+    def close(self):
+        self._offsets.clear()
+        self._cache.clear()
+        self._pinned.clear()
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def __getitem__(self, id):
+        medicine = self._pinned.get(id)
+        if medicine is not None:
+            return medicine
+        medicine = self._cache.get(id)
+        if medicine is not None:
+            self._cache.move_to_end(id)
+            return medicine
+        if id not in self._offsets:
+            raise KeyError(id)
+        return self._materialize(id)
+
+    def __setitem__(self, id, medicine):
+        self._offsets.pop(id, None)
+        self._cache.pop(id, None)
+        self._pinned[id] = medicine
+
+    def __delitem__(self, id):
+        if id not in self:
+            raise KeyError(id)
+        self._offsets.pop(id, None)
+        self._cache.pop(id, None)
+        self._pinned.pop(id, None)
+
+    def __contains__(self, id):
+        return id in self._offsets or id in self._pinned
+
+    def __iter__(self):
+        yield from list(self._offsets.keys())
+        yield from list(self._pinned.keys())
+
+    def __len__(self):
+        return len(self._offsets) + len(self._pinned)
+
+
 class MedicinesDatabase:
     '''
     Stores a dictionary of medicines where IDs of those medicines are the keys.
@@ -14,59 +214,273 @@ class MedicinesDatabase:
     ---------
     :ivar _medicines: Dictionary with all medicines registered in the system. Id of the medicine being the key.
     :vartype _medicines: dict[int, Medicine]
+
+    :ivar _row_cache: Serialized csv rows of medicines that did not change since they were last read or written.
+        Medicine IDs are the keys. A medicine without an entry is considered dirty.
+    :vartype _row_cache: dict[int, str]
+
+    :ivar _sorted_ids: IDs of the medicines in ascending order or None if they have to be sorted again
+    :vartype _sorted_ids: list[int]
+
+    :ivar _columns: Columnar representation of the database or None if it was not requested yet
+    :vartype _columns: MedicineColumns
+
+    :ivar _snapshot: Read-only view of _medicines handed out by snapshot() or None.
+        While it is set, _medicines is shared with the snapshot and is copied before the next change.
+    :vartype _snapshot: MappingProxyType
+
+    :ivar _records_shared: True if medicine objects may be referenced by a snapshot,
+        so they have to be copied before they are modified in place (see writable_medicine)
+    :vartype _records_shared: bool
+
+    :ivar _snapshot_lock: Guards _snapshot, _records_shared and _owned in snapshot(),
+        which many readers can call at the same time. Changes of the database are not made while it is read.
+    :vartype _snapshot_lock: threading.Lock
+
+    :ivar _owned: IDs of medicines copied since the last snapshot, which can be modified in place
+    :vartype _owned: set[int]
+
+    :ivar _free_id: Every ID lower than this one is in use, searching for a free ID starts here
+    :vartype _free_id: int
     '''
 
     def __init__(self):
         self._medicines = {}
+        self._row_cache = {}
+        self._sorted_ids = []
+        self._columns = None
+        self._snapshot = None
+        self._records_shared = False
+        self._owned = set()
+        self._snapshot_lock = threading.Lock()
+        self._free_id = 0
 
     def medicines(self):
         return self._medicines
 
+    def snapshot(self):
+        '''
+        Returns read-only dictionary of medicines which later changes of the database don't affect.
+            Taking a snapshot is O(1): the dictionary is shared until the next change copies it
+            and medicines are copied one by one when they are modified (see writable_medicine).
+            A lazy database is the exception: every medicine is materialized into the snapshot, which costs O(n).
+            It can be called by many readers at once, but not during a change of the database.
+
+        :rtype: Mapping[int, Medicine]
+        '''
+        with self._snapshot_lock:
+            self._records_shared = True
+            self._owned.clear()
+            if self.is_lazy():
+                return MappingProxyType(dict(self._medicines))
+            if self._snapshot is None:
+                self._snapshot = MappingProxyType(self._medicines)
+            return self._snapshot
+
+    def _unshare(self):
+        '''
+        Copies the dictionary of medicines if it is shared with a snapshot. Called before every change.
+        '''
+        if self._snapshot is not None:
+            self._medicines = dict(self._medicines)
+            self._snapshot = None
+
+    def writable_medicine(self, id):
+        '''
+        Returns the medicine with given ID which can be modified in place without affecting snapshots.
+            A medicine that may be referenced by a snapshot is replaced with its copy first.
+
+        :param id: ID of the medicine
+        :type id: int
+
+        :rtype: Medicine
+        '''
+        medicine = self._medicines[id]
+        if not self._records_shared or id in self._owned:
+            return medicine
+        self._unshare()
+        medicine = medicine.copy()
+        self._medicines[id] = medicine
+        self._owned.add(id)
+        return medicine
+
+    def free_id(self):
+        '''
+        Returns the smallest ID which is not in use.
+            The search continues from the previous result, so adding n medicines one by one takes O(n) in total.
+
+        :rtype: int
+        '''
+        id = self._free_id
+        while id in self._medicines:
+            id += 1
+        self._free_id = id
+        return id
+
+    def is_lazy(self):
+        '''
+        :return: True if the medicines are materialized lazily from a memory-mapped file
+        :rtype: bool
+        '''
+        return type(self._medicines) is LazyMedicines
+
+    def mapped_file_path(self):
+        '''
+        :return: Path to the memory-mapped file or None if the database is not lazy
+        :rtype: str
+        '''
+        return self._medicines.path() if self.is_lazy() else None
+
+    def columns(self):
+        '''
+        Returns columnar representation of the database used by analytical queries (see medihelp.analytics).
+            It is built on the first call and then updated incrementally on every change.
+
+        :rtype: MedicineColumns
+        '''
+        if self._columns is None:
+            self._columns = MedicineColumns(self._medicines.values())
+        return self._columns
+
     def add_medicine(self, medicine):
         if type(medicine) is not Medicine:
             raise ValueError('Medicine object must be given')
         if medicine.id() in self.medicines().keys():
             raise IdAlreadyInUseError
+        self._unshare()
+        self._owned.discard(medicine.id())
         self._medicines.update({medicine.id(): medicine})
+        self._row_cache.pop(medicine.id(), None)
+        if self._sorted_ids is not None:
+            if not self._sorted_ids or self._sorted_ids[-1] < medicine.id():
+                self._sorted_ids.append(medicine.id())
+            else:
+                self._sorted_ids = None
+        if self._columns is not None:
+            self._columns.add(medicine)
 
     def delete_medicine(self, id):
         if id not in self.medicines().keys():
             raise NoSuchIdInTheDatabaseError
+        self._unshare()
+        self._owned.discard(id)
         del self._medicines[id]
+        self._row_cache.pop(id, None)
+        self._free_id = min(self._free_id, id)
+        self._sorted_ids = None
+        if self._columns is not None:
+            self._columns.remove(id)
+
+    def replace_medicine(self, medicine):
+        '''
+        Replaces medicine with the same ID in one step, so the ID is never missing from the database
+
+        :param medicine: New medicine object
+        :type medicine: Medicine
+        '''
+        if type(medicine) is not Medicine:
+            raise ValueError('Medicine object must be given')
+        if medicine.id() not in self.medicines().keys():
+            raise NoSuchIdInTheDatabaseError
+        self._unshare()
+        self._owned.discard(medicine.id())
+        self._medicines[medicine.id()] = medicine
+        self._row_cache.pop(medicine.id(), None)
+        if self._columns is not None:
+            self._columns.remove(medicine.id())
+            self._columns.add(medicine)
+
+    def mark_dirty(self, id):
+        '''
+        Has to be called after a medicine stored in the database was modified in place
+            (e.g. a note was changed or a dose was taken) so that its row is serialized again on the next save.
+
+        :param id: ID of the modified medicine
+        :type id: int
+        '''
+        self._row_cache.pop(id, None)
+        if self.is_lazy():
+            self._medicines.pin(id)
+        if self._columns is not None:
+            self._columns.update(self._medicines[id])
+
+    def is_dirty(self, id):
+        '''
+        :return: True if the medicine with given ID changed since it was last read from or written to a file
+        :rtype: bool
+        '''
+        return self._cached_row(id) is None
+
+    def _cached_row(self, id):
+        row = self._row_cache.get(id)
+        if row is None and self.is_lazy():
+            row = self._medicines.raw_row(id)
+        return row
 
     def clear(self):
+        if self.is_lazy():
+            self._medicines.close()
+            self._medicines = {}
+        elif self._snapshot is not None:
+            self._medicines = {}
+            self._snapshot = None
         self._medicines.clear()
+        self._records_shared = False
+        self._owned.clear()
+        self._row_cache.clear()
+        self._sorted_ids = []
+        self._columns = None
+        self._free_id = 0
+
+    def map_file(self, path: str, cache_size: int = 1024):
+        '''
+        Clears the database and memory-maps the .csv file under the given path.
+            Medicines are materialized on the first access and cached under an LRU bound,
+            so load time and memory usage don't grow with the size of the file.
+            Rows of not modified medicines are copied from the mapped file on save.
+
+        :param path: Path to the .csv file
+        :type path: str
+        :param cache_size: Maximal number of not modified medicines kept in memory
+        :type cache_size: int
+        '''
+        self.clear()
+        self._medicines = LazyMedicines(path, cache_size)
+        self._sorted_ids = None
+        self._columns = None
 
     def read_from_file(self, file_handler):
         '''
         Reads medicine database from a .csv file
+        Rows of a file with the standard header are cached so that they don't have to be serialized again on save.
         '''
+        # Lines consumed by the csv reader while it parses the current row
+        lines = []
+
+        def recorded_lines():
+            for line in file_handler:
+                lines.append(line)
+                yield line
+
         try:
-            reader = csv.DictReader(file_handler)
+            reader = csv.DictReader(recorded_lines())
+            cache_rows = reader.fieldnames == HEADER
         except csv.Error as e:
             raise MalformedDataError(file_handler.name, 1) from e
+        lines.clear()
         row_counter = 2
         try:
             for row in reader:
                 # Create instance of Medicine
                 try:
-                    year, month, day = map(int, row['expiration_date'].split('-'))
-                    medicine = Medicine(
-                        id=int(row['id']),
-                        name=row['name'],
-                        manufacturer=row['manufacturer'],
-                        illnesses=ast.literal_eval(row['illnesses']),
-                        substances=ast.literal_eval(row['substances']),
-                        recommended_age=int(row['recommended_age']),
-                        doses=int(row['doses']),
-                        doses_left=int(row['doses_left']),
-                        expiration_date=date(year, month, day),
-                        recipients=ast.literal_eval(row['recipients']),
-                        notes=ast.literal_eval(row['notes'])
-                    )
+                    medicine = self._medicine_from_row(row)
                     self.add_medicine(medicine)
                 except Exception as e:
                     raise MalformedDataError(file_handler.name, row_counter) from e
+                if cache_rows and len(lines) == 1:
+                    line = lines[0]
+                    self._row_cache[medicine.id()] = line if line.endswith('\n') else line + '\n'
+                lines.clear()
 
                 row_counter += 1
         except csv.Error as e:
@@ -75,33 +489,106 @@ class MedicinesDatabase:
     def write_to_file(self, file_handler):
         '''
         Saves medicine database into a .csv file
+        Only medicines that changed since the last read or write are serialized, other rows are taken from the cache.
+        '''
+        buffer = StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerow(HEADER)
+        file_handler.write(buffer.getvalue())
+
+        if self._sorted_ids is None:
+            self._sorted_ids = sorted(self._medicines.keys())
+        for id in self._sorted_ids:
+            row = self._cached_row(id)
+            if row is None:
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerow(self._medicine_to_row(self._medicines[id]))
+                row = buffer.getvalue()
+                self._row_cache[id] = row
+            file_handler.write(row)
+
+    def snapshot_writer(self):
+        '''
+        Captures the database as it is at the moment of the call and returns a function writing it into a .csv file.
+            The capture is O(1) apart from copying the references of cached rows (see snapshot),
+            so the function can stream the rows into the file without any lock while the database is being changed.
+            It returns the rows it had to serialize, which can be cached afterwards with cache_rows.
+            Not meant for lazy databases, whose snapshots are materialized.
+
+        :rtype: callable
+        '''
+        medicines = self.snapshot()
+        ids = self._sorted_ids if self._sorted_ids is not None else sorted(medicines.keys())
+        rows = dict(self._row_cache)
+
+        def write(file_handler):
+            buffer = StringIO()
+            writer = csv.writer(buffer, lineterminator='\n')
+            writer.writerow(HEADER)
+            file_handler.write(buffer.getvalue())
+            serialized = {}
+            for id in ids:
+                row = rows.get(id)
+                if row is None:
+                    buffer.seek(0)
+                    buffer.truncate()
+                    medicine = medicines[id]
+                    writer.writerow(self._medicine_to_row(medicine))
+                    row = buffer.getvalue()
+                    serialized[id] = (medicine, row)
+                file_handler.write(row)
+            return serialized
+        return write
+
+    def cache_rows(self, serialized):
+        '''
+        Caches rows serialized by a function returned by snapshot_writer
+            for the medicines which did not change since the snapshot was taken
+
+        :param serialized: Pairs (medicine, row) where medicine IDs are the keys
+        :type serialized: dict[int, tuple[Medicine, str]]
+        '''
+        for id, (medicine, row) in serialized.items():
+            # Medicines shared with a snapshot are replaced with copies when they change
+            if self._medicines.get(id) is medicine:
+                self._row_cache[id] = row
+
+    @staticmethod
+    def _medicine_from_row(row):
+        '''
+        Creates a Medicine object from a dictionary of csv fields
+        '''
+        year, month, day = map(int, row['expiration_date'].split('-'))
+        return Medicine(
+            id=int(row['id']),
+            name=row['name'],
+            manufacturer=row['manufacturer'],
+            illnesses=ast.literal_eval(row['illnesses']),
+            substances=ast.literal_eval(row['substances']),
+            recommended_age=int(row['recommended_age']),
+            doses=int(row['doses']),
+            doses_left=int(row['doses_left']),
+            expiration_date=date(year, month, day),
+            recipients=ast.literal_eval(row['recipients']),
+            notes=ast.literal_eval(row['notes'])
+        )
+
+    @staticmethod
+    def _medicine_to_row(medicine):
+        '''
+        Returns a list of csv fields describing the medicine in the order given by HEADER
         '''
-        header = [
-            'id',
-            'name',
-            'manufacturer',
-            'illnesses',
-            'recipients',
-            'substances',
-            'recommended_age',
-            'doses',
-            'doses_left',
-            'expiration_date',
-            'notes'
+        return [
+            medicine.id(),
+            medicine.name(),
+            medicine.manufacturer(),
+            medicine.illnesses(),
+            medicine.recipients(),
+            medicine.substances(),
+            medicine.recommended_age(),
+            medicine.doses(),
+            medicine.doses_left(),
+            medicine.expiration_date(),
+            medicine.notes()
         ]
-        writer = csv.DictWriter(file_handler, fieldnames=header, lineterminator='\n')
-        writer.writeheader()
-        for medicine in sorted(self.medicines().values(), key=lambda x: x.id()):
-            writer.writerow({
-                'id': medicine.id(),
-                'name': medicine.name(),
-                'manufacturer': medicine.manufacturer(),
-                'illnesses': medicine.illnesses(),
-                'recipients': medicine.recipients(),
-                'substances': medicine.substances(),
-                'recommended_age': medicine.recommended_age(),
-                'doses': medicine.doses(),
-                'doses_left': medicine.doses_left(),
-                'expiration_date': medicine.expiration_date(),
-                'notes': medicine.notes()
-            })
@@ -0,0 +1,74 @@
+from datetime import date, timedelta
+from typing import NamedTuple
+import heapq
+
+
+class Occurrence(NamedTuple):
+    date: date
+    user_id: int
+    prescription_id: int
+    medicine_name: str
+    dosage: int
+
+
+def first_date(weekday: int, start: date):
+    '''
+    :return: First date not earlier than start which falls on the given weekday (number from 1 to 7)
+    :rtype: date
+    '''
+    return start + timedelta(days=(weekday - 1 - start.weekday()) % 7)
+
+
+def occurrence_count(weekday: int, start: date, end: date):
+    '''
+    :return: Number of dates from start to end (both inclusive) which fall on the given weekday
+    :rtype: int
+    '''
+    first = first_date(weekday, start)
+    if first > end:
+        return 0
+    return (end - first).days // 7 + 1
+
+
+def _prescription_occurrences(user_id, prescription, start, end):
+    first = first_date(prescription.weekday(), start)
+    week = timedelta(days=7)
+    for number in range(occurrence_count(prescription.weekday(), start, end)):
+        yield Occurrence(first + number * week, user_id, prescription.id(),
+                         prescription.medicine_name(), prescription.dosage())
+
+
+def iter_occurrences(users, start: date, end: date):
+    '''
+    Generates dated occurrences of weekly prescriptions of the given users from start to end (both inclusive)
+        in chronological order. Occurrences of every prescription are computed arithmetically
+        and merged lazily, so the range may be arbitrarily long.
+
+    :param users: Users whose prescriptions are expanded
+    :type users: iterable of User
+
+    :rtype: generator of Occurrence
+    '''
+    streams = [_prescription_occurrences(user.id(), prescription, start, end)
+               for user in users for prescription in user.prescriptions().values()]
+    return heapq.merge(*streams)
+
+
+def list_occurrences(users, start: date, end: date):
+    '''
+    Same as iter_occurrences but returns a list. Faster when all occurrences are needed at once.
+
+    :rtype: list[Occurrence]
+    '''
+    result = []
+    week = timedelta(days=7)
+    for user in users:
+        user_id = user.id()
+        for prescription in user.prescriptions().values():
+            first = first_date(prescription.weekday(), start)
+            count = occurrence_count(prescription.weekday(), start, end)
+            result.extend(Occurrence(first + number * week, user_id, prescription.id(),
+                                     prescription.medicine_name(), prescription.dosage())
+                          for number in range(count))
+    result.sort()
+    return result
@@ -0,0 +1,504 @@
+'''
+Composable queries over medicines with a planner choosing the most selective index.
+
+Predicates are built with field() and expired() and combined with &, | and ~, for example:
+    query = Query((~expired()) & field('substances').contains('paracetamolum')
+                  & (field('recommended_age') <= 12) & field('recipients').contains(2))
+    query.order_by('expiration_date').limit(10).execute(system)
+
+The planner looks at the conjuncts of the predicate. For every one that an index of MedicineIndex can answer
+    it estimates the number of matching medicines and picks the smallest candidate set,
+    the whole predicate is then checked only on the candidates. Without a usable index all medicines are scanned.
+    Query.explain() describes the chosen plan.
+'''
+from datetime import date
+from bisect import bisect_left, bisect_right, insort
+import heapq
+import operator
+
+
+# Fields of Medicine which values are sets, where IDs are the keys of an inverted index
+SET_FIELDS = ['substances', 'illnesses', 'recipients']
+
+# Fields with an inverted index on their value
+VALUE_FIELDS = ['name', 'manufacturer']
+
+# Fields with a sorted index supporting range comparisons
+RANGE_FIELDS = ['expiration_date', 'recommended_age']
+
+FIELDS = SET_FIELDS + VALUE_FIELDS + RANGE_FIELDS + ['doses', 'doses_left', 'id']
+
+_COMPARISONS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '>=': operator.ge,
+    '>': operator.gt,
+}
+
+
+def _normalize(field_name, value):
+    # Names of substances and illnesses are kept in lowercase, names of medicines and manufacturers are titled
+    if field_name in ('substances', 'illnesses'):
+        return str(value).strip().lower()
+    if field_name in VALUE_FIELDS:
+        return str(value).strip().title()
+    return value
+
+
+def _sort_key(value):
+    return value.toordinal() if isinstance(value, date) else value
+
+
+class MedicineIndex:
+    '''
+    Secondary indexes of the medicines database used by the query planner.
+        Kept up to date with the database through a change listener of System.
+
+    Attributes
+    ----------
+    :ivar _system: System whose medicines are indexed
+    :vartype _system: System
+
+    :ivar _inverted: Inverted indexes of set and value fields, where field names are the keys
+        and values are dictionaries mapping values to sets of IDs of medicines
+    :vartype _inverted: dict[str, dict[object, set[int]]]
+
+    :ivar _sorted: Sorted lists of pairs (value, ID) of range fields, where field names are the keys
+    :vartype _sorted: dict[str, list[tuple]]
+
+    :ivar _entries: Indexed values of every medicine, so that they can be removed after it changes
+    :vartype _entries: dict[int, dict[str, object]]
+    '''
+
+    def __init__(self, system):
+        '''
+        :param system: System whose medicines are indexed
+        :type system: System
+        '''
+        self._system = system
+        self._rebuild()
+        system.add_change_listener(self._on_change)
+
+    def _rebuild(self):
+        self._inverted = {field_name: {} for field_name in SET_FIELDS + VALUE_FIELDS}
+        self._sorted = {field_name: [] for field_name in RANGE_FIELDS}
+        self._entries = {}
+        for medicine in self._system.medicines().values():
+            self._add(medicine)
+
+    def _add(self, medicine):
+        id = medicine.id()
+        entry = {}
+        for field_name in SET_FIELDS:
+            values = frozenset(getattr(medicine, field_name)())
+            entry[field_name] = values
+            index = self._inverted[field_name]
+            for value in values:
+                index.setdefault(value, set()).add(id)
+        for field_name in VALUE_FIELDS:
+            value = getattr(medicine, field_name)()
+            entry[field_name] = value
+            self._inverted[field_name].setdefault(value, set()).add(id)
+        for field_name in RANGE_FIELDS:
+            value = _sort_key(getattr(medicine, field_name)())
+            entry[field_name] = value
+            insort(self._sorted[field_name], (value, id))
+        self._entries[id] = entry
+
+    def _remove(self, id):
+        entry = self._entries.pop(id, None)
+        if entry is None:
+            return
+        for field_name in SET_FIELDS + VALUE_FIELDS:
+            values = entry[field_name] if field_name in SET_FIELDS else (entry[field_name],)
+            index = self._inverted[field_name]
+            for value in values:
+                ids = index[value]
+                ids.discard(id)
+                if not ids:
+                    del index[value]
+        for field_name in RANGE_FIELDS:
+            pairs = self._sorted[field_name]
+            del pairs[bisect_left(pairs, (entry[field_name], id))]
+
+    def _on_change(self, kind, key):
+        if kind == 'medicine':
+            self._remove(key)
+            medicine = self._system.medicines().get(key)
+            if medicine is not None:
+                self._add(medicine)
+        elif kind == 'medicines':
+            self._rebuild()
+
+    def lookup(self, field_name, value):
+        '''
+        :return: IDs of medicines with given value (or containing it for set fields)
+        :rtype: set[int]
+        '''
+        return self._inverted[field_name].get(value, set())
+
+    def range_bounds(self, field_name, comparison, value):
+        '''
+        :return: Pair (start, end) of positions in the sorted index of the medicines matching the comparison
+        :rtype: tuple[int, int]
+        '''
+        pairs = self._sorted[field_name]
+        value = _sort_key(value)
+        # IDs are non-negative, (value, -1) is before and (value, inf) after all pairs with the value
+        low = bisect_left(pairs, (value, -1))
+        high = bisect_right(pairs, (value, float('inf')))
+        return {
+            '<': (0, low),
+            '<=': (0, high),
+            '==': (low, high),
+            '>=': (low, len(pairs)),
+            '>': (high, len(pairs)),
+        }[comparison]
+
+    def range_ids(self, field_name, start, end):
+        return [id for _, id in self._sorted[field_name][start:end]]
+
+
+class Predicate:
+    '''
+    Condition on a medicine. Predicates are combined with & (and), | (or) and ~ (not).
+    '''
+
+    def matches(self, medicine):
+        raise NotImplementedError
+
+    def conjuncts(self):
+        '''
+        :return: Predicates which all have to be true for this one to be true
+        :rtype: list[Predicate]
+        '''
+        return [self]
+
+    def estimate(self, index: MedicineIndex):
+        '''
+        :return: Number of medicines which can match according to the index or None if the index can't be used
+        :rtype: int
+        '''
+        return None
+
+    def candidates(self, index: MedicineIndex):
+        '''
+        :return: IDs of medicines which can match, found with the index
+        :rtype: iterable of int
+        '''
+        raise NotImplementedError
+
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+    def __invert__(self):
+        return Not(self)
+
+
+class Contains(Predicate):
+    def __init__(self, field_name, value):
+        self.field_name = field_name
+        self.value = _normalize(field_name, value)
+
+    def matches(self, medicine):
+        return self.value in getattr(medicine, self.field_name)()
+
+    def estimate(self, index):
+        return len(index.lookup(self.field_name, self.value))
+
+    def candidates(self, index):
+        return index.lookup(self.field_name, self.value)
+
+    def __str__(self):
+        return f'{self.field_name} contains {self.value!r}'
+
+
+class Compare(Predicate):
+    def __init__(self, field_name, comparison, value):
+        self.field_name = field_name
+        self.comparison = comparison
+        self.value = _normalize(field_name, value)
+
+    def matches(self, medicine):
+        return _COMPARISONS[self.comparison](getattr(medicine, self.field_name)(), self.value)
+
+    def estimate(self, index):
+        if self.field_name in VALUE_FIELDS and self.comparison == '==':
+            return len(index.lookup(self.field_name, self.value))
+        if self.field_name in RANGE_FIELDS and self.comparison != '!=':
+            start, end = index.range_bounds(self.field_name, self.comparison, self.value)
+            return end - start
+        return None
+
+    def candidates(self, index):
+        if self.field_name in VALUE_FIELDS:
+            return index.lookup(self.field_name, self.value)
+        return index.range_ids(self.field_name, *index.range_bounds(self.field_name, self.comparison, self.value))
+
+    def __str__(self):
+        return f'{self.field_name} {self.comparison} {self.value!r}'
+
+
+class Expired(Predicate):
+    '''
+    True for medicines that expired before the given day
+        (by default the day the predicate is created, like Medicine.is_expired)
+    '''
+
+    def __init__(self, today: date = None):
+        self.today = today or date.today()
+        self._comparison = self._compare()
+
+    def _compare(self):
+        return Compare('expiration_date', '<', self.today)
+
+    def matches(self, medicine):
+        return self._comparison.matches(medicine)
+
+    def estimate(self, index):
+        return self._comparison.estimate(index)
+
+    def candidates(self, index):
+        return self._comparison.candidates(index)
+
+    def __invert__(self):
+        return NotExpired(self.today)
+
+    def __str__(self):
+        return 'expired'
+
+
+class NotExpired(Expired):
+    def _compare(self):
+        return Compare('expiration_date', '>=', self.today)
+
+    def __invert__(self):
+        return Expired(self.today)
+
+    def __str__(self):
+        return 'not expired'
+
+
+class Range(Predicate):
+    '''
+    Comparisons of one field with a sorted index which all have to be true, answered with one slice of the index.
+        Made by the planner, e.g. from a >= x AND a < y.
+    '''
+
+    def __init__(self, comparisons):
+        self.comparisons = comparisons
+        self.field_name = comparisons[0].field_name
+
+    def _bounds(self, index):
+        bounds = [index.range_bounds(self.field_name, comparison.comparison, comparison.value)
+                  for comparison in self.comparisons]
+        start = max(low for low, _ in bounds)
+        end = min(high for _, high in bounds)
+        return start, max(start, end)
+
+    def matches(self, medicine):
+        return all(comparison.matches(medicine) for comparison in self.comparisons)
+
+    def estimate(self, index):
+        start, end = self._bounds(index)
+        return end - start
+
+    def candidates(self, index):
+        return index.range_ids(self.field_name, *self._bounds(index))
+
+    def __str__(self):
+        return ' AND '.join(str(comparison) for comparison in self.comparisons)
+
+
+class And(Predicate):
+    def __init__(self, *predicates):
+        self.predicates = predicates
+
+    def matches(self, medicine):
+        return all(predicate.matches(medicine) for predicate in self.predicates)
+
+    def conjuncts(self):
+        return [conjunct for predicate in self.predicates for conjunct in predicate.conjuncts()]
+
+    def __str__(self):
+        return ' AND '.join(f'({predicate})' if isinstance(predicate, Or) else str(predicate)
+                            for predicate in self.conjuncts())
+
+
+class Or(Predicate):
+    def __init__(self, *predicates):
+        self.predicates = predicates
+
+    def matches(self, medicine):
+        return any(predicate.matches(medicine) for predicate in self.predicates)
+
+    def estimate(self, index):
+        # Union of the candidates of all alternatives, usable only if every alternative has an index
+        estimates = [predicate.estimate(index) for predicate in self.predicates]
+        if None in estimates:
+            return None
+        return sum(estimates)
+
+    def candidates(self, index):
+        ids = set()
+        for predicate in self.predicates:
+            ids.update(predicate.candidates(index))
+        return ids
+
+    def __str__(self):
+        return ' OR '.join(f'({predicate})' if isinstance(predicate, And) else str(predicate)
+                           for predicate in self.predicates)
+
+
+class Not(Predicate):
+    def __init__(self, predicate):
+        self.predicate = predicate
+
+    def matches(self, medicine):
+        return not self.predicate.matches(medicine)
+
+    def __str__(self):
+        return f'NOT ({self.predicate})'
+
+
+class Field:
+    '''
+    Builder of predicates on a field of Medicine, e.g. field('recommended_age') <= 12
+    '''
+
+    def __init__(self, name):
+        if name not in FIELDS:
+            raise ValueError(f'Unknown field {name}')
+        self.name = name
+
+    def contains(self, value):
+        if self.name not in SET_FIELDS:
+            raise ValueError(f'Field {self.name} is not a set')
+        return Contains(self.name, value)
+
+    def __lt__(self, value):
+        return Compare(self.name, '<', value)
+
+    def __le__(self, value):
+        return Compare(self.name, '<=', value)
+
+    def __eq__(self, value):
+        return Compare(self.name, '==', value)
+
+    def __ne__(self, value):
+        return Compare(self.name, '!=', value)
+
+    def __ge__(self, value):
+        return Compare(self.name, '>=', value)
+
+    def __gt__(self, value):
+        return Compare(self.name, '>', value)
+
+    __hash__ = None
+
+
+def field(name: str):
+    return Field(name)
+
+
+def expired(today: date = None):
+    return Expired(today)
+
+
+class Query:
+    '''
+    Query over medicines of a System: a predicate, sorting and a limit.
+        Methods where, order_by and limit return the query so that calls can be chained.
+        Results are sorted by ID unless another field is given.
+    '''
+
+    def __init__(self, predicate: Predicate = None):
+        self._predicate = predicate
+        self._order_by = None
+        self._descending = False
+        self._limit = None
+
+    def where(self, predicate: Predicate):
+        self._predicate = predicate if self._predicate is None else self._predicate & predicate
+        return self
+
+    def order_by(self, field_name: str, descending: bool = False):
+        Field(field_name)
+        self._order_by = field_name
+        self._descending = descending
+        return self
+
+    def limit(self, count: int):
+        self._limit = count
+        return self
+
+    def _plan(self, index: MedicineIndex):
+        '''
+        :return: Pair (conjunct whose index gives the fewest candidates or None for a full scan, its estimate)
+        :rtype: tuple[Predicate, int]
+        '''
+        if self._predicate is None:
+            return None, None
+        conjuncts = self._predicate.conjuncts()
+        # Comparisons of the same field with a sorted index are answered together with one slice of it
+        ranges = {}
+        for conjunct in conjuncts:
+            comparison = conjunct._comparison if isinstance(conjunct, Expired) else conjunct
+            if isinstance(comparison, Compare) and comparison.field_name in RANGE_FIELDS \
+                    and comparison.comparison != '!=':
+                ranges.setdefault(comparison.field_name, []).append(comparison)
+        conjuncts += [Range(comparisons) for comparisons in ranges.values() if len(comparisons) > 1]
+        best, best_estimate = None, None
+        for conjunct in conjuncts:
+            estimate = conjunct.estimate(index)
+            if estimate is not None and (best_estimate is None or estimate < best_estimate):
+                best, best_estimate = conjunct, estimate
+        return best, best_estimate
+
+    def explain(self, system):
+        '''
+        :return: Description of the plan of the query, one step per line
+        :rtype: str
+        '''
+        with system.read_lock():
+            chosen, estimate = self._plan(system.query_index())
+            total = len(system.medicines())
+        if chosen is None:
+            lines = [f'Scan all medicines ({total} rows)']
+        else:
+            lines = [f'Index lookup: {chosen} (estimated {estimate} of {total} rows)']
+        if self._predicate is not None:
+            lines.append(f'Filter: {self._predicate}')
+        if self._order_by:
+            lines.append(f'Sort: {self._order_by}' + (' descending' if self._descending else ''))
+        if self._limit is not None:
+            lines.append(f'Limit: {self._limit}')
+        return '\n'.join(lines)
+
+    def execute(self, system):
+        '''
+        :return: Medicines matching the query
+        :rtype: list[Medicine]
+        '''
+        with system.read_lock():
+            medicines = system.medicines()
+            chosen, _ = self._plan(system.query_index())
+            if chosen is None:
+                rows = medicines.values()
+            else:
+                rows = (medicines[id] for id in chosen.candidates(system.query_index()))
+            if self._predicate is not None:
+                rows = (medicine for medicine in rows if self._predicate.matches(medicine))
+            order_by = self._order_by or 'id'
+
+            def key(medicine):
+                return (getattr(medicine, order_by)(), medicine.id())
+            if self._limit is not None:
+                select = heapq.nlargest if self._descending else heapq.nsmallest
+                return select(self._limit, rows, key=key)
+            return sorted(rows, key=key, reverse=self._descending)
@@ -0,0 +1,225 @@
+from .system import System
+from collections import OrderedDict
+from contextlib import contextmanager
+import threading
+import logging
+import time
+import os
+
+
+logger = logging.getLogger(__name__)
+
+
+class SystemRegistry:
+    '''
+    Holds one System per household data directory, so that one process can serve many households.
+        A data directory contains users.json and medicines.csv.
+        Systems are loaded on the first request for their directory and kept in LRU order.
+        When there are more than max_systems of them, the least recently used one is evicted;
+        systems which were not used for a given time can be evicted with evict_idle.
+        Unsaved medicines database of an evicted system is saved first (users data is saved on every change)
+        and the system is closed, so changes made through a reference kept by a caller raise SystemClosedError.
+    Names of substances, illnesses, manufacturers and medicines are interned (see common.normalize_name),
+        so all households share one copy of their vocabulary.
+
+    Attributes
+    ----------
+    :ivar _systems: Loaded systems with the time of their last use, where absolute paths of data directories are the keys.
+        Least recently used systems come first.
+    :vartype _systems: OrderedDict[str, tuple[System, float]]
+
+    :ivar _max_systems: Maximal number of loaded systems
+    :vartype _max_systems: int
+
+    :ivar _lazy: If True medicines files are memory-mapped (see System.load_medicines_database_from)
+    :vartype _lazy: bool
+
+    :ivar _lock: Lock guarding _systems and _tenant_locks. It is never held while files are loaded or saved.
+    :vartype _lock: threading.Lock
+
+    :ivar _tenant_locks: Pairs (lock, number of threads using it) of households, where absolute paths
+        of data directories are the keys. The lock of a household is held while its system is loaded or evicted,
+        so a system is never loaded twice or loaded again before its changes are saved.
+    :vartype _tenant_locks: dict[str, list]
+    '''
+
+    def __init__(self, max_systems: int = 16, lazy: bool = False):
+        '''
+        :param max_systems: Maximal number of loaded systems (optional)
+        :type max_systems: int
+
+        :param lazy: If True medicines files are memory-mapped (optional)
+        :type lazy: bool
+        '''
+        if max_systems < 1:
+            raise ValueError('max_systems must be positive')
+        self._systems = OrderedDict()
+        self._max_systems = max_systems
+        self._lazy = lazy
+        self._lock = threading.Lock()
+        self._tenant_locks = {}
+
+    def __len__(self):
+        return len(self._systems)
+
+    def __contains__(self, data_dir):
+        return os.path.abspath(data_dir) in self._systems
+
+    def data_dirs(self):
+        '''
+        :return: Absolute paths of data directories of loaded systems, from the least recently used one
+        :rtype: list[str]
+        '''
+        with self._lock:
+            return list(self._systems)
+
+    @contextmanager
+    def _tenant(self, key: str):
+        '''
+        Context manager holding the lock of the household under the key while its system is loaded or evicted.
+            Locks are counted and removed when no thread uses them.
+        '''
+        with self._lock:
+            entry = self._tenant_locks.get(key)
+            if entry is None:
+                entry = self._tenant_locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._tenant_locks[key]
+
+    def _use(self, key: str):
+        '''
+        Marks the system under the key as just used, must be called with _lock held
+
+        :return: The system or None if it isn't loaded
+        :rtype: System
+        '''
+        entry = self._systems.get(key)
+        if entry is None:
+            return None
+        self._systems[key] = (entry[0], time.monotonic())
+        self._systems.move_to_end(key)
+        return entry[0]
+
+    def get(self, data_dir: str):
+        '''
+        Returns System of the household with given data directory, loads it if it isn't loaded yet.
+            Files are loaded and saved while only the lock of the household is held, so other households are served
+            in the meantime. If the least recently used system can't be saved it stays loaded
+            and the registry holds more systems than max_systems until a later eviction succeeds.
+
+        :param data_dir: Path to the directory with users.json and medicines.csv
+        :type data_dir: str
+
+        :rtype: System
+        '''
+        key = os.path.abspath(data_dir)
+        with self._lock:
+            system = self._use(key)
+        if system is not None:
+            return system
+        with self._tenant(key):
+            with self._lock:
+                # Another thread may have loaded it while the lock of the household was awaited
+                system = self._use(key)
+            if system is None:
+                system = self._load(key)
+                with self._lock:
+                    self._systems[key] = (system, time.monotonic())
+        while True:
+            with self._lock:
+                if len(self._systems) <= self._max_systems:
+                    break
+                victim_key, entry = next(iter(self._systems.items()))
+                if victim_key == key:
+                    break
+                del self._systems[victim_key]
+            try:
+                self._evict(victim_key, entry)
+            except Exception:
+                logger.exception('Saving the data of %s failed, it stays loaded', victim_key)
+                break
+        return system
+
+    def _load(self, data_dir: str):
+        system = System()
+        system.load_users_data(os.path.join(data_dir, 'users.json'))
+        system.load_medicines_database_from(os.path.join(data_dir, 'medicines.csv'), self._lazy)
+        return system
+
+    def _evict(self, key: str, entry: tuple):
+        '''
+        Saves and closes the system of an entry which was just removed from _systems (see System.close).
+            If saving fails the entry is put back as the least recently used one and the error is raised.
+
+        :param entry: Pair (system, time of the last use)
+        :type entry: tuple[System, float]
+        '''
+        with self._tenant(key):
+            try:
+                entry[0].close()
+            except Exception:
+                with self._lock:
+                    self._systems[key] = entry
+                    self._systems.move_to_end(key, last=False)
+                raise
+
+    def _evict_first(self, max_last_used: float = None):
+        '''
+        Evicts the least recently used system if it was last used before max_last_used
+
+        :return: Absolute path of the data directory of the evicted system or None if nothing was evicted
+        :rtype: str
+        '''
+        with self._lock:
+            if not self._systems:
+                return None
+            key, entry = next(iter(self._systems.items()))
+            if max_last_used is not None and entry[1] > max_last_used:
+                return None
+            del self._systems[key]
+        self._evict(key, entry)
+        return key
+
+    def evict(self, data_dir: str):
+        '''
+        Saves and unloads the system of given data directory if it is loaded
+        '''
+        key = os.path.abspath(data_dir)
+        with self._lock:
+            entry = self._systems.pop(key, None)
+        if entry is not None:
+            self._evict(key, entry)
+
+    def evict_idle(self, max_idle: float):
+        '''
+        Saves and unloads systems which were not requested for the given time
+
+        :param max_idle: Time in seconds
+        :type max_idle: float
+
+        :return: Absolute paths of data directories of evicted systems
+        :rtype: list[str]
+        '''
+        limit = time.monotonic() - max_idle
+        evicted = []
+        # Systems are in the order of use, so eviction stops at the first recently used one
+        while True:
+            key = self._evict_first(limit)
+            if key is None:
+                return evicted
+            evicted.append(key)
+
+    def close(self):
+        '''
+        Saves and unloads all systems
+        '''
+        while self._evict_first() is not None:
+            pass
+
@@ -0,0 +1,108 @@
+import threading
+from contextlib import contextmanager
+
+
+class RWLock:
+    '''
+    Reader-writer lock. Many threads can hold it for reading at the same time but only one can hold it for writing.
+        Waiting writers are preferred over new readers, so a stream of readers can't starve writers.
+        A thread holding the lock for writing can acquire it again for writing or reading
+        and a thread holding it for reading can acquire it for reading again.
+        Upgrading a read lock to a write lock is not possible.
+
+    Attributes
+    ----------
+    :ivar _condition: Condition guarding the state of the lock
+    :vartype _condition: threading.Condition
+
+    :ivar _readers: Numbers of read acquisitions where thread IDs are the keys
+    :vartype _readers: dict[int, int]
+
+    :ivar _writer: ID of the thread holding the lock for writing or None
+    :vartype _writer: int
+
+    :ivar _writer_depth: Number of write acquisitions of the writer
+    :vartype _writer_depth: int
+
+    :ivar _waiting_writers: Number of threads waiting to acquire the lock for writing
+    :vartype _waiting_writers: int
+    '''
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = {}
+        self._writer = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me or me in self._readers:
+                self._readers[me] = self._readers.get(me, 0) + 1
+                return
+            while self._writer is not None or self._waiting_writers:
+                self._condition.wait()
+            self._readers[me] = 1
+
+    def release_read(self):
+        me = threading.get_ident()
+        with self._condition:
+            count = self._readers.get(me)
+            if not count:
+                raise RuntimeError('Lock is not held for reading by this thread')
+            if count > 1:
+                self._readers[me] = count - 1
+                return
+            del self._readers[me]
+            if not self._readers:
+                self._condition.notify_all()
+
+    def acquire_write(self):
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            if me in self._readers:
+                raise RuntimeError('Lock held for reading can not be acquired for writing')
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._writer_depth = 1
+
+    def release_write(self):
+        with self._condition:
+            if self._writer != threading.get_ident():
+                raise RuntimeError('Lock is not held for writing by this thread')
+            self._writer_depth -= 1
+            if not self._writer_depth:
+                self._writer = None
+                self._condition.notify_all()
+
+    def is_writer(self):
+        '''
+        :return: True if the current thread holds the lock for writing
+        :rtype: bool
+        '''
+        return self._writer == threading.get_ident()
+
+    @contextmanager
+    def read_lock(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write_lock(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
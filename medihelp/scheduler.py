@@ -0,0 +1,219 @@
+from datetime import datetime, time, timedelta
+from typing import NamedTuple
+import heapq
+import itertools
+
+
+class Reminder(NamedTuple):
+    time: datetime
+    user_id: int
+    prescription_id: int
+    medicine_name: str
+    dosage: int
+
+
+def next_occurrence(weekday: int, reminder_time: time, after: datetime):
+    '''
+    Returns the first moment not earlier than after which falls on the given weekday at the given time.
+
+    :param weekday: Day of the week. Number from 1 to 7
+    :type weekday: int
+    :param reminder_time: Time of the day
+    :type reminder_time: time
+    :param after: Moment from which the occurrence is searched
+    :type after: datetime
+
+    :rtype: datetime
+    '''
+    days = (weekday - 1 - after.weekday()) % 7
+    occurrence = datetime.combine(after.date() + timedelta(days=days), reminder_time)
+    if occurrence < after:
+        occurrence += timedelta(days=7)
+    return occurrence
+
+
+class ReminderScheduler:
+    '''
+    Keeps the upcoming occurrence of every prescription of every user in a heap ordered by due time.
+        A change of a user's prescriptions only reschedules that user's changed entries,
+        replaced entries are invalidated in place and dropped when they reach the top of the heap.
+
+    Attributes
+    ----------
+    :ivar _system: System whose users' prescriptions are scheduled
+    :vartype _system: System
+
+    :ivar _reminder_time: Time of the day when reminders are due
+    :vartype _reminder_time: time
+
+    :ivar _clock: Function returning current time
+    :vartype _clock: callable
+
+    :ivar _heap: Heap of entries [due time, sequence number, user ID, prescription ID, prescription].
+        Prescription is set to None when the entry is invalidated.
+    :vartype _heap: list[list]
+
+    :ivar _entries: Valid entries of each user, where user IDs are the keys
+        and values are dictionaries mapping prescription IDs to entries
+    :vartype _entries: dict[int, dict[int, list]]
+
+    :ivar _callbacks: Functions called with a Reminder when it is due
+    :vartype _callbacks: list[callable]
+    '''
+
+    def __init__(self, system, reminder_time: time = time(8, 0), clock=None):
+        '''
+        :param system: System whose users' prescriptions are scheduled
+        :type system: System
+        :param reminder_time: Time of the day when reminders are due (optional)
+        :type reminder_time: time
+        :param clock: Function returning current time, datetime.now if not given (optional)
+        :type clock: callable
+        '''
+        self._system = system
+        self._reminder_time = reminder_time
+        self._clock = clock or datetime.now
+        self._heap = []
+        self._entries = {}
+        self._sequence = itertools.count()
+        self._callbacks = []
+        self._widget = None
+        self._after_id = None
+        self._reschedule_all()
+        system.add_change_listener(self._on_change)
+
+    def _push(self, user_id, prescription, due):
+        entry = [due, next(self._sequence), user_id, prescription.id(), prescription]
+        heapq.heappush(self._heap, entry)
+        self._entries.setdefault(user_id, {})[prescription.id()] = entry
+
+    def _reschedule_all(self):
+        self._heap.clear()
+        self._entries.clear()
+        now = self._clock()
+        for user_id, user in self._system.users().items():
+            for prescription in user.prescriptions().values():
+                self._push(user_id, prescription, next_occurrence(prescription.weekday(), self._reminder_time, now))
+
+    def _reschedule_user(self, user_id):
+        '''
+        Invalidates entries of deleted or replaced prescriptions of the user and schedules new ones
+        '''
+        entries = self._entries.pop(user_id, {})
+        user = self._system.users().get(user_id)
+        prescriptions = user.prescriptions() if user else {}
+        now = self._clock()
+        for prescription_id, entry in entries.items():
+            if prescriptions.get(prescription_id) is entry[4]:
+                self._entries.setdefault(user_id, {})[prescription_id] = entry
+            else:
+                entry[4] = None
+        for prescription_id, prescription in prescriptions.items():
+            if prescription_id not in self._entries.get(user_id, {}):
+                self._push(user_id, prescription, next_occurrence(prescription.weekday(), self._reminder_time, now))
+
+    def _on_change(self, kind, key):
+        if kind == 'user':
+            self._reschedule_user(key)
+        elif kind == 'users':
+            self._reschedule_all()
+        else:
+            return
+        self._arm()
+
+    def _drop_invalid(self):
+        while self._heap and self._heap[0][4] is None:
+            heapq.heappop(self._heap)
+
+    @staticmethod
+    def _reminder(entry):
+        prescription = entry[4]
+        return Reminder(entry[0], entry[2], entry[3], prescription.medicine_name(), prescription.dosage())
+
+    def next_due(self, k: int = 1):
+        '''
+        :param k: Number of reminders
+        :type k: int
+
+        :return: k reminders that are due first, in chronological order
+        :rtype: list[Reminder]
+        '''
+        taken = []
+        while len(taken) < k:
+            self._drop_invalid()
+            if not self._heap:
+                break
+            taken.append(heapq.heappop(self._heap))
+        for entry in taken:
+            heapq.heappush(self._heap, entry)
+        return [self._reminder(entry) for entry in taken]
+
+    def pop_due(self, now: datetime = None):
+        '''
+        Returns reminders that are due, calls the callbacks with each of them
+            and schedules next occurrences of their prescriptions after now.
+            A prescription whose occurrences were missed for several weeks (e.g. while the computer was asleep)
+            is reminded of once.
+
+        :param now: Current time, taken from the clock if not given (optional)
+        :type now: datetime
+
+        :rtype: list[Reminder]
+        '''
+        now = now or self._clock()
+        due = []
+        self._drop_invalid()
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            due.append(self._reminder(entry))
+            next_time = next_occurrence(entry[0].isoweekday(), entry[0].time(), now)
+            if next_time <= now:
+                next_time += timedelta(days=7)
+            self._push(entry[2], entry[4], next_time)
+            self._drop_invalid()
+        for reminder in due:
+            for callback in list(self._callbacks):
+                callback(reminder)
+        return due
+
+    def add_callback(self, callback):
+        '''
+        Registers a function called as callback(reminder) when a reminder is due
+
+        :param callback: function to be called
+        :type callback: callable
+        '''
+        self._callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        self._callbacks.remove(callback)
+
+    def attach(self, widget):
+        '''
+        Makes the scheduler fire reminders using widget.after(), so it can run in the tkinter main loop.
+            A single timer is armed for the reminder that is due first and re-armed when prescriptions change.
+
+        :param widget: tkinter widget
+        :type widget: tkinter.Misc
+        '''
+        self._widget = widget
+        self._arm()
+
+    def _arm(self):
+        if self._widget is None:
+            return
+        if self._after_id is not None:
+            self._widget.after_cancel(self._after_id)
+            self._after_id = None
+        self._drop_invalid()
+        if not self._heap:
+            return
+        delay = (self._heap[0][0] - self._clock()).total_seconds()
+        # Timer is re-armed at least once an hour in case the system clock changes
+        delay = min(max(delay, 0), 3600)
+        self._after_id = self._widget.after(int(delay * 1000), self._tick)
+
+    def _tick(self):
+        self._after_id = None
+        self.pop_due()
+        self._arm()
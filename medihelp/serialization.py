@@ -0,0 +1,80 @@
+from .medicine import Medicine
+from .user import User
+from datetime import date
+
+
+def medicine_to_dict(medicine: Medicine):
+    '''
+    Converts medicine to a dictionary which can be serialized to JSON.
+        Sets are converted to sorted lists and dates to ISO strings.
+
+    :rtype: dict
+    '''
+    return {
+        'id': medicine.id(),
+        'name': medicine.name(),
+        'manufacturer': medicine.manufacturer(),
+        'illnesses': sorted(medicine.illnesses()),
+        'recipients': sorted(medicine.recipients()),
+        'substances': sorted(medicine.substances()),
+        'recommended_age': medicine.recommended_age(),
+        'doses': medicine.doses(),
+        'doses_left': medicine.doses_left(),
+        'expiration_date': str(medicine.expiration_date()),
+        'notes': {str(author_id): note for author_id, note in medicine.notes().items()},
+    }
+
+
+def medicine_arguments(data: dict):
+    '''
+    Converts a dictionary in the format returned by medicine_to_dict (without ID)
+        to keyword arguments of System.add_medicine and System.change_medicine.
+        Recipients and notes are optional.
+
+    :rtype: dict
+    '''
+    return {
+        'name': data['name'],
+        'manufacturer': data['manufacturer'],
+        'illnesses': data['illnesses'],
+        'substances': data['substances'],
+        'recommended_age': data['recommended_age'],
+        'doses': data['doses'],
+        'doses_left': data['doses_left'],
+        'expiration_date': date.fromisoformat(data['expiration_date']),
+        'recipients': data.get('recipients', []),
+        'notes': {int(author_id): note for author_id, note in data.get('notes', {}).items()},
+    }
+
+
+def medicine_from_dict(data: dict):
+    '''
+    Creates medicine from a dictionary in the format returned by medicine_to_dict
+
+    :rtype: Medicine
+    '''
+    return Medicine(data['id'], **medicine_arguments(data))
+
+
+def user_to_dict(user: User):
+    '''
+    Converts user to a dictionary in the format of data/users.json
+
+    :rtype: dict
+    '''
+    prescriptions = []
+    for prescription in user.prescriptions().values():
+        prescriptions.append({
+            'id': prescription.id(),
+            'medicine_name': prescription.medicine_name(),
+            'dosage': prescription.dosage(),
+            'weekday': prescription.weekday(),
+        })
+    return {
+        'id': user.id(),
+        'name': user.name(),
+        'birth_date': str(user.birth_date()),
+        'illnesses': list(user.illnesses()),
+        'allergies': list(user.allergies()),
+        'prescriptions': prescriptions,
+    }
@@ -0,0 +1,286 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .system import System
+from .serialization import medicine_to_dict, user_to_dict, medicine_arguments
+from .errors import (MedicineDoesNotExistError,
+                     UserDoesNotExistError,
+                     NoSuchIdInTheDatabaseError,
+                     NoSuchIdInUserPrescriptionsError,
+                     DataLoadingError,
+                     DataSavingError,
+                     NoFileOpenedError)
+import argparse
+import json
+import re
+
+
+NOT_FOUND_ERRORS = (MedicineDoesNotExistError,
+                    UserDoesNotExistError,
+                    NoSuchIdInTheDatabaseError,
+                    NoSuchIdInUserPrescriptionsError)
+SERVER_ERRORS = (DataLoadingError, DataSavingError)
+
+
+class RequestError(Exception):
+    '''
+    Error with the HTTP status that should be sent to the client
+    '''
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class MedihelpServer(ThreadingHTTPServer):
+    '''
+    HTTP server exposing one System as a JSON API, so that many clients share a single in-memory database.
+        Every connection is handled in its own thread and is kept alive between requests (HTTP/1.1).
+        Concurrent requests are made safe by the locks of System.
+
+    Endpoints (IDs are integers, bodies are JSON objects):
+        GET    /medicines                                    list of medicines
+        POST   /medicines                                    add medicine, returns {"id": ...}
+        GET    /medicines/<id>                               medicine
+        PUT    /medicines/<id>                               change medicine
+        DELETE /medicines/<id>                               delete medicine
+        POST   /medicines/<id>/take_dose                     {"user_id": ...}
+        PUT    /medicines/<id>/notes/<user_id>               {"content": ...}
+        DELETE /medicines/<id>/notes/<user_id>
+        GET    /users                                        list of users
+        GET    /users/<id>                                   user
+        POST   /users/<id>/prescriptions                     {"medicine_name", "dosage", "weekday"}
+        PUT    /users/<id>/prescriptions/<prescription_id>   {"medicine_name", "dosage", "weekday"}
+        DELETE /users/<id>/prescriptions/<prescription_id>
+        POST   /save                                         save medicines database
+
+    Errors are returned as {"error": message} with status 400, 404 or 500.
+
+    Attributes
+    ----------
+    :ivar system: System whose databases are exposed
+    :vartype system: System
+    '''
+    daemon_threads = True
+
+    def __init__(self, address, system: System):
+        '''
+        :param address: Tuple (host, port). Port 0 chooses a free port
+        :type address: tuple[str, int]
+
+        :param system: System whose databases are exposed
+        :type system: System
+        '''
+        self.system = system
+        super().__init__(address, RequestHandler)
+
+
+def _medicine_arguments(body):
+    arguments = medicine_arguments(body)
+    # Notes are changed through their own endpoints
+    del arguments['notes']
+    return arguments
+
+
+def list_medicines(system, body):
+    return [medicine_to_dict(medicine) for medicine in system.medicines_snapshot().values()]
+
+
+def add_medicine(system, body):
+    return {'id': system.add_medicine(**_medicine_arguments(body))}
+
+
+def get_medicine(system, body, medicine_id):
+    medicine = system.medicines_snapshot().get(medicine_id)
+    if medicine is None:
+        raise MedicineDoesNotExistError(medicine_id)
+    return medicine_to_dict(medicine)
+
+
+def change_medicine(system, body, medicine_id):
+    system.change_medicine(medicine_id, **_medicine_arguments(body))
+    return get_medicine(system, body, medicine_id)
+
+
+def del_medicine(system, body, medicine_id):
+    system.del_medicine(medicine_id)
+    return {}
+
+
+def take_dose(system, body, medicine_id):
+    user = system.users_snapshot().get(body['user_id'])
+    if user is None:
+        raise UserDoesNotExistError(body['user_id'])
+    system.take_dose(medicine_id, user)
+    return get_medicine(system, body, medicine_id)
+
+
+def set_note(system, body, medicine_id, user_id):
+    system.set_note(medicine_id, user_id, body['content'])
+    return get_medicine(system, body, medicine_id)
+
+
+def del_note(system, body, medicine_id, user_id):
+    system.del_note(medicine_id, user_id)
+    return get_medicine(system, body, medicine_id)
+
+
+def list_users(system, body):
+    return [user_to_dict(user) for user in system.users_snapshot().values()]
+
+
+def get_user(system, body, user_id):
+    user = system.users_snapshot().get(user_id)
+    if user is None:
+        raise UserDoesNotExistError(user_id)
+    return user_to_dict(user)
+
+
+def add_prescription(system, body, user_id):
+    system.add_prescription(user_id, body['medicine_name'], body['dosage'], body['weekday'])
+    return get_user(system, body, user_id)
+
+
+def change_prescription(system, body, user_id, prescription_id):
+    system.change_prescription(user_id, prescription_id, body['medicine_name'], body['dosage'], body['weekday'])
+    return get_user(system, body, user_id)
+
+
+def del_prescription(system, body, user_id, prescription_id):
+    system.del_prescription(user_id, prescription_id)
+    return get_user(system, body, user_id)
+
+
+def save(system, body):
+    system.save_medicines_database()
+    return {}
+
+
+# (method, path pattern, handler). Groups of the pattern are passed to the handler as integers.
+ROUTES = [
+    ('GET', r'/medicines', list_medicines),
+    ('POST', r'/medicines', add_medicine),
+    ('GET', r'/medicines/(\d+)', get_medicine),
+    ('PUT', r'/medicines/(\d+)', change_medicine),
+    ('DELETE', r'/medicines/(\d+)', del_medicine),
+    ('POST', r'/medicines/(\d+)/take_dose', take_dose),
+    ('PUT', r'/medicines/(\d+)/notes/(\d+)', set_note),
+    ('DELETE', r'/medicines/(\d+)/notes/(\d+)', del_note),
+    ('GET', r'/users', list_users),
+    ('GET', r'/users/(\d+)', get_user),
+    ('POST', r'/users/(\d+)/prescriptions', add_prescription),
+    ('PUT', r'/users/(\d+)/prescriptions/(\d+)', change_prescription),
+    ('DELETE', r'/users/(\d+)/prescriptions/(\d+)', del_prescription),
+    ('POST', r'/save', save),
+]
+ROUTES = [(method, re.compile(pattern + '/?'), handler) for method, pattern, handler in ROUTES]
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    '''
+    Dispatches requests to the handlers from ROUTES and sends their results as JSON
+    '''
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, with Nagle's algorithm every response would wait for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def log_message(self, format, *args):
+        # Logging every request to stderr would dominate the time of small requests
+        pass
+
+    def _read_body(self):
+        length = self.headers.get('Content-Length') or '0'
+        if not re.fullmatch(r'[0-9]+', length):
+            # The end of the body is unknown, so the next request on the connection can't be found
+            self.close_connection = True
+            raise RequestError(400, 'Invalid Content-Length')
+        length = int(length)
+        if not length:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length))
+        except ValueError:
+            raise RequestError(400, 'Malformed JSON')
+        if type(body) is not dict:
+            raise RequestError(400, 'JSON object expected')
+        return body
+
+    def _route(self, method):
+        path = self.path.split('?', 1)[0]
+        path_matched = False
+        for route_method, pattern, handler in ROUTES:
+            match = pattern.fullmatch(path)
+            if not match:
+                continue
+            path_matched = True
+            if route_method == method:
+                return handler, [int(group) for group in match.groups()]
+        if path_matched:
+            raise RequestError(405, 'Method not allowed')
+        raise RequestError(404, 'Not found')
+
+    def _handle(self, method):
+        try:
+            body = self._read_body()
+            handler, arguments = self._route(method)
+            status, result = 200, handler(self.server.system, body, *arguments)
+        except RequestError as e:
+            status, result = e.status, {'error': str(e)}
+        except NOT_FOUND_ERRORS as e:
+            status, result = 404, {'error': str(e)}
+        except SERVER_ERRORS as e:
+            status, result = 500, {'error': str(e)}
+        except (KeyError, TypeError) as e:
+            status, result = 400, {'error': f'Missing or invalid field: {e}'}
+        except Exception as e:
+            # Validation errors of medihelp.errors and ValueError
+            status, result = 400, {'error': str(e)}
+        self._send(status, result)
+
+    def _send(self, status, result):
+        data = json.dumps(result, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Medihelp JSON API server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--medicines', default='data/medicines.csv', help='Medicines database file')
+    parser.add_argument('--users', default='data/users.json', help='Users data file')
+    arguments = parser.parse_args(argv)
+
+    system = System()
+    system.load_users_data(arguments.users)
+    system.load_medicines_database_from(arguments.medicines)
+    server = MedihelpServer((arguments.host, arguments.port), system)
+    print(f'Medihelp server listening on http://{server.server_address[0]}:{server.server_address[1]}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        try:
+            system.save_medicines_database()
+        except (DataSavingError, NoFileOpenedError) as e:
+            print(e)
+
+
+if __name__ == '__main__':
+    main()
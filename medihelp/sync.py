@@ -0,0 +1,436 @@
+'''
+Synchronization of two copies of a medicines database (e.g. inventories kept at two sites).
+
+Every medicine is hashed and the hashes are grouped into 2 ** depth buckets by ID.
+    A Merkle tree is built over the buckets: a parent's hash is the hash of its two children.
+    Two trees are compared from the root down, only the subtrees with different hashes are visited,
+    so finding d differing medicines among n takes O(d * log n) comparisons instead of comparing every row.
+The other copy can be in the same process (MerkleTree) or in another one talking through
+    a multiprocessing connection (serve and RemoteTree). Requests of one level of the tree are sent together,
+    so the comparison takes depth + 2 round trips.
+Differing medicines are merged with merge_medicine, in a three-way manner when the base
+    (the state after the previous synchronization) is known.
+'''
+from .serialization import medicine_to_dict, medicine_from_dict
+from .medicine import Medicine
+from .system import System
+from collections import namedtuple
+from hashlib import blake2b
+from multiprocessing import Pipe
+import threading
+import json
+
+
+# Depth of the tree, the number of buckets is 2 ** DEFAULT_DEPTH
+DEFAULT_DEPTH = 10
+
+# Merged fields other than notes and doses_left, with the getters of Medicine
+FIELDS = ['name', 'manufacturer', 'illnesses', 'substances', 'recommended_age',
+          'doses', 'expiration_date', 'recipients']
+
+# Result of sync. changed is the list of IDs of medicines changed in the local database,
+#   conflicts is a dictionary mapping IDs to lists of conflicting fields (where the local value was kept,
+#   ['id'] when the remote medicine was added under a new ID),
+#   base maps IDs of the compared medicines to their remote versions, the common base of the other direction
+SyncResult = namedtuple('SyncResult', ['changed', 'conflicts', 'base'])
+
+
+def _digest(data: bytes):
+    return blake2b(data, digest_size=16).digest()
+
+
+def medicine_digest(medicine: Medicine):
+    '''
+    :return: Hash of the content of the medicine, equal in every process for equal medicines
+    :rtype: bytes
+    '''
+    return _digest(json.dumps(medicine_to_dict(medicine), sort_keys=True, ensure_ascii=False).encode('utf-8'))
+
+
+class MerkleTree:
+    '''
+    Merkle tree over hashes of medicines grouped into buckets by ID
+
+    Attributes
+    ----------
+    :ivar _depth: Depth of the tree, there are 2 ** depth buckets
+    :vartype _depth: int
+
+    :ivar _buckets: Hashes of medicines in every bucket, where medicine IDs are the keys
+    :vartype _buckets: list[dict[int, bytes]]
+
+    :ivar _levels: Hashes of nodes of every level. Level 0 are hashes of buckets, level depth is the root.
+    :vartype _levels: list[list[bytes]]
+    '''
+
+    def __init__(self, medicines=(), depth: int = DEFAULT_DEPTH):
+        '''
+        :param medicines: Medicines in the tree (optional)
+        :type medicines: iterable of Medicine
+
+        :param depth: Depth of the tree. Both compared trees must have the same depth. (optional)
+        :type depth: int
+        '''
+        self._depth = depth
+        self._build(medicines)
+
+    def _build(self, medicines):
+        self._buckets = [{} for _ in range(2 ** self._depth)]
+        for medicine in medicines:
+            self._buckets[self._bucket_index(medicine.id())][medicine.id()] = medicine_digest(medicine)
+        self._levels = [[self._bucket_hash(bucket) for bucket in self._buckets]]
+        for level in range(self._depth):
+            below = self._levels[-1]
+            self._levels.append([_digest(below[index] + below[index + 1]) for index in range(0, len(below), 2)])
+
+    @classmethod
+    def for_system(cls, system, depth: int = DEFAULT_DEPTH):
+        '''
+        Creates tree of the medicines of the system which is updated on every change of them
+
+        :rtype: MerkleTree
+        '''
+        tree = cls(system.medicines_snapshot().values(), depth)
+
+        def on_change(kind, key):
+            if kind == 'medicine':
+                tree.update(key, system.medicines_snapshot().get(key))
+            elif kind == 'medicines':
+                tree._build(system.medicines_snapshot().values())
+        system.add_change_listener(on_change)
+        return tree
+
+    def _bucket_index(self, id: int):
+        return id % len(self._buckets)
+
+    @staticmethod
+    def _bucket_hash(bucket):
+        return _digest(b''.join(id.to_bytes(8, 'big', signed=True) + bucket[id] for id in sorted(bucket)))
+
+    def depth(self):
+        return self._depth
+
+    def root(self):
+        return self._levels[self._depth][0]
+
+    def update(self, id: int, medicine: Medicine = None):
+        '''
+        Updates hash of the medicine with given ID and the hashes on the path to the root.
+
+        :param medicine: New version of the medicine or None if it was deleted
+        :type medicine: Medicine
+        '''
+        index = self._bucket_index(id)
+        bucket = self._buckets[index]
+        if medicine is None:
+            bucket.pop(id, None)
+        else:
+            bucket[id] = medicine_digest(medicine)
+        self._levels[0][index] = self._bucket_hash(bucket)
+        for level in range(1, self._depth + 1):
+            index //= 2
+            below = self._levels[level - 1]
+            self._levels[level][index] = _digest(below[2 * index] + below[2 * index + 1])
+
+    def node_hashes(self, level: int, indexes):
+        '''
+        :return: Hashes of the nodes of given level with given indexes
+        :rtype: list[bytes]
+        '''
+        nodes = self._levels[level]
+        return [nodes[index] for index in indexes]
+
+    def buckets(self, indexes):
+        '''
+        :return: Contents of the buckets with given indexes
+        :rtype: list[dict[int, bytes]]
+        '''
+        return [dict(self._buckets[index]) for index in indexes]
+
+
+def diff(local: MerkleTree, remote):
+    '''
+    Finds IDs of medicines which differ between two trees (or which are in only one of them)
+
+    :param local: Local tree
+    :type local: MerkleTree
+
+    :param remote: Other tree, MerkleTree or RemoteTree
+    :type remote: MerkleTree
+
+    :return: Sorted list of IDs
+    :rtype: list[int]
+    '''
+    if local.depth() != remote.depth():
+        raise ValueError('Trees of different depths can\'t be compared')
+    indexes = [0]
+    for level in range(local.depth(), -1, -1):
+        if not indexes:
+            return []
+        remote_hashes = remote.node_hashes(level, indexes)
+        local_hashes = local.node_hashes(level, indexes)
+        differing = [index for index, local_hash, remote_hash in zip(indexes, local_hashes, remote_hashes)
+                     if local_hash != remote_hash]
+        if level:
+            indexes = [child for index in differing for child in (2 * index, 2 * index + 1)]
+        else:
+            indexes = differing
+    ids = set()
+    for local_bucket, remote_bucket in zip(local.buckets(indexes), remote.buckets(indexes)):
+        for id in local_bucket.keys() | remote_bucket.keys():
+            if local_bucket.get(id) != remote_bucket.get(id):
+                ids.add(id)
+    return sorted(ids)
+
+
+def serve(connection, system, tree: MerkleTree = None):
+    '''
+    Answers requests of a RemoteTree on the other end of the connection until it is closed
+
+    :param connection: Connection to the other process, e.g. one end of multiprocessing.Pipe()
+    :type connection: multiprocessing.connection.Connection
+
+    :param system: System whose medicines are synchronized
+    :type system: System
+
+    :param tree: Tree of the medicines of the system. It is built if not given. (optional)
+    :type tree: MerkleTree
+    '''
+    tree = tree or MerkleTree(system.medicines_snapshot().values())
+    while True:
+        try:
+            request, *arguments = connection.recv()
+        except EOFError:
+            return
+        if request == 'close':
+            return
+        if request == 'depth':
+            response = tree.depth()
+        elif request == 'node_hashes':
+            response = tree.node_hashes(*arguments)
+        elif request == 'buckets':
+            response = tree.buckets(*arguments)
+        elif request == 'records':
+            medicines = system.medicines_snapshot()
+            response = [medicine_to_dict(medicines[id]) if id in medicines else None for id in arguments[0]]
+        else:
+            response = None
+        connection.send(response)
+
+
+class RemoteTree:
+    '''
+    Tree of the medicines of a System in another process, answered by serve() on the other end of the connection
+    '''
+
+    def __init__(self, connection):
+        '''
+        :param connection: Connection to the process running serve()
+        :type connection: multiprocessing.connection.Connection
+        '''
+        self._connection = connection
+        self._depth = self._request('depth')
+
+    def _request(self, *request):
+        self._connection.send(request)
+        return self._connection.recv()
+
+    def depth(self):
+        return self._depth
+
+    def node_hashes(self, level: int, indexes):
+        return self._request('node_hashes', level, indexes)
+
+    def buckets(self, indexes):
+        return self._request('buckets', indexes)
+
+    def records(self, ids):
+        '''
+        :return: Medicines with given IDs, None for the medicines which don't exist
+        :rtype: list[Medicine]
+        '''
+        return [medicine_from_dict(data) if data is not None else None for data in self._request('records', ids)]
+
+    def close(self):
+        self._connection.send(('close',))
+
+
+def _merge_value(base, local, remote):
+    '''
+    :return: Pair (merged value, True if there is a conflict)
+    '''
+    if local == remote:
+        return local, False
+    if local == base:
+        return remote, False
+    if remote == base:
+        return local, False
+    return local, True
+
+
+def merge_medicine(base: Medicine, local: Medicine, remote: Medicine):
+    '''
+    Merges two versions of a medicine with their common base.
+        Notes are merged per author. Doses taken at both sites are subtracted from doses_left
+        (local + remote - base), unless both sites ended with the same number of doses left. Other fields are taken from the side which changed them.
+        If a field was changed differently at both sites, the local value is kept and the field is reported as a conflict.
+        Different versions without a base were added at both sites under the same ID, they are two different medicines
+        which are never merged: the local one is kept and 'id' is reported as a conflict (sync gives the remote one
+        a new ID).
+
+    :param base: Version after the previous synchronization or None if unknown (or if it didn't exist)
+    :type base: Medicine
+    :param local: Local version or None if it doesn't exist locally
+    :type local: Medicine
+    :param remote: Remote version or None if it doesn't exist remotely
+    :type remote: Medicine
+
+    :return: Pair (merged version or None if the medicine should not exist, list of conflicting fields)
+    :rtype: tuple[Medicine, list[str]]
+    '''
+    if local is None or remote is None:
+        existing = local or remote
+        if base is None:
+            # Added at one site
+            return existing, []
+        if medicine_digest(existing) == medicine_digest(base):
+            # Deleted at one site and not changed at the other
+            return None, []
+        if local is None:
+            return None, ['deleted']
+        return local, ['deleted']
+    if base is None:
+        if medicine_digest(local) == medicine_digest(remote):
+            return local, []
+        return local, ['id']
+    conflicts = []
+    values = {}
+    for field in FIELDS:
+        value, conflict = _merge_value(getattr(base, field)(), getattr(local, field)(), getattr(remote, field)())
+        values[field] = value
+        if conflict:
+            conflicts.append(field)
+
+    notes = {}
+    for author_id in local.notes().keys() | remote.notes().keys() | base.notes().keys():
+        note, conflict = _merge_value(base.notes().get(author_id), local.notes().get(author_id),
+                                      remote.notes().get(author_id))
+        if note is not None:
+            notes[author_id] = note
+        if conflict:
+            conflicts.append(f'notes[{author_id}]')
+
+    if local.doses_left() == remote.doses_left():
+        doses_left = local.doses_left()
+    else:
+        doses_left = max(local.doses_left() + remote.doses_left() - base.doses_left(), 0)
+    doses_left = min(doses_left, values['doses'])
+    merged = Medicine(local.id(), doses_left=doses_left, notes=notes, **values)
+    return merged, conflicts
+
+
+def sync(system, remote, base=None, tree: MerkleTree = None):
+    '''
+    Pulls changes of the remote copy of the medicines database into the system.
+        To make both copies equal, the other site then pulls from this one with base set to result.base:
+        the remote versions read here are the common base of the merged local versions and the remote copy,
+        so the doses taken at the other site are not subtracted again.
+        After both directions the copies are equal and a snapshot of either one is the base of the next synchronization.
+        A remote medicine which has no base and differs from the local one with the same ID was added independently,
+        it is added under a new ID (the smallest one not used at either site) and the old ID is reported
+        as a conflict of field 'id'.
+
+    :param system: System into which the changes are merged
+    :type system: System
+
+    :param remote: Tree of the other copy
+    :type remote: RemoteTree
+
+    :param base: Medicines after the previous synchronization, where IDs are the keys (optional)
+    :type base: Mapping[int, Medicine]
+
+    :param tree: Tree of the medicines of the system. It is built if not given. (optional)
+    :type tree: MerkleTree
+
+    :rtype: SyncResult
+    '''
+    tree = tree or MerkleTree(system.medicines_snapshot().values(), remote.depth())
+    ids = diff(tree, remote)
+    if not ids:
+        return SyncResult([], {}, {})
+    base = base or {}
+    local = system.medicines_snapshot()
+    remote_medicines = remote.records(ids)
+    changes = {}
+    conflicts = {}
+    # IDs not used at either site: every remote ID is either in the local database or among the differing ones
+    used_ids = set(local.keys()) | set(ids)
+    free_id = 0
+    for id, remote_medicine in zip(ids, remote_medicines):
+        local_medicine = local.get(id)
+        merged, medicine_conflicts = merge_medicine(base.get(id), local_medicine, remote_medicine)
+        if medicine_conflicts:
+            conflicts[id] = medicine_conflicts
+        if medicine_conflicts == ['id']:
+            while free_id in used_ids:
+                free_id += 1
+            used_ids.add(free_id)
+            data = medicine_to_dict(remote_medicine)
+            data['id'] = free_id
+            changes[free_id] = medicine_from_dict(data)
+            continue
+        if merged is None and local_medicine is None:
+            continue
+        if merged is not None and local_medicine is not None \
+                and medicine_digest(merged) == medicine_digest(local_medicine):
+            continue
+        changes[id] = merged
+    if changes:
+        system.merge_external_changes(medicines=changes, in_files=False)
+    new_base = {id: medicine for id, medicine in zip(ids, remote_medicines) if medicine is not None}
+    return SyncResult(sorted(changes), conflicts, new_base)
+
+
+def _pull(system, other, base):
+    '''
+    Runs sync of the system against the other one in the same process, through a pipe served by a thread
+    '''
+    local_end, remote_end = Pipe()
+    thread = threading.Thread(target=serve, args=(remote_end, other), daemon=True)
+    thread.start()
+    remote = RemoteTree(local_end)
+    try:
+        return sync(system, remote, base)
+    finally:
+        remote.close()
+        thread.join()
+
+
+def sync_files(first_path: str, second_path: str, base=None):
+    '''
+    Synchronizes two medicines database files in both directions and saves both of them.
+        Users are not loaded, notes and recipients are kept as IDs.
+
+    :param first_path: Path to the first .csv file, its values are kept on conflicts
+    :type first_path: str
+
+    :param second_path: Path to the second .csv file
+    :type second_path: str
+
+    :param base: Medicines after the previous synchronization, where IDs are the keys (optional)
+    :type base: Mapping[int, Medicine]
+
+    :return: Results of pulling into the first file and then into the second one
+    :rtype: tuple[SyncResult, SyncResult]
+    '''
+    first = System()
+    first.load_medicines_database_from(first_path)
+    second = System()
+    second.load_medicines_database_from(second_path)
+    first_result = _pull(first, second, base)
+    second_result = _pull(second, first, first_result.base)
+    if first_result.changed:
+        first.save_medicines_database()
+    if second_result.changed:
+        second.save_medicines_database()
+    return first_result, second_result
@@ -6,10 +6,47 @@ from .errors import (DataLoadingError,
                      NoFileOpenedError,
                      DataSavingError,
                      MedicineDoesNotExistError,
-                     UserDoesNotExistError)
+                     UserDoesNotExistError,
+                     SystemClosedError,
+                     TransactionInProgressError)
 from medihelp.prescription import Prescription
+from medihelp.compression import open_data_file, is_compressed
+from medihelp.occurrences import iter_occurrences, list_occurrences
+from medihelp.rwlock import RWLock
+from medihelp.file_lock import locked, DEFAULT_TIMEOUT
 from typing import Iterable
-from datetime import date
+from datetime import date, datetime
+from contextlib import contextmanager
+from collections import deque
+from functools import wraps
+import threading
+import os
+
+
+def _writer(method):
+    '''
+    Runs the method of System with the databases locked for writing
+
+    :raises SystemClosedError: If the system was closed
+    '''
+    @wraps(method)
+    def locked(self, *args, **kwargs):
+        with self._lock.write_lock():
+            if self._closed:
+                raise SystemClosedError
+            return method(self, *args, **kwargs)
+    return locked
+
+
+def _reader(method):
+    '''
+    Runs the method of System with the databases locked for reading
+    '''
+    @wraps(method)
+    def locked(self, *args, **kwargs):
+        with self._lock.read_lock():
+            return method(self, *args, **kwargs)
+    return locked
 
 
 class System:
@@ -31,17 +68,138 @@ class System:
 
     :ivar _medicines_file_saved: True if there are no unsaved changes in medicines database, else False
     :vartype _medicines_file_saved: bool
+
+    :ivar _users_file_path: Path to the file with users database
+    :vartype _users_file_path: str
+
+    :ivar _change_listeners: Functions called after every change of the databases (see add_change_listener)
+    :vartype _change_listeners: list[callable]
+
+    :ivar _dose_log: Log where every taken dose is recorded or None if doses are not logged
+    :vartype _dose_log: DoseLog
+
+    :ivar _transaction_depth: Number of currently open (nested) transactions
+    :vartype _transaction_depth: int
+
+    :ivar _journal: Records (undo, redo, kind, key) of changes made in the current transaction, in the order
+        of the changes. undo reverts the change, redo applies it again and kind and key describe the changed record
+        the same way as in change notifications.
+    :vartype _journal: list[tuple[callable, callable, str, int]]
+
+    :ivar _undo_stack: Journals of committed transactions that can be undone, the latest one last.
+        Only the configured number of journals is kept.
+    :vartype _undo_stack: deque[list]
+
+    :ivar _redo_stack: Journals of undone transactions that can be redone, the latest one last
+    :vartype _redo_stack: list[list]
+
+    :ivar _replaying: True while a transaction is undone or redone
+    :vartype _replaying: bool
+
+    :ivar _pending_notifications: Notifications (kind, key) deferred until the current transaction is committed
+    :vartype _pending_notifications: list[tuple[str, int]]
+
+    :ivar _pending_doses: Doses (user ID, medicine ID, time) to be written to the dose log on commit
+    :vartype _pending_doses: list[tuple[int, int, datetime]]
+
+    :ivar _users_data_changed: True if users data has to be saved when the current transaction is committed
+    :vartype _users_data_changed: bool
+
+    :ivar _lock: Reader-writer lock of the databases. Every mutating method holds it for writing,
+        so writers are serialized, while queries and snapshots hold it for reading.
+    :vartype _lock: RWLock
+
+    :ivar _file_locks: Locks serializing writes to files, where absolute paths are the keys
+    :vartype _file_locks: dict[str, threading.Lock]
+
+    :ivar _lock_timeout: How long loading and saving wait for other processes using the file, in seconds.
+        Files are shared with other processes through advisory locks (see file_lock.locked).
+    :vartype _lock_timeout: float
+
+    :ivar _closed: True if the system was closed and rejects changes (see close)
+    :vartype _closed: bool
+
+    Files which names end with .gz, .xz or .bz2 (or which start with magic bytes of those formats)
+        are decompressed and compressed on the fly.
     '''
 
-    def __init__(self):
+    def __init__(self, undo_depth: int = 100, lock_timeout: float = DEFAULT_TIMEOUT,
+                 users_file_path: str = 'data/users.json'):
+        '''
+        :param undo_depth: How many transactions can be undone (optional)
+        :type undo_depth: int
+
+        :param lock_timeout: How long loading and saving wait for other processes using the file, in seconds (optional)
+        :type lock_timeout: float
+
+        :param users_file_path: Path to the file where users data is saved until other file is loaded (optional)
+        :type users_file_path: str
+        '''
         self._medicines_database = MedicinesDatabase()
         self._users_database = UsersDatabase()
         self._medicines_file_path = None
         self._medicines_file_saved = True
+        self._users_file_path = users_file_path
+        self._change_listeners = []
+        self._forecast = None
+        self._scheduler = None
+        self._query_index = None
+        self._dose_log = None
+        self._transaction_depth = 0
+        self._journal = []
+        self._pending_notifications = []
+        self._pending_doses = []
+        self._users_data_changed = False
+        self._saved_before_transaction = True
+        self._undo_stack = deque(maxlen=undo_depth)
+        self._redo_stack = []
+        self._replaying = False
+        self._lock = RWLock()
+        self._file_locks = {}
+        self._file_locks_guard = threading.Lock()
+        self._lock_timeout = lock_timeout
+        self._medicines_changes = 0
+        self._save_sequence = 0
+        self._written_sequences = {}
+        self._closed = False
 
     def medicines_database(self):
         return self._medicines_database
 
+    def read_lock(self):
+        '''
+        Returns context manager holding the databases locked for reading,
+            so that no other thread modifies them inside the with block:
+
+            with system.read_lock():
+                total = sum(medicine.doses_left() for medicine in system.medicines().values())
+        '''
+        return self._lock.read_lock()
+
+    @_reader
+    def medicines_snapshot(self):
+        '''
+        Returns read-only dictionary of medicines as they are at the moment of the call.
+            Later changes of the database don't affect it, medicines included, so it can be read without locking.
+            It costs O(1), apart from a lazily loaded database (see MedicinesDatabase.snapshot).
+            It only holds the lock for reading, so it can be called inside read_lock().
+
+        :rtype: Mapping[int, Medicine]
+        '''
+        return self._medicines_database.snapshot()
+
+    @_reader
+    def users_snapshot(self):
+        '''
+        Returns read-only dictionary of users as they are at the moment of the call.
+            Later changes of the database don't affect it, users included, so it can be read without locking.
+            It costs O(1) (see UsersDatabase.snapshot).
+            It only holds the lock for reading, so it can be called inside read_lock().
+
+        :rtype: Mapping[int, User]
+        '''
+        return self._users_database.snapshot()
+
     def users_database(self):
         return self._users_database
 
@@ -53,6 +211,7 @@ class System:
         Returns a dictionary of medicines that are stored in self._medicines_database.medicines().
         IDs of the medicine are the keys and Medicine objects are the values.
         This dictionary should not be modify in any way!
+        Other threads should read it inside read_lock() or use medicines_snapshot().
         '''
         return self._medicines_database.medicines()
 
@@ -61,6 +220,7 @@ class System:
         Returns a dictionary of users that are stored in self._medicines_database.medicines().
         IDs of users are the keys and User objects are the values.
         This dictionary should not be modify in any way!
+        Other threads should read it inside read_lock() or use users_snapshot().
         '''
         return self._users_database.users()
 
@@ -70,26 +230,373 @@ class System:
         '''
         return self._medicines_file_saved
 
-    def load_users_data(self):
+    def add_change_listener(self, listener):
+        '''
+        Registers a function that is called after every change of the databases as listener(kind, key) where:
+        1) kind == 'medicine' and key is the ID of the medicine that was added, modified or deleted
+        2) kind == 'user' and key is the ID of the user whose data or prescriptions changed
+        3) kind == 'medicines' or kind == 'users' and key is None when the whole database was loaded
+
+        :param listener: function to be called
+        :type listener: callable
+        '''
+        self._change_listeners.append(listener)
+
+    def remove_change_listener(self, listener):
+        self._change_listeners.remove(listener)
+
+    def _notify(self, kind: str, key: int = None):
+        if self._transaction_depth:
+            self._pending_notifications.append((kind, key))
+            return
+        for listener in list(self._change_listeners):
+            listener(kind, key)
+
+    @contextmanager
+    def transaction(self):
+        '''
+        Groups changes of the databases into one unit of work:
+
+            with system.transaction():
+                system.del_medicine(0)
+                system.add_prescription(1, 'Apap', 1, 3)
+
+        Changes are visible immediately, but users data is saved, doses are written to the dose log
+            and change listeners are notified (once per changed record) only when the outermost transaction ends.
+            If an exception leaves the block, every change made in it is reverted and the exception is propagated.
+            Every mutating method of System runs in its own transaction, so a failing call never leaves
+            half-applied changes. Transactions can be nested; loading databases is not reverted.
+            The databases stay locked for writing until the transaction ends.
+        '''
+        with self._lock.write_lock():
+            outermost = not self._transaction_depth
+            if outermost:
+                self._saved_before_transaction = self._medicines_file_saved
+            savepoint = (len(self._journal), len(self._pending_notifications), len(self._pending_doses))
+            self._transaction_depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._transaction_depth -= 1
+                self._rollback(*savepoint)
+                if outermost:
+                    self._medicines_file_saved = self._saved_before_transaction
+                    self._users_data_changed = False
+                raise
+            self._transaction_depth -= 1
+            if outermost:
+                self._commit()
+
+    def _record(self, undo, redo, kind: str, key: int):
+        '''
+        Records the change that was just made
+
+        :param undo: Function reverting the change
+        :type undo: callable
+
+        :param redo: Function applying the change again
+        :type redo: callable
+
+        :param kind: Kind of the changed record ('medicine' or 'user')
+        :type kind: str
+
+        :param key: ID of the changed record
+        :type key: int
+        '''
+        self._journal.append((undo, redo, kind, key))
+
+    def _rollback(self, journal_length=0, notifications_length=0, doses_length=0):
+        '''
+        Reverts changes recorded in the journal after the given savepoint
+        '''
+        while len(self._journal) > journal_length:
+            self._journal.pop()[0]()
+        del self._pending_notifications[notifications_length:]
+        del self._pending_doses[doses_length:]
+
+    def _commit(self):
+        '''
+        Saves users data, writes doses to the dose log and sends notifications deferred by the transaction.
+            If users data can't be saved, the transaction is rolled back.
+
+        :return: Journal of the committed transaction
+        :rtype: list[callable]
+        '''
+        if self._users_data_changed:
+            try:
+                self.save_users_data()
+            except DataSavingError:
+                self._rollback()
+                self._medicines_file_saved = self._saved_before_transaction
+                raise
+            finally:
+                self._users_data_changed = False
+        journal = self._journal
+        self._journal = []
+        if journal and not self._replaying:
+            self._undo_stack.append(journal)
+            self._redo_stack.clear()
+        if self._dose_log is not None:
+            for user_id, medicine_id, time in self._pending_doses:
+                self._dose_log.append(user_id=user_id, medicine_id=medicine_id, doses=1, time=time)
+        self._pending_doses.clear()
+        notifications = list(dict.fromkeys(self._pending_notifications))
+        self._pending_notifications.clear()
+        for kind, key in notifications:
+            self._notify(kind, key)
+        return journal
+
+    def undo_depth(self):
+        return self._undo_stack.maxlen
+
+    @_writer
+    def set_undo_depth(self, depth: int):
+        '''
+        Sets how many transactions can be undone. The oldest transactions above the limit are forgotten.
+        '''
+        self._undo_stack = deque(self._undo_stack, maxlen=depth)
+
+    def can_undo(self):
+        return bool(self._undo_stack)
+
+    def can_redo(self):
+        return bool(self._redo_stack)
+
+    @_writer
+    def clear_history(self):
+        '''
+        Forgets all transactions that could be undone or redone
+        '''
+        self._undo_stack.clear()
+        self._redo_stack.clear()
+
+    @_writer
+    def undo(self):
+        '''
+        Reverts the latest committed transaction (a single call of a mutating method is a transaction too).
+            Only the recorded changes are reverted, so undo costs about as much as the transaction did.
+            Doses written to the dose log stay there.
+
+        :return: True if there was a transaction to undo
+        :rtype: bool
         '''
-        Loads users data from a data/users.json file
+        if not self._undo_stack:
+            return False
+        journal = self._undo_stack.pop()
+        try:
+            self._replay([(redo, undo, kind, key) for undo, redo, kind, key in reversed(journal)])
+        except BaseException:
+            # The replay was rolled back, so the transaction can still be undone
+            self._undo_stack.append(journal)
+            raise
+        self._redo_stack.append(journal)
+        return True
+
+    @_writer
+    def redo(self):
+        '''
+        Applies again the latest undone transaction
+
+        :return: True if there was a transaction to redo
+        :rtype: bool
         '''
+        if not self._redo_stack:
+            return False
+        journal = self._redo_stack.pop()
         try:
-            with open('data/users.json', 'r') as file:
-                self._users_database.read_from_file(file)
+            self._replay([(undo, redo, kind, key) for undo, redo, kind, key in journal])
+        except BaseException:
+            self._redo_stack.append(journal)
+            raise
+        self._undo_stack.append(journal)
+        return True
+
+    def _replay(self, records):
+        '''
+        Applies redo functions of the records in one transaction which is not added to the history.
+            If it fails, the transaction is rolled back and the caller puts the journal back on its stack.
+        '''
+        self._replaying = True
+        try:
+            with self.transaction():
+                for record in records:
+                    undo, redo, kind, key = record
+                    redo()
+                    self._journal.append(record)
+                    if kind == 'medicine':
+                        if key in self.medicines():
+                            self.medicines_database().mark_dirty(key)
+                        self._medicines_unsaved()
+                        self._notify(kind, key)
+                    else:
+                        self._user_changed(key)
+        finally:
+            self._replaying = False
+
+    def _medicine_changed(self, medicine_id: int):
+        '''
+        Marks the medicine as modified in place, so it is saved again, and notifies listeners
+        '''
+        self.medicines_database().mark_dirty(medicine_id)
+        self._medicines_unsaved()
+        self._notify('medicine', medicine_id)
+
+    def _medicines_unsaved(self):
+        '''
+        Marks the medicines database as changed since it was last saved
+        '''
+        self._medicines_file_saved = False
+        self._medicines_changes += 1
+
+    def _user_changed(self, user_id: int):
+        '''
+        Schedules saving users data and notifies listeners
+        '''
+        self._users_data_changed = True
+        self._notify('user', user_id)
+
+    def forecast(self):
+        '''
+        Returns stock run-out forecast which is kept up to date with the databases.
+            It is created on the first call.
+
+        :rtype: StockForecast
+        '''
+        if self._forecast is None:
+            from .forecast import StockForecast
+            self._forecast = StockForecast(self)
+        return self._forecast
+
+    def scheduler(self):
+        '''
+        Returns reminder scheduler of users' prescriptions which is kept up to date with the users database.
+            It is created on the first call.
+
+        :rtype: ReminderScheduler
+        '''
+        if self._scheduler is None:
+            from .scheduler import ReminderScheduler
+            self._scheduler = ReminderScheduler(self)
+        return self._scheduler
+
+    def query_index(self):
+        '''
+        Returns secondary indexes of the medicines database used by queries (see medihelp.query).
+            It is created on the first call and kept up to date with the database.
+
+        :rtype: MedicineIndex
+        '''
+        if self._query_index is None:
+            from .query import MedicineIndex
+            self._query_index = MedicineIndex(self)
+        return self._query_index
+
+    def _users_by_ids(self, user_ids):
+        if user_ids is None:
+            return list(self.users().values())
+        users = []
+        for user_id in user_ids:
+            user = self.users().get(user_id)
+            if not user:
+                raise UserDoesNotExistError(user_id)
+            users.append(user)
+        return users
+
+    @_reader
+    def occurrences(self, user_ids: Iterable[int], start: date, end: date):
+        '''
+        Expands weekly prescriptions of the given users into dated occurrences from start to end (both inclusive)
+
+        :param user_ids: IDs of the users or None for all users
+        :type user_ids: iterable of int
+
+        :param start: First day of the range
+        :type start: date
+
+        :param end: Last day of the range
+        :type end: date
+
+        :return: Occurrences sorted by date, user ID and prescription ID
+        :rtype: list[Occurrence]
+        '''
+        return list_occurrences(self._users_by_ids(user_ids), start, end)
+
+    def iter_occurrences(self, user_ids: Iterable[int], start: date, end: date):
+        '''
+        Generator variant of occurrences(), useful for streaming long ranges
+
+        :rtype: generator of Occurrence
+        '''
+        return iter_occurrences(self._users_by_ids(user_ids), start, end)
+
+    def dose_log(self):
+        return self._dose_log
+
+    def set_dose_log(self, dose_log):
+        '''
+        Sets the log where every dose taken through take_dose is recorded
+
+        :param dose_log: Dose log or None to stop logging
+        :type dose_log: DoseLog
+        '''
+        self._dose_log = dose_log
+
+    def users_file_path(self):
+        return self._users_file_path
+
+    @_writer
+    def load_users_data(self, path: str = None):
+        '''
+        Loads users data from a data/users.json file or from the given path
+            which is then used when saving users data. If loading fails, the path is not changed.
+
+        :param path: Path to the file (optional)
+        :type path: str
+        '''
+        path = path or self._users_file_path
+        try:
+            with locked(path, False, self._lock_timeout):
+                with open_data_file(path, 'r') as file:
+                    self._users_database.read_from_file(file)
         except Exception as e:
             raise DataLoadingError from e
+        self._users_file_path = path
+        self.clear_history()
+        self._notify('users')
 
+    @_writer
     def save_users_data(self):
         '''
-        Saves users data to data/users.json file
+        Saves users data to data/users.json file or the file users data was loaded from.
+            Changes made in a transaction are saved when it is committed.
+
+        :raises TransactionInProgressError: If called inside a transaction
         '''
+        if self._transaction_depth:
+            raise TransactionInProgressError
         try:
-            with open('data/users.json', 'w') as file:
-                self._users_database.write_to_file(file)
+            with locked(self._users_file_path, True, self._lock_timeout):
+                with open_data_file(self._users_file_path, 'w') as file:
+                    self._users_database.write_to_file(file)
         except Exception as e:
             raise DataSavingError from e
 
+    def close(self):
+        '''
+        Saves unsaved medicines database and closes the system. Data can still be read,
+            but every change raises SystemClosedError, so changes made through a reference kept after the system
+            was unloaded (e.g. by SystemRegistry) are not lost silently. If saving fails the system stays open.
+        '''
+        with self._lock.write_lock():
+            if self._closed:
+                return
+            if not self._medicines_file_saved:
+                self.save_medicines_database()
+            self._closed = True
+
+    def closed(self):
+        return self._closed
+
     def medicines_database_loaded(self):
         '''
         Checks if there is a medicines file loaded ???
@@ -98,7 +605,8 @@ class System:
             return True
         return False
 
-    def load_medicines_database_from(self, path: str):
+    @_writer
+    def load_medicines_database_from(self, path: str, lazy: bool = False):
         '''
         Clears self._medicines_database
         Loads database from the given file path
@@ -107,36 +615,149 @@ class System:
 
         :param path: Path to the file
         :type path: str
+
+        :param lazy: If True the file is memory-mapped and medicines are created on the first access (optional).
+            Ignored for compressed files.
+        :type lazy: bool
         '''
         self._medicines_database.clear()
         try:
-            with open(path, 'r') as file:
-                self._medicines_database.read_from_file(file)
+            with locked(path, False, self._lock_timeout):
+                if lazy and not is_compressed(path):
+                    self._medicines_database.map_file(path)
+                else:
+                    with open_data_file(path, 'r') as file:
+                        self._medicines_database.read_from_file(file)
         except Exception as e:
             raise DataLoadingError from e
         self._medicines_file_path = path
         self._medicines_file_saved = True
+        # Saves which started before the database was loaded don't mark it as saved
+        self._medicines_changes += 1
+        self.clear_history()
+        self._notify('medicines')
 
     def save_medicines_database(self, path=None):
         '''
-        Saves data from medicine database to the file given by path or to the opened medicine file if there is no path given
+        Saves data from medicine database to the file given by path or to the opened medicine file if there is no path given.
+            A copy-on-write snapshot of the database is taken while it is locked and its rows are streamed into the file
+            after the lock is released, so readers and writers don't wait for the disk. Saves to the same file are serialized
+            and a snapshot older than the one already written is not written again.
+            The database is reported as saved only after the write succeeded and if it did not change in the meantime.
 
         :param path: Path to the file (optional)
         :type path: str
+
+        :raises TransactionInProgressError: If called inside a transaction, which could still be rolled back
         '''
+        with self._lock.write_lock():
+            if self._transaction_depth:
+                raise TransactionInProgressError
+            if not self.medicines_database_loaded() and not path:
+                raise NoFileOpenedError
+            if not path:
+                path = self._medicines_file_path
+            if self._medicines_database.is_lazy():
+                self._save_lazy_medicines_database(path)
+                return
+            write = self._medicines_database.snapshot_writer()
+            changes = self._medicines_changes
+            self._save_sequence += 1
+            sequence = self._save_sequence
+        absolute_path = os.path.abspath(path)
+        serialized = {}
+        try:
+            with self._file_lock(path), locked(path, True, self._lock_timeout):
+                # A save which started later may have taken the file lock first
+                if self._written_sequences.get(absolute_path, 0) < sequence:
+                    with open_data_file(path, 'w') as file:
+                        serialized = write(file)
+                    self._written_sequences[absolute_path] = sequence
+        except Exception as e:
+            raise DataSavingError from e
+        with self._lock.write_lock():
+            self._medicines_database.cache_rows(serialized)
+            self._medicines_file_path = path
+            if self._medicines_changes == changes:
+                self._medicines_file_saved = True
 
-        if not self.medicines_database_loaded() and not path:
-            raise NoFileOpenedError
-        if not path:
-            path = self._medicines_file_path
+    def _save_lazy_medicines_database(self, path: str):
+        '''
+        Saves lazily loaded database while it is locked, rows of not modified medicines are copied from the mapped file
+        '''
+        mapped_path = self._medicines_database.mapped_file_path()
         try:
-            with open(path, 'w') as file:
-                self._medicines_database.write_to_file(file)
+            with self._file_lock(path), locked(path, True, self._lock_timeout):
+                if os.path.abspath(mapped_path) == os.path.abspath(path):
+                    # The mapped file can't be truncated while rows are copied from it.
+                    #   New content is written to a temporary file which then replaces the mapped one.
+                    temporary_path = path + '.tmp'
+                    with open(temporary_path, 'w') as file:
+                        self._medicines_database.write_to_file(file)
+                    os.replace(temporary_path, path)
+                else:
+                    with open_data_file(path, 'w') as file:
+                        self._medicines_database.write_to_file(file)
         except Exception as e:
             raise DataSavingError from e
-        self._medicines_file_saved = True
         self._medicines_file_path = path
+        self._medicines_file_saved = True
+
+    def _file_lock(self, path: str):
+        '''
+        Returns the lock serializing writes to the file under the given path
+        '''
+        with self._file_locks_guard:
+            return self._file_locks.setdefault(os.path.abspath(path), threading.Lock())
 
+    @_writer
+    def merge_external_changes(self, medicines: dict = None, users: dict = None, in_files: bool = True):
+        '''
+        Applies changes made by another program, to the data files (see watcher.FileWatcher)
+            or to another copy of the databases (see sync.sync).
+            Merged changes can't be undone and history of changes is cleared.
+
+        :param medicines: New versions of changed medicines, where IDs are the keys.
+            None is the value for deleted medicines. (optional)
+        :type medicines: dict[int, Medicine]
+
+        :param users: New versions of changed users, where IDs are the keys.
+            None is the value for deleted users. (optional)
+        :type users: dict[int, User]
+
+        :param in_files: True if the changes are already in the data files, so they don't make the databases unsaved.
+            Otherwise they are saved like any other change. (optional)
+        :type in_files: bool
+        '''
+        medicines = medicines or {}
+        users = users or {}
+        with self.transaction():
+            medicines_database = self.medicines_database()
+            for id, medicine in medicines.items():
+                if medicine is None:
+                    if id in medicines_database.medicines():
+                        medicines_database.delete_medicine(id)
+                elif id in medicines_database.medicines():
+                    medicines_database.replace_medicine(medicine)
+                else:
+                    medicines_database.add_medicine(medicine)
+                self._notify('medicine', id)
+            users_database = self.users_database()
+            for id, user in users.items():
+                if id in users_database.users():
+                    users_database.delete_user(id)
+                if user is not None:
+                    users_database.add_user(user)
+                self._notify('user', id)
+            if not in_files:
+                if medicines:
+                    self._medicines_unsaved()
+                if users:
+                    self._users_data_changed = True
+        if medicines or users:
+            self.clear_history()
+
+    @_writer
     def set_note(self, medicine_id: int, author_id: int, content: str):
         '''
         Sets the content of the note assigned to medicine with ID medicine_id where user with ID author_id is the author.
@@ -153,12 +774,19 @@ class System:
         if author_id not in self.users_database().users().keys():
             raise UserDoesNotExistError(author_id)
         medicine = self.medicines_database().medicines().get(medicine_id)
-        if medicine:
-            medicine.set_note(author_id, content)
-            self._medicines_file_saved = False
-        else:
+        if not medicine:
             raise MedicineDoesNotExistError(medicine_id)
+        with self.transaction():
+            medicine = self.medicines_database().writable_medicine(medicine_id)
+            old_content = medicine.note(author_id)
+            medicine.set_note(author_id, content)
+            new_content = medicine.note(author_id)
+            self._record(lambda: self._restore_note(medicine_id, author_id, old_content),
+                         lambda: self._restore_note(medicine_id, author_id, new_content),
+                         'medicine', medicine_id)
+            self._medicine_changed(medicine_id)
 
+    @_writer
     def del_note(self, medicine_id: int, author_id: int):
         '''
        deletes the note assigned to medicine with ID medicine_id where user with ID author_id is the author.
@@ -172,12 +800,26 @@ class System:
         if author_id not in self.users_database().users().keys():
             raise UserDoesNotExistError(author_id)
         medicine = self.medicines_database().medicines().get(medicine_id)
-        if medicine:
+        if not medicine:
+            raise MedicineDoesNotExistError(medicine_id)
+        with self.transaction():
+            medicine = self.medicines_database().writable_medicine(medicine_id)
+            old_content = medicine.note(author_id)
+            medicine.del_note(author_id)
+            self._record(lambda: self._restore_note(medicine_id, author_id, old_content),
+                         lambda: self._restore_note(medicine_id, author_id, None),
+                         'medicine', medicine_id)
+            self._medicine_changed(medicine_id)
+
+    def _restore_note(self, medicine_id: int, author_id: int, content: str):
+        medicine = self.medicines_database().writable_medicine(medicine_id)
+        if content is None:
             medicine.del_note(author_id)
-            self._medicines_file_saved = False
         else:
-            raise MedicineDoesNotExistError(medicine_id)
+            medicine.set_note(author_id, content)
+        self.medicines_database().mark_dirty(medicine_id)
 
+    @_writer
     def add_medicine(self,
                      name: str,
                      manufacturer: str,
@@ -216,9 +858,7 @@ class System:
         :return: ID assigned to the created medicine object
         :rtype: int
         '''
-        id = 0
-        while id in self.medicines_database().medicines().keys():
-            id += 1
+        id = self.medicines_database().free_id()
         medicine = Medicine(id,
                             name=name,
                             manufacturer=manufacturer,
@@ -230,10 +870,16 @@ class System:
                             expiration_date=expiration_date,
                             recipients=recipients,
                             notes=notes)
-        self.medicines_database().add_medicine(medicine)
-        self._medicines_file_saved = False
+        with self.transaction():
+            self.medicines_database().add_medicine(medicine)
+            self._record(lambda: self.medicines_database().delete_medicine(id),
+                         lambda: self.medicines_database().add_medicine(medicine),
+                         'medicine', id)
+            self._medicines_unsaved()
+            self._notify('medicine', id)
         return id
 
+    @_writer
     def del_medicine(self, medicine_id: int):
         '''
         Deletes medicine with given ID from the database
@@ -241,9 +887,16 @@ class System:
         :param medicine_id: ID of the medicine that is to be deleted
         :type medicine_id: int
         '''
-        self.medicines_database().delete_medicine(medicine_id)
-        self._medicines_file_saved = False
+        medicine = self.medicines().get(medicine_id)
+        with self.transaction():
+            self.medicines_database().delete_medicine(medicine_id)
+            self._record(lambda: self.medicines_database().add_medicine(medicine),
+                         lambda: self.medicines_database().delete_medicine(medicine_id),
+                         'medicine', medicine_id)
+            self._medicines_unsaved()
+            self._notify('medicine', medicine_id)
 
+    @_writer
     def change_medicine(self,
                         medicine_id: int,
                         name: str,
@@ -292,15 +945,21 @@ class System:
                                 doses_left=doses_left,
                                 expiration_date=expiration_date,
                                 recipients=recipients,
-                                notes=old_medicine.notes())
-        self.medicines_database().delete_medicine(medicine_id)
-        self.medicines_database().add_medicine(new_medicine)
-        self._medicines_file_saved = False
+                                notes=dict(old_medicine.notes()))
+        with self.transaction():
+            self.medicines_database().replace_medicine(new_medicine)
+            self._record(lambda: self.medicines_database().replace_medicine(old_medicine),
+                         lambda: self.medicines_database().replace_medicine(new_medicine),
+                         'medicine', medicine_id)
+            self._medicines_unsaved()
+            self._notify('medicine', medicine_id)
 
+    @_writer
     def take_dose(self, medicine_id: int, user: User):
         '''
         1) Decrements medicine's _doses_left.
         2) Throws exceptions with a reason if the user can't take the medicine.
+        3) Records the dose in the dose log if there is one.
 
         :param medicine_id: ID of the medicine
         :type medicine_id: int
@@ -311,9 +970,21 @@ class System:
         medicine = self.medicines().get(medicine_id)
         if not medicine:
             raise MedicineDoesNotExistError(medicine_id)
-        medicine.take_doses(doses=1, user=user)
-        self._medicines_file_saved = False
+        with self.transaction():
+            medicine = self.medicines_database().writable_medicine(medicine_id)
+            medicine.take_doses(doses=1, user=user)
+            self._record(lambda: self._restore_doses(medicine_id, 1),
+                         lambda: self._restore_doses(medicine_id, -1),
+                         'medicine', medicine_id)
+            self._pending_doses.append((user.id(), medicine_id, datetime.now()))
+            self._medicine_changed(medicine_id)
 
+    def _restore_doses(self, medicine_id: int, doses: int):
+        # Negative doses are taken away again (redo)
+        self.medicines_database().writable_medicine(medicine_id).restore_doses(doses)
+        self.medicines_database().mark_dirty(medicine_id)
+
+    @_writer
     def change_user(self,
                     user_id: int,
                     name: str,
@@ -347,11 +1018,18 @@ class System:
                         allergies=allergies,
                         prescriptions=old_user.prescriptions().values())
 
-        self.users_database().delete_user(user_id)
-        self.users_database().add_user(new_user)
+        with self.transaction():
+            self._replace_user(new_user)
+            self._record(lambda: self._replace_user(old_user),
+                         lambda: self._replace_user(new_user),
+                         'user', user_id)
+            self._user_changed(user_id)
 
-        self.save_users_data()
+    def _replace_user(self, user: User):
+        self.users_database().delete_user(user.id())
+        self.users_database().add_user(user)
 
+    @_writer
     def del_prescription(self, user_id: int, prescription_id: int):
         '''
         Deletes prescription with given ID from the user with given ID
@@ -366,10 +1044,15 @@ class System:
         user = self.users().get(user_id)
         if not user:
             raise UserDoesNotExistError(user_id)
-        user.remove_prescription(prescription_id)
-
-        self.save_users_data()
+        with self.transaction():
+            prescription = user.prescriptions().get(prescription_id)
+            self._remove_user_prescription(user_id, prescription_id)
+            self._record(lambda: self._add_user_prescription(user_id, prescription),
+                         lambda: self._remove_user_prescription(user_id, prescription_id),
+                         'user', user_id)
+            self._user_changed(user_id)
 
+    @_writer
     def add_prescription(self, user_id: int, medicine_name: str,
                          dosage: int, weekday: int):
         '''
@@ -393,10 +1076,14 @@ class System:
                                     medicine_name=medicine_name,
                                     dosage=dosage,
                                     weekday=weekday)
-        user.add_prescription(prescription)
-
-        self.save_users_data()
+        with self.transaction():
+            self._add_user_prescription(user_id, prescription)
+            self._record(lambda: self._remove_user_prescription(user_id, prescription_id),
+                         lambda: self._add_user_prescription(user_id, prescription),
+                         'user', user_id)
+            self._user_changed(user_id)
 
+    @_writer
     def change_prescription(self, user_id: int, prescription_id: int,
                             medicine_name: str, dosage: int, weekday: int):
         '''
@@ -421,12 +1108,25 @@ class System:
         '''
         user = self.users().get(user_id)
         if not user:
-            return UserDoesNotExistError(user_id)
+            raise UserDoesNotExistError(user_id)
         new_prescription = Prescription(id=prescription_id,
                                         medicine_name=medicine_name,
                                         dosage=dosage,
                                         weekday=weekday)
-        user.remove_prescription(prescription_id)
-        user.add_prescription(new_prescription)
+        with self.transaction():
+            old_prescription = user.prescriptions().get(prescription_id)
+            self._remove_user_prescription(user_id, prescription_id)
+            self._record(lambda: self._add_user_prescription(user_id, old_prescription),
+                         lambda: self._remove_user_prescription(user_id, prescription_id),
+                         'user', user_id)
+            self._add_user_prescription(user_id, new_prescription)
+            self._record(lambda: self._remove_user_prescription(user_id, prescription_id),
+                         lambda: self._add_user_prescription(user_id, new_prescription),
+                         'user', user_id)
+            self._user_changed(user_id)
+
+    def _add_user_prescription(self, user_id: int, prescription: Prescription):
+        self.users_database().writable_user(user_id).add_prescription(prescription)
 
-        self.save_users_data()
+    def _remove_user_prescription(self, user_id: int, prescription_id: int):
+        self.users_database().writable_user(user_id).remove_prescription(prescription_id)
@@ -9,6 +9,7 @@ from .prescription import Prescription
 from medihelp.common import normalize_name
 from typing import Iterable, Optional
 from datetime import date
+import copy
 
 
 class User:
@@ -35,6 +36,10 @@ class User:
     :param _prescriptions: dictionary of prescriptions that the user is subject to,
             where keys are prescriptions's IDs and values are prescriptions
     :type _prescriptions: iterable of Prescription
+
+    :ivar _prescription_listener: Callable notified with (user_id, prescription, added)
+            whenever a prescription is added (added is True) or removed (added is False). May be None.
+    :vartype _prescription_listener: callable
     '''
 
     def __init__(self,
@@ -70,6 +75,7 @@ class User:
         if allergies:
             for e in allergies:
                 self.add_allergy(e)
+        self._prescription_listener = None
         self._prescriptions = {}
         if prescriptions:
             for e in prescriptions:
@@ -97,6 +103,20 @@ class User:
                 return False
         return True
 
+    def copy(self):
+        '''
+        Returns a copy of the user which can be modified without affecting this one.
+            Prescriptions are immutable so they are shared. The copy has no prescription listener.
+
+        :rtype: User
+        '''
+        user = copy.copy(self)
+        user._illnesses = set(self._illnesses)
+        user._allergies = set(self._allergies)
+        user._prescriptions = dict(self._prescriptions)
+        user._prescription_listener = None
+        return user
+
     def id(self):
         return self._id
 
@@ -238,6 +258,15 @@ class User:
         '''
         return self._prescriptions
 
+    def set_prescription_listener(self, listener):
+        '''
+        Sets callable notified about added and removed prescriptions. Used by UsersDatabase to keep its indexes.
+
+        :param listener: Callable taking (user_id, prescription, added) or None to remove the listener
+        :type listener: callable
+        '''
+        self._prescription_listener = listener
+
     def add_prescription(self, prescription):
         '''
         Adds prescription to the _prescriptions list
@@ -250,6 +279,8 @@ class User:
         if prescription.id() in self.prescriptions().keys():
             raise IdAlreadyInUseError
         self._prescriptions[prescription.id()] = prescription
+        if self._prescription_listener:
+            self._prescription_listener(self._id, prescription, True)
 
     def remove_prescription(self, prescription_id):
         '''
@@ -259,6 +290,8 @@ class User:
         :type prescription_id: int
         '''
         try:
-            del self._prescriptions[prescription_id]
+            prescription = self._prescriptions.pop(prescription_id)
         except Exception:
             raise NoSuchIdInUserPrescriptionsError
+        if self._prescription_listener:
+            self._prescription_listener(self._id, prescription, False)
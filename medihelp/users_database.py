@@ -1,8 +1,13 @@
 from medihelp.user import User
+from medihelp.serialization import user_to_dict
+import threading
 import json
 from medihelp.errors import (MalformedDataError,
                              IdAlreadyInUseError,
-                             NoSuchIdInTheDatabaseError)
+                             NoSuchIdInTheDatabaseError,
+                             IllegalCharactersInANameError)
+from medihelp.common import normalize_name
+from types import MappingProxyType
 from datetime import date
 from medihelp.prescription import Prescription
 
@@ -16,32 +21,244 @@ class UsersDatabase:
     ----------
     :ivar _users: Dictionary contianing instances of User.
     :vartype _users: dict[int User]
+
+    :ivar _weekday_index: Prescriptions of all users bucketed by weekday (keys from 1 to 7)
+    :vartype _weekday_index: dict[int, list[tuple[int, Prescription]]]
+
+    :ivar _medicine_index: Prescriptions of all users bucketed by medicine name
+    :vartype _medicine_index: dict[str, list[tuple[int, Prescription]]]
+
+    :ivar _name_to_id: Names of users mapped to their IDs, in the order of _users
+    :vartype _name_to_id: dict[str, int]
+
+    :ivar _version: Counter incremented whenever users are added, removed or replaced.
+            Lets views reuse data derived from the users (e.g. their names) until it changes.
+    :vartype _version: int
+
+    :ivar _prescriptions_version: Counter incremented on every change of prescriptions of any user
+    :vartype _prescriptions_version: int
+
+    :ivar _snapshot: Read-only view of _users handed out by snapshot() or None.
+        While it is set, _users is shared with the snapshot and is copied before the next change.
+    :vartype _snapshot: MappingProxyType
+
+    :ivar _records_shared: True if user objects may be referenced by a snapshot,
+        so they have to be copied before they are modified in place (see writable_user)
+    :vartype _records_shared: bool
+
+    :ivar _owned: IDs of users copied since the last snapshot, which can be modified in place
+    :vartype _owned: set[int]
+
+    :ivar _snapshot_lock: Guards _snapshot, _records_shared and _owned in snapshot(),
+        which many readers can call at the same time. Changes of the database are not made while it is read.
+    :vartype _snapshot_lock: threading.Lock
+
+    :ivar _json_cache: Serialized entries of the .json file of users that did not change since they were last written.
+        User IDs are the keys. A user without an entry is serialized again on the next save.
+    :vartype _json_cache: dict[int, str]
     '''
 
     def __init__(self):
         self._users = {}
+        self._weekday_index = {weekday: [] for weekday in range(1, 8)}
+        self._medicine_index = {}
+        self._name_to_id = {}
+        self._version = 0
+        self._prescriptions_version = 0
+        self._snapshot = None
+        self._records_shared = False
+        self._owned = set()
+        self._snapshot_lock = threading.Lock()
+        self._json_cache = {}
 
     def users(self):
         return self._users
 
+    def snapshot(self):
+        '''
+        Returns read-only dictionary of users which later changes of the database don't affect.
+            Taking a snapshot is O(1): the dictionary is shared until the next change copies it
+            and users are copied one by one when they are modified (see writable_user).
+            It can be called by many readers at once, but not during a change of the database.
+
+        :rtype: Mapping[int, User]
+        '''
+        with self._snapshot_lock:
+            self._records_shared = True
+            self._owned.clear()
+            if self._snapshot is None:
+                self._snapshot = MappingProxyType(self._users)
+            return self._snapshot
+
+    def _unshare(self):
+        '''
+        Copies the dictionary of users if it is shared with a snapshot. Called before every change.
+        '''
+        if self._snapshot is not None:
+            self._users = dict(self._users)
+            self._snapshot = None
+
+    def writable_user(self, id):
+        '''
+        Returns the user with given ID which can be modified in place without affecting snapshots.
+            A user that may be referenced by a snapshot is replaced with its copy first.
+
+        :param id: ID of the user
+        :type id: int
+
+        :rtype: User
+        '''
+        user = self._users[id]
+        # The user is about to be modified
+        self._json_cache.pop(id, None)
+        if not self._records_shared or id in self._owned:
+            return user
+        self._unshare()
+        user.set_prescription_listener(None)
+        user = user.copy()
+        user.set_prescription_listener(self._index_prescription)
+        self._users[id] = user
+        self._owned.add(id)
+        return user
+
+    def version(self):
+        return self._version
+
+    def prescriptions_version(self):
+        return self._prescriptions_version
+
+    def name_to_id(self):
+        '''
+        Returns names of users mapped to their IDs. The dictionary must not be modified.
+
+        :rtype: dict[str, int]
+        '''
+        return self._name_to_id
+
+    def id_of(self, name):
+        '''
+        Returns ID of the user with the given name or None if there is no such user
+        '''
+        return self._name_to_id.get(name)
+
+    def names_of(self, ids, default=None):
+        '''
+        Resolves names of many users at once
+
+        :param ids: IDs of users
+        :type ids: iterable of int
+
+        :param default: Value returned for IDs not present in the database
+        :type default: str
+
+        :return: Names of users in the order of ids
+        :rtype: list[str]
+        '''
+        users = self._users
+        return [users[id].name() if id in users else default for id in ids]
+
     def add_user(self, user):
         '''
         This method adds user to self._users
         '''
         if self.users().get(user.id()):
             raise IdAlreadyInUseError
+        self._unshare()
+        self._owned.discard(user.id())
+        self._json_cache.pop(user.id(), None)
         self._users[user.id()] = user
+        self._name_to_id[user.name()] = user.id()
+        self._version += 1
+        for prescription in user.prescriptions().values():
+            self._index_prescription(user.id(), prescription, True)
+        user.set_prescription_listener(self._index_prescription)
 
     def delete_user(self, id):
         if id not in self.users().keys():
             raise NoSuchIdInTheDatabaseError
-        del self._users[id]
+        self._unshare()
+        self._owned.discard(id)
+        self._json_cache.pop(id, None)
+        user = self._users.pop(id)
+        user.set_prescription_listener(None)
+        if self._name_to_id.get(user.name()) == id:
+            del self._name_to_id[user.name()]
+            # Another user may share the name
+            for other in self._users.values():
+                if other.name() == user.name():
+                    self._name_to_id[other.name()] = other.id()
+        self._version += 1
+        for prescription in user.prescriptions().values():
+            self._index_prescription(id, prescription, False)
 
     def clear(self):
         '''
         Clears database
         '''
+        for user in self._users.values():
+            user.set_prescription_listener(None)
+        if self._snapshot is not None:
+            self._users = {}
+            self._snapshot = None
         self._users.clear()
+        self._records_shared = False
+        self._owned.clear()
+        self._json_cache.clear()
+        self._name_to_id.clear()
+        self._version += 1
+        self._prescriptions_version += 1
+        for bucket in self._weekday_index.values():
+            bucket.clear()
+        self._medicine_index.clear()
+
+    def _index_prescription(self, user_id, prescription, added):
+        '''
+        Adds prescription of the user to the indexes or removes it from them
+        '''
+        self._prescriptions_version += 1
+        # Prescriptions can be changed on the user object itself, its saved entry is no longer valid
+        self._json_cache.pop(user_id, None)
+        entry = (user_id, prescription)
+        weekday_bucket = self._weekday_index[prescription.weekday()]
+        name = prescription.medicine_name()
+        if added:
+            weekday_bucket.append(entry)
+            self._medicine_index.setdefault(name, []).append(entry)
+            return
+        weekday_bucket.remove(entry)
+        medicine_bucket = self._medicine_index[name]
+        medicine_bucket.remove(entry)
+        if not medicine_bucket:
+            del self._medicine_index[name]
+
+    def prescriptions_on(self, weekday):
+        '''
+        Returns prescriptions of all users taken on the given weekday
+
+        :param weekday: Weekday (Number from 1 to 7)
+        :type weekday: int
+
+        :return: List of tuples (user ID, prescription)
+        :rtype: list[tuple[int, Prescription]]
+        '''
+        return list(self._weekday_index.get(weekday, ()))
+
+    def prescriptions_of_medicine(self, medicine_name):
+        '''
+        Returns prescriptions of all users for the medicine with the given name.
+            The name is normalized the same way as in Prescription.
+
+        :param medicine_name: Name of the medicine
+        :type medicine_name: str
+
+        :return: List of tuples (user ID, prescription)
+        :rtype: list[tuple[int, Prescription]]
+        '''
+        try:
+            medicine_name = normalize_name(str(medicine_name).title())
+        except IllegalCharactersInANameError:
+            return []
+        return list(self._medicine_index.get(medicine_name, ()))
 
     def read_from_file(self, file_handler):
         '''
@@ -54,44 +271,39 @@ class UsersDatabase:
         item_counter = 1
         for item in data:
             try:
-                id = item['id']
-                name = item['name']
-                year, month, day = map(int, item['birth_date'].split('-'))
-                birth_date = date(year, month, day)
-                illnesses = item['illnesses']
-                allergies = item['allergies']
-                prescriptions = []
-                for pres_set in item['prescriptions']:
-                    prescription = Prescription(id=pres_set['id'],
-                                                medicine_name=pres_set['medicine_name'],
-                                                dosage=pres_set['dosage'],
-                                                weekday=pres_set['weekday'])
-                    prescriptions.append(prescription)
-                self.add_user(User(id, name, birth_date, illnesses, allergies, prescriptions))
+                self.add_user(self._user_from_dict(item))
                 item_counter += 1
             except Exception:
                 raise MalformedDataError(file_handler.name, item_counter)
 
+    @staticmethod
+    def _user_from_dict(item):
+        '''
+        Creates a User object from a dictionary in the format of a .json file
+        '''
+        year, month, day = map(int, item['birth_date'].split('-'))
+        prescriptions = []
+        for pres_set in item['prescriptions']:
+            prescription = Prescription(id=pres_set['id'],
+                                        medicine_name=pres_set['medicine_name'],
+                                        dosage=pres_set['dosage'],
+                                        weekday=pres_set['weekday'])
+            prescriptions.append(prescription)
+        return User(item['id'], item['name'], date(year, month, day),
+                    item['illnesses'], item['allergies'], prescriptions)
+
     def write_to_file(self, file_handler):
         '''
         Saves informations about users into a .json file
+        Only users that changed since the last write are serialized, other entries are taken from the cache.
+            The file is the same as the one written by json.dump(list_of_users, file, indent=4).
         '''
-        data = []
-        for user in self._users.values():
-            prescriptions = []
-            for prescription in user.prescriptions().values():
-                prescriptions.append({
-                    'id': prescription.id(),
-                    'medicine_name': prescription.medicine_name(),
-                    'dosage': prescription.dosage(),
-                    'weekday': prescription.weekday(),
-                })
-            data.append({
-                'id': user.id(),
-                'name': user.name(),
-                'birth_date': str(user.birth_date()),
-                'illnesses': list(user.illnesses()),
-                'allergies': list(user.allergies()),
-                'prescriptions': prescriptions,
-            })
-        json.dump(data, file_handler, indent=4)
+        entries = []
+        for id, user in self._users.items():
+            entry = self._json_cache.get(id)
+            if entry is None:
+                # Strings are written with escaped newlines, so every newline separates lines of the entry
+                entry = '    ' + json.dumps(user_to_dict(user), indent=4).replace('\n', '\n    ')
+                self._json_cache[id] = entry
+            entries.append(entry)
+        file_handler.write('[\n' + ',\n'.join(entries) + '\n]' if entries else '[]')
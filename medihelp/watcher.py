@@ -0,0 +1,392 @@
+from .medicines_database import MedicinesDatabase
+from .users_database import UsersDatabase
+from .compression import open_data_file
+from .file_lock import locked
+from collections import namedtuple
+import threading
+import json
+import csv
+import os
+
+
+# Result of FileWatcher.check. Both fields are lists of pairs (kind, ID) where kind is 'medicine' or 'user'.
+Changes = namedtuple('Changes', ['merged', 'conflicts'])
+
+
+def _file_signature(path):
+    '''
+    :return: Tuple which changes whenever the file is modified or replaced, None if the file doesn't exist
+    :rtype: tuple
+    '''
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns)
+
+
+def medicine_hash(medicine):
+    '''
+    :return: Hash of the content of the medicine which doesn't depend on the order of elements of its sets
+    :rtype: int
+    '''
+    return hash((medicine.id(), medicine.name(), medicine.manufacturer(),
+                 frozenset(medicine.illnesses()), frozenset(medicine.recipients()),
+                 frozenset(medicine.substances()), medicine.recommended_age(),
+                 medicine.doses(), medicine.doses_left(), medicine.expiration_date(),
+                 frozenset(medicine.notes().items())))
+
+
+def user_hash(user):
+    '''
+    :return: Hash of the content of the user which doesn't depend on the order of elements of its sets
+    :rtype: int
+    '''
+    prescriptions = frozenset((prescription.id(), prescription.medicine_name(),
+                               prescription.dosage(), prescription.weekday())
+                              for prescription in user.prescriptions().values())
+    return hash((user.id(), user.name(), user.birth_date(),
+                 frozenset(user.illnesses()), frozenset(user.allergies()), prescriptions))
+
+
+class _WatchedFile:
+    '''
+    State of one data file as it was when the watcher last read it
+
+    Attributes
+    ----------
+    :ivar path: Path to the file
+    :vartype path: str
+
+    :ivar signature: Signature of the file (see _file_signature)
+    :vartype signature: tuple
+
+    :ivar rows: Pairs (hash of the raw row, hash of the content) of records, where IDs are the keys.
+        Hash of the raw row tells cheaply if the record has to be parsed again,
+        hash of the content is compared with the record in memory.
+    :vartype rows: dict[int, tuple[int, int]]
+    '''
+
+    def __init__(self):
+        self.path = None
+        self.signature = None
+        self.rows = {}
+
+
+class FileWatcher:
+    '''
+    Detects modifications of the medicines file and the users file made by other programs
+        (e.g. another instance of Medihelp or a file synchronization tool) and merges them into System.
+
+    Files are polled with os.stat, a file is read again only if its inode, size or modification time changed.
+        Records are compared by hashes: only the rows that changed since the last read are parsed.
+        Every changed record is merged in a three-way manner, where the base is the record from the last read:
+        - if the record in memory is still the base, the new version from the file replaces it,
+        - if the record in memory is equal to the new version (e.g. it was just saved by System), nothing happens,
+        - otherwise the record was changed both in memory and in the file, it is reported as a conflict
+          and the version in memory is kept (saving the database overwrites the one in the file).
+
+    Attributes
+    ----------
+    :ivar _system: System whose files are watched
+    :vartype _system: System
+
+    :ivar _medicines: State of the medicines file
+    :vartype _medicines: _WatchedFile
+
+    :ivar _users: State of the users file
+    :vartype _users: _WatchedFile
+
+    :ivar _conflicts: Conflicts found since the watcher was created, list of pairs (kind, ID)
+    :vartype _conflicts: list[tuple[str, int]]
+
+    :ivar _conflict_listeners: Functions called with the list of new conflicts
+    :vartype _conflict_listeners: list[callable]
+
+    :ivar _merge_listeners: Functions called with the list of merged records
+    :vartype _merge_listeners: list[callable]
+
+    :ivar _widget: tkinter widget whose main loop runs the checks (see attach) or None
+    :vartype _widget: tkinter.Misc
+    '''
+
+    def __init__(self, system):
+        '''
+        Reads the current state of the files of the system as the base of later merges
+
+        :param system: System whose files are watched
+        :type system: System
+        '''
+        self._system = system
+        self._medicines = _WatchedFile()
+        self._users = _WatchedFile()
+        self._conflicts = []
+        self._conflict_listeners = []
+        self._merge_listeners = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._widget = None
+        self._interval = None
+        self._after_id = None
+        self._stopped = threading.Event()
+        self.check()
+
+    def conflicts(self):
+        return list(self._conflicts)
+
+    def clear_conflicts(self):
+        self._conflicts.clear()
+
+    def add_conflict_listener(self, listener):
+        '''
+        Registers function called with the list of pairs (kind, ID) of new conflicts.
+            It is called from the thread of the watcher.
+        '''
+        self._conflict_listeners.append(listener)
+
+    def add_merge_listener(self, listener):
+        '''
+        Registers function called with the list of pairs (kind, ID) of records merged into the system.
+            It is called from the thread of the watcher.
+        '''
+        self._merge_listeners.append(listener)
+
+    def _read_medicines(self, watched):
+        '''
+        Reads the medicines file and returns the records which raw rows differ from the base.
+            The file is read under a shared lock, but a program which doesn't lock it (e.g. a file synchronization
+            tool) can still be caught writing it. Every line of the file ends with a newline, so a file which doesn't
+            is cut short: its last row is skipped and rows missing from it are not taken as removed.
+
+        :return: Pair of dictionary of pairs (raw hash, Medicine) where IDs are the keys
+            and True if the whole file was read. Records removed from the file have pair (None, None).
+        :rtype: tuple[dict[int, tuple[int, Medicine]], bool]
+        '''
+        parsed = {}
+        seen = set()
+        last_line = ''
+
+        def lines(file):
+            nonlocal last_line
+            for line in file:
+                last_line = line
+                yield line
+
+        def add(fields):
+            id = int(fields[id_column])
+            seen.add(id)
+            raw_hash = hash(tuple(fields))
+            if watched.rows.get(id, (None,))[0] != raw_hash:
+                parsed[id] = (raw_hash, MedicinesDatabase._medicine_from_row(dict(zip(fieldnames, fields))))
+
+        with locked(watched.path, False), open_data_file(watched.path, 'r') as file:
+            reader = csv.reader(lines(file))
+            fieldnames = next(reader, None) or ['id']
+            id_column = fieldnames.index('id')
+            # Every row is added once the next one was read, the last one only if the file is complete
+            previous = None
+            for fields in reader:
+                if not fields:
+                    continue
+                if previous is not None:
+                    add(previous)
+                previous = fields
+        complete = last_line.endswith('\n')
+        if complete:
+            if previous is not None:
+                add(previous)
+            for id in watched.rows.keys() - seen:
+                parsed[id] = (None, None)
+        return parsed, complete
+
+    def _read_users(self, watched):
+        '''
+        Reads the users file under a shared lock and returns the records which raw objects differ from the base.
+            A file cut short is not valid JSON, so whenever it is parsed it was read whole.
+
+        :return: Pair of dictionary of pairs (raw hash, User) where IDs are the keys and True.
+            Records removed from the file have pair (None, None).
+        :rtype: tuple[dict[int, tuple[int, User]], bool]
+        '''
+        parsed = {}
+        seen = set()
+        with locked(watched.path, False), open_data_file(watched.path, 'r') as file:
+            data = json.load(file)
+        for item in data:
+            id = item['id']
+            seen.add(id)
+            raw_hash = hash(json.dumps(item, sort_keys=True))
+            if watched.rows.get(id, (None,))[0] == raw_hash:
+                continue
+            parsed[id] = (raw_hash, UsersDatabase._user_from_dict(item))
+        for id in watched.rows.keys() - seen:
+            parsed[id] = (None, None)
+        return parsed, True
+
+    def _read_file(self, watched, path, read):
+        '''
+        Reads the file if it changed since the last check
+
+        :param read: Method reading the file (_read_medicines or _read_users)
+        :type read: callable
+
+        :return: Pair of changed records (see _read_medicines) and True if the file was not read yet,
+            None if the file didn't change
+        :rtype: tuple[dict, bool]
+        '''
+        signature = _file_signature(path)
+        if path == watched.path and signature == watched.signature:
+            return None
+        first_read = path != watched.path
+        if first_read:
+            watched.path = path
+            watched.rows = {}
+        try:
+            parsed, complete = read(watched) if signature is not None else ({}, True)
+        except Exception:
+            if first_read:
+                watched.path = None
+            raise
+        # The signature is stored only after the whole file was read successfully,
+        #   so a file caught in the middle of writing is read again on the next check
+        watched.signature = signature if complete else None
+        return parsed, first_read
+
+    def _compare(self, kind, watched, parsed, first_read, records, record_hash):
+        '''
+        Decides what to do with every changed record. A file which was not read before
+            (e.g. the system loaded another file) only becomes the base.
+            Must be called with the databases of the system locked for writing until the records are merged,
+            so a record changed in memory in the meantime is reported as a conflict instead of being overwritten.
+
+        :param records: Function returning the records in memory
+        :type records: callable
+
+        :return: Pair of dictionary of records to be merged into the system and list of conflicts
+        :rtype: tuple[dict, list[tuple[str, int]]]
+        '''
+        merged = {}
+        conflicts = []
+        local_records = records() if parsed and not first_read else {}
+        for id, (raw_hash, remote) in parsed.items():
+            remote_hash = record_hash(remote) if remote is not None else None
+            if not first_read:
+                base = watched.rows.get(id, (None, None))[1]
+                local = local_records.get(id)
+                local_hash = record_hash(local) if local is not None else None
+                if remote_hash == local_hash:
+                    pass
+                elif local_hash == base:
+                    merged[id] = remote
+                else:
+                    conflicts.append((kind, id))
+            if remote is None:
+                watched.rows.pop(id, None)
+            else:
+                watched.rows[id] = (raw_hash, remote_hash)
+        return merged, conflicts
+
+    def check(self):
+        '''
+        Checks if the files changed and merges the changes into the system.
+            Files are read without locking the databases, records in memory are then compared
+            and the changes merged in one transaction.
+
+        :return: Merged records and conflicts
+        :rtype: Changes
+        '''
+        with self._lock:
+            system = self._system
+            medicines_path = system.medicines_file_path()
+            users_path = system.users_file_path()
+            medicines_read = None
+            if medicines_path is not None:
+                medicines_read = self._read_file(self._medicines, medicines_path, self._read_medicines)
+            users_read = self._read_file(self._users, users_path, self._read_users)
+            medicines, users, conflicts = {}, {}, []
+            with system.transaction():
+                if medicines_read is not None:
+                    if system.medicines_file_path() == medicines_path:
+                        medicines, conflicts = self._compare('medicine', self._medicines, *medicines_read,
+                                                             system.medicines_snapshot, medicine_hash)
+                    else:
+                        # Another file was loaded meanwhile, it is read as a new base next time
+                        self._medicines.path = None
+                if users_read is not None:
+                    if system.users_file_path() == users_path:
+                        users, user_conflicts = self._compare('user', self._users, *users_read,
+                                                              system.users_snapshot, user_hash)
+                        conflicts += user_conflicts
+                    else:
+                        self._users.path = None
+                if medicines or users:
+                    system.merge_external_changes(medicines, users)
+            if conflicts:
+                self._conflicts += conflicts
+                for listener in self._conflict_listeners:
+                    listener(conflicts)
+            merged = [('medicine', id) for id in medicines] + [('user', id) for id in users]
+            if merged:
+                for listener in self._merge_listeners:
+                    listener(merged)
+            return Changes(merged, conflicts)
+
+    def start(self, interval: float = 1.0):
+        '''
+        Starts checking the files in a daemon thread every interval seconds.
+            Change listeners of the system and listeners of the watcher are then called from that thread,
+            so an application with a tkinter GUI uses attach instead.
+        '''
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+
+    def attach(self, widget, interval: float = 1.0):
+        '''
+        Makes the watcher check the files every interval seconds using widget.after(),
+            so merges and all listeners run in the tkinter main loop
+
+        :param widget: tkinter widget
+        :type widget: tkinter.Misc
+        '''
+        self._widget = widget
+        self._interval = interval
+        self._arm()
+
+    def detach(self):
+        if self._widget is not None and self._after_id is not None:
+            self._widget.after_cancel(self._after_id)
+        self._widget = None
+        self._after_id = None
+
+    def _arm(self):
+        if self._widget is None:
+            return
+        self._after_id = self._widget.after(int(self._interval * 1000), self._tick)
+
+    def _tick(self):
+        self._after_id = None
+        try:
+            self.check()
+        except Exception:
+            # File may be in the middle of being written, it is checked again next time
+            pass
+        self._arm()
+
+    def _run(self, interval):
+        while not self._stopped.wait(interval):
+            try:
+                self.check()
+            except Exception:
+                # File may be in the middle of being written, it is checked again next time
+                pass
+
@@ -0,0 +1,17 @@
+from medihelp.system import System
+from pytest import fixture
+
+
+@fixture(autouse=True)
+def working_directory(tmp_path, monkeypatch):
+    # Relative paths (e.g. the default data/users.json) point into the temporary directory,
+    #   so tests never write to the data of the repository or leave lock files in it
+    monkeypatch.chdir(tmp_path)
+
+
+@fixture
+def empty_system(tmp_path):
+    '''
+    System without data which saves users data into the temporary directory
+    '''
+    return System(users_file_path=str(tmp_path / 'users.json'))
@@ -0,0 +1,71 @@
+from medihelp.medicines_database import MedicinesDatabase
+from medihelp.medicine import Medicine
+from medihelp.analytics import (total_doses_left,
+                                doses_left_per_manufacturer,
+                                expired_stock_percentage,
+                                doses_left_for_users,
+                                doses_left_of_substance)
+from datetime import date
+
+
+def create_database():
+    database = MedicinesDatabase()
+    database.add_medicine(Medicine(0, name='Ivermectin', manufacturer='polfarm',
+                                   illnesses=['cold'], substances=['nicotine', 'caffeine'],
+                                   recommended_age=0, doses=10, doses_left=6,
+                                   expiration_date=date(2000, 12, 31), recipients=[0, 1]))
+    database.add_medicine(Medicine(1, name='Paracetamol', manufacturer='usdrugs',
+                                   illnesses=['cold'], substances=['paracetamolum'],
+                                   recommended_age=12, doses=5, doses_left=4,
+                                   expiration_date=date(2099, 1, 3), recipients=[0]))
+    database.add_medicine(Medicine(2, name='Apap', manufacturer='polfarm',
+                                   illnesses=['cold'], substances=['paracetamolum', 'caffeine'],
+                                   recommended_age=12, doses=10, doses_left=10,
+                                   expiration_date=date(2099, 1, 3), recipients=[2]))
+    return database
+
+
+def test_columns_built_from_database():
+    columns = create_database().columns()
+    assert len(columns) == 3
+    assert list(columns.doses_left) == [6, 4, 10]
+    assert columns.manufacturers.values() == ['Polfarm', 'Usdrugs']
+    offsets, values = columns.recipients_csr()
+    assert list(offsets) == [0, 2, 3, 4]
+    assert list(values) == [0, 1, 0, 2]
+    offsets, values = columns.substances_csr()
+    assert list(offsets) == [0, 2, 3, 5]
+    assert [columns.substances.values()[code] for code in values[3:5]] == ['caffeine', 'paracetamolum']
+
+
+def test_columns_updated_incrementally():
+    database = create_database()
+    columns = database.columns()
+    database.delete_medicine(0)
+    assert len(columns) == 2
+    assert sorted(columns.id) == [1, 2]
+    assert columns.doses_left[columns.row(2)] == 10
+    database.medicines()[2]._doses_left = 3
+    database.mark_dirty(2)
+    assert columns.doses_left[columns.row(2)] == 3
+    database.add_medicine(Medicine(5, name='Apap', manufacturer='new',
+                                   illnesses=['cold'], substances=['x'],
+                                   recommended_age=1, doses=2, doses_left=2,
+                                   expiration_date=date(2099, 1, 3), recipients=[1]))
+    assert database.columns() is columns
+    assert list(columns.recipients_csr()[1]) == [2, 0, 1]
+    database.clear()
+    assert len(database.columns()) == 0
+
+
+def test_analytics_queries():
+    columns = create_database().columns()
+    assert total_doses_left(columns) == 20
+    assert doses_left_per_manufacturer(columns) == {'Polfarm': 16, 'Usdrugs': 4}
+    assert doses_left_per_manufacturer(columns, columns.age_mask(11)) == {'Polfarm': 6}
+    assert expired_stock_percentage(columns, today=date(2026, 1, 1)) == 30.0
+    assert doses_left_for_users(columns, [1, 2]) == 16
+    assert doses_left_for_users(columns, [7]) == 0
+    assert doses_left_of_substance(columns, 'caffeine') == 10
+    assert doses_left_of_substance(columns, 'caffeine', include_expired=True) == 16
+    assert doses_left_of_substance(columns, 'unknown') == 0
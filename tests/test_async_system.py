@@ -0,0 +1,122 @@
+from medihelp.async_system import AsyncSystem
+from medihelp.errors import NoFileOpenedError, UserDoesNotExistError
+from medihelp.user import User
+from datetime import date
+from pytest import raises
+import medihelp.system
+import asyncio
+import threading
+import time
+
+
+def add_medicine(system, doses_left=6):
+    return system.add_medicine(name='Ivermectin', manufacturer='polfarm',
+                               illnesses=['Illness1'], substances=['nicoTine'],
+                               recommended_age=0, doses=10, doses_left=doses_left,
+                               expiration_date=date(2099, 12, 31), recipients=[0])
+
+
+def test_async_system_load_and_save(tmp_path):
+    path = str(tmp_path / 'medicines.csv')
+
+    async def scenario():
+        asystem = AsyncSystem()
+        with raises(NoFileOpenedError):
+            await asystem.save_medicines_database()
+        id = await asystem.add_medicine(name='Ivermectin', manufacturer='polfarm',
+                                        illnesses=['Illness1'], substances=['nicoTine'],
+                                        recommended_age=0, doses=10, doses_left=6,
+                                        expiration_date=date(2099, 12, 31), recipients=[0])
+        await asyncio.gather(asystem.save_medicines_database(path), asystem.save_medicines_database(path))
+        other = AsyncSystem()
+        await other.load_medicines_database_from(path)
+        return (await other.medicines())[id]
+
+    medicine = asyncio.run(scenario())
+    assert medicine.name() == 'Ivermectin'
+    assert medicine.doses_left() == 6
+
+
+def test_async_system_reads_do_not_wait_for_save(tmp_path, monkeypatch):
+    path = str(tmp_path / 'medicines.csv')
+    asystem = AsyncSystem()
+    asystem.system().users_database().add_user(User(0, name='Dad', birth_date=date(1982, 7, 12)))
+    id = add_medicine(asystem.system())
+    original_open = medihelp.system.open_data_file
+
+    class SlowFile:
+        def __init__(self, file):
+            self._file = file
+
+        def write(self, data):
+            time.sleep(0.3)
+            return self._file.write(data)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            self._file.close()
+
+    monkeypatch.setattr(medihelp.system, 'open_data_file', lambda path, mode: SlowFile(original_open(path, mode)))
+
+    async def scenario():
+        save = asyncio.create_task(asystem.save_medicines_database(path))
+        await asyncio.sleep(0.05)
+        start = time.perf_counter()
+        snapshot = await asystem.medicines()
+        await asystem.take_dose(id, (await asystem.users())[0])
+        elapsed = time.perf_counter() - start
+        assert not save.done()
+        await save
+        return snapshot, elapsed
+
+    snapshot, elapsed = asyncio.run(scenario())
+    assert elapsed < 0.2
+    assert snapshot[id].doses_left() == 6
+    assert asyncio.run(asystem.medicines())[id].doses_left() == 5
+    # The dose was taken after the database was serialized
+    assert not asystem.system().medicines_file_saved()
+
+
+def test_async_system_transaction_rollback():
+    asystem = AsyncSystem()
+    id = add_medicine(asystem.system())
+
+    def changes(system):
+        system.del_medicine(id)
+        system.del_prescription(user_id=5, prescription_id=0)
+
+    async def scenario():
+        with raises(UserDoesNotExistError):
+            await asystem.transaction(changes)
+
+    asyncio.run(scenario())
+    assert id in asyncio.run(asystem.medicines())
+
+
+def test_async_system_reads_do_not_block_loop():
+    asystem = AsyncSystem()
+    add_medicine(asystem.system())
+    locked = threading.Event()
+
+    def writer():
+        with asystem.system()._lock.write_lock():
+            locked.set()
+            time.sleep(0.5)
+    thread = threading.Thread(target=writer)
+    thread.start()
+    locked.wait(5)
+
+    async def scenario():
+        read = asyncio.create_task(asystem.medicines())
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        tick = time.perf_counter() - start
+        return len(await read), tick
+
+    count, tick = asyncio.run(scenario())
+    thread.join()
+    assert count == 1
+    # The event loop kept running while the snapshot waited for the writer
+    assert tick < 0.3
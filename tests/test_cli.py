@@ -0,0 +1,126 @@
+from medihelp.cli import main
+from medihelp.system import System
+from medihelp.user import User
+from medihelp.prescription import Prescription
+from datetime import date
+from pytest import fixture
+import subprocess
+import os
+import json
+import sys
+
+
+@fixture
+def data_dir(tmp_path, empty_system):
+    system = empty_system
+    system.users_database().add_user(User(0, name='Dad', birth_date=date(1982, 7, 12),
+                                          prescriptions=[Prescription(0, 'Ivermectin', 1, 3)]))
+    system.save_users_data()
+    system.add_medicine(name='Ivermectin', manufacturer='polfarm',
+                        illnesses=['Illness1'], substances=['nicoTine'],
+                        recommended_age=0, doses=10, doses_left=6,
+                        expiration_date=date(2099, 12, 31), recipients=[0])
+    system.add_medicine(name='Old', manufacturer='polfarm',
+                        illnesses=['Illness1'], substances=['cukier'],
+                        recommended_age=0, doses=10, doses_left=10,
+                        expiration_date=date(2001, 1, 1))
+    system.save_medicines_database(str(tmp_path / 'medicines.csv'))
+    return tmp_path
+
+
+def run(capsys, *arguments):
+    status = main(list(arguments))
+    out, err = capsys.readouterr()
+    return status, [json.loads(line) for line in out.splitlines()], err
+
+
+def test_cli_list_expired_and_export(data_dir, capsys):
+    status, expired, _ = run(capsys, '--data-dir', str(data_dir), 'list-expired')
+    assert status == 0
+    assert [medicine['name'] for medicine in expired] == ['Old']
+    status, medicines, _ = run(capsys, '--data-dir', str(data_dir), 'export')
+    assert [medicine['id'] for medicine in medicines] == [0, 1]
+    assert medicines[0]['substances'] == ['nicotine']
+
+
+def test_cli_take_dose(data_dir, capsys):
+    status, result, _ = run(capsys, '--data-dir', str(data_dir), 'take-dose', '0', '0')
+    assert status == 0
+    assert result[0]['doses_left'] == 5
+    system = System()
+    system.load_medicines_database_from(str(data_dir / 'medicines.csv'))
+    assert system.medicines()[0].doses_left() == 5
+
+
+def test_cli_take_dose_unknown_user(data_dir, capsys):
+    status, result, err = run(capsys, '--data-dir', str(data_dir), 'take-dose', '0', '5')
+    assert status == 1
+    assert result == []
+    assert 'error' in json.loads(err)
+
+
+def test_cli_add_prescription(data_dir, capsys):
+    status, result, _ = run(capsys, '--data-dir', str(data_dir), 'add-prescription', '0', 'old', '2', '5')
+    assert status == 0
+    assert result == [{'user_id': 0, 'id': 1, 'medicine_name': 'Old', 'dosage': 2, 'weekday': 5}]
+    system = System()
+    system.load_users_data(str(data_dir / 'users.json'))
+    assert len(system.users()[0].prescriptions()) == 2
+
+
+def test_cli_import(data_dir, capsys):
+    _, medicines, _ = run(capsys, '--data-dir', str(data_dir), 'export')
+    with open(data_dir / 'import.jsonl', 'w') as file:
+        for medicine in medicines:
+            file.write(json.dumps(medicine) + '\n')
+    status, result, _ = run(capsys, '--data-dir', str(data_dir), 'import', str(data_dir / 'import.jsonl'))
+    assert status == 0
+    assert result == [{'imported': 2}]
+    _, medicines, _ = run(capsys, '--data-dir', str(data_dir), 'export')
+    assert [medicine['name'] for medicine in medicines] == ['Ivermectin', 'Old', 'Ivermectin', 'Old']
+
+
+def test_cli_import_invalid_row(data_dir, capsys):
+    with open(data_dir / 'import.jsonl', 'w') as file:
+        file.write(json.dumps({'name': 'Fine', 'manufacturer': 'polfarm',
+                               'illnesses': ['ból'], 'substances': ['cukier'],
+                               'recommended_age': 0, 'doses': 1, 'doses_left': 1,
+                               'expiration_date': '2099-01-01'}) + '\n')
+        file.write(json.dumps({'name': 'Wrong'}) + '\n')
+    status, _, err = run(capsys, '--data-dir', str(data_dir), 'import', str(data_dir / 'import.jsonl'))
+    assert status == 1
+    assert 'row 2' in json.loads(err)['error']
+    # Nothing is imported
+    _, medicines, _ = run(capsys, '--data-dir', str(data_dir), 'export')
+    assert len(medicines) == 2
+
+
+def test_cli_validate(data_dir, capsys):
+    status, result, _ = run(capsys, '--data-dir', str(data_dir), 'validate')
+    assert status == 0
+    assert result == [{'valid': True, 'medicines': 2, 'problems': 0}]
+    with open(data_dir / 'medicines.csv', 'a') as file:
+        file.write('1,Copy,polfarm,set(),set(),set(),0,1,1,2099-01-01,{}\n')
+        file.write('x,Broken\n')
+    status, result, _ = run(capsys, '--data-dir', str(data_dir), 'validate')
+    assert status == 1
+    assert [problem['row'] for problem in result[:-1]] == [4, 5]
+    assert result[-1]['problems'] == 2
+
+
+def test_cli_report(data_dir, capsys):
+    status, result, _ = run(capsys, '--data-dir', str(data_dir), 'report', '--days', '100')
+    assert status == 0
+    assert result[0]['medicines'] == 2
+    assert result[0]['expired'] == [1]
+    assert result[0]['doses_left'] == 6
+    assert result[0]['running_low'][0]['id'] == 0
+
+
+def test_cli_does_not_import_gui(data_dir):
+    code = 'import sys; from medihelp.cli import main; main(sys.argv[1:]); ' \
+           'print(any(module.startswith(("tkinter", "customtkinter", "medihelp.gui")) for module in sys.modules))'
+    result = subprocess.run([sys.executable, '-c', code, '--data-dir', str(data_dir), 'report'],
+                            capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert result.stdout.splitlines()[-1] == 'False'
@@ -0,0 +1,65 @@
+from medihelp.compression import open_data_file, is_compressed, compression_module
+from medihelp.system import System
+from medihelp.user import User
+from datetime import date
+from pytest import mark
+import gzip
+import lzma
+import bz2
+import os
+
+
+MEDICINES_DATA = '''id,name,manufacturer,illnesses,recipients,substances,recommended_age,doses,doses_left,expiration_date,notes
+0,Ivermectin,Polfarm,{'przeziębienie'},"{0, 1}",{'caffeine'},0,10,6,2099-12-31,{}
+1,Paracetamol,Usdrugs,{'cold'},{0},{'weed'},12,5,5,2099-01-03,{}
+'''
+
+
+def test_compression_module_by_extension():
+    assert compression_module('file.csv.gz') is gzip
+    assert compression_module('file.json.XZ') is lzma
+    assert compression_module('file.csv.bz2') is bz2
+    assert compression_module('file.csv') is None
+    assert is_compressed('file.csv.gz')
+    assert not is_compressed('file.json')
+
+
+def test_compression_module_by_magic_bytes(tmp_path):
+    path = tmp_path / 'medicines.csv'
+    with gzip.open(path, 'wt', encoding='utf-8') as file:
+        file.write(MEDICINES_DATA)
+    assert compression_module(str(path)) is gzip
+    assert compression_module(str(path), 'w') is None
+    with open_data_file(str(path)) as file:
+        assert file.read() == MEDICINES_DATA
+
+
+@mark.parametrize('extension', ['.gz', '.xz', '.bz2'])
+def test_system_compressed_medicines_file(tmp_path, extension):
+    source = tmp_path / 'medicines.csv'
+    source.write_text(MEDICINES_DATA)
+    path = str(tmp_path / ('medicines.csv' + extension))
+
+    system = System()
+    system.load_medicines_database_from(str(source))
+    system.save_medicines_database(path)
+    assert os.path.getsize(path) > 0
+    with open(path, 'rb') as file:
+        assert not file.read().startswith(b'id,name')
+
+    other = System()
+    other.load_medicines_database_from(path, lazy=True)
+    assert not other.medicines_database().is_lazy()
+    assert other.medicines() == system.medicines()
+
+
+def test_system_compressed_users_file(tmp_path):
+    path = str(tmp_path / 'users.json.gz')
+    system = System(users_file_path=path)
+    system.users_database().add_user(User(0, name='Dad', birth_date=date(1982, 7, 12), illnesses=['cold']))
+    system.save_users_data()
+
+    other = System()
+    other.load_users_data(path)
+    assert other.users_file_path() == path
+    assert other.users()[0] == system.users()[0]
@@ -0,0 +1,69 @@
+from medihelp.dose_log import DoseLog, DoseEvent, RECORD
+from medihelp.system import System
+from medihelp.user import User
+from datetime import datetime, date
+import os
+
+
+def test_dose_log_append_and_scan(tmp_path):
+    path = str(tmp_path / 'doses.log')
+    log = DoseLog(path, block_size=2)
+    for day in range(1, 8):
+        log.append(user_id=day % 2, medicine_id=10 + day % 3, doses=day, time=datetime(2026, 3, day, 12))
+    assert len(log) == 7
+    assert os.path.getsize(path) == 7 * RECORD.size
+
+    events = list(log.scan(datetime(2026, 3, 3), datetime(2026, 3, 6)))
+    assert events == [DoseEvent(datetime(2026, 3, day, 12), day % 2, 10 + day % 3, day) for day in (3, 4, 5)]
+    assert len(list(log.scan())) == 7
+    assert list(log.scan(datetime(2026, 4, 1))) == []
+    log.close()
+
+    # Index is rebuilt from the file
+    log = DoseLog(path, block_size=3)
+    assert [event.doses for event in log.scan(datetime(2026, 3, 6))] == [6, 7]
+
+
+def test_dose_log_keeps_chronological_order(tmp_path):
+    log = DoseLog(str(tmp_path / 'doses.log'))
+    log.append(0, 1, time=datetime(2026, 3, 2))
+    log.append(0, 1, time=datetime(2026, 3, 1))
+    assert [event.time for event in log.scan()] == [datetime(2026, 3, 2), datetime(2026, 3, 2)]
+
+
+def test_dose_log_drops_partial_record(tmp_path):
+    path = str(tmp_path / 'doses.log')
+    log = DoseLog(path)
+    log.append(0, 1, time=datetime(2026, 3, 2))
+    log.close()
+    with open(path, 'ab') as file:
+        file.write(b'\x00\x01')
+    log = DoseLog(path)
+    assert len(log) == 1
+
+
+def test_dose_log_aggregations(tmp_path):
+    log = DoseLog(str(tmp_path / 'doses.log'), block_size=4)
+    log.append(0, 1, 1, datetime(2026, 3, 2, 8))
+    log.append(1, 1, 2, datetime(2026, 3, 3, 8))
+    log.append(0, 2, 1, datetime(2026, 3, 9, 8))
+    log.append(0, 1, 3, datetime(2026, 3, 10, 8))
+    log.append(0, 1, 1, datetime(2026, 4, 1, 8))
+    assert log.doses_per_user_per_week() == {(0, 2026, 10): 1, (1, 2026, 10): 2, (0, 2026, 11): 4, (0, 2026, 14): 1}
+    assert log.doses_per_medicine_per_month() == {(1, 2026, 3): 6, (2, 2026, 3): 1, (1, 2026, 4): 1}
+    assert log.doses_per_medicine_per_month(start=datetime(2026, 3, 5)) == {(1, 2026, 3): 3, (2, 2026, 3): 1,
+                                                                            (1, 2026, 4): 1}
+
+
+def test_system_take_dose_logged(tmp_path):
+    user = User(0, name='Dad', birth_date=date(1982, 7, 12))
+    system = System()
+    system.users_database().add_user(user)
+    system.set_dose_log(DoseLog(str(tmp_path / 'doses.log')))
+    id = system.add_medicine(name='Ivermectin', manufacturer='polfarm',
+                             illnesses=['Illness1'], substances=['nicoTine'],
+                             recommended_age=0, doses=10, doses_left=6,
+                             expiration_date=date(2099, 12, 31), recipients=[0])
+    system.take_dose(id, user)
+    events = list(system.dose_log().scan())
+    assert [(event.user_id, event.medicine_id, event.doses) for event in events] == [(0, id, 1)]
@@ -0,0 +1,133 @@
+from medihelp.feed import ChangeFeed, Follower
+from medihelp.system import System
+from medihelp.user import User
+from datetime import date
+import json
+import time
+
+
+def make_system(tmp_path):
+    system = System(users_file_path=str(tmp_path / 'users.json'))
+    system.users_database().add_user(User(0, name='Dad', birth_date=date(1982, 7, 12)))
+    return system
+
+
+def add_medicine(system, name):
+    return system.add_medicine(name=name, manufacturer='polfarm',
+                               illnesses=['Illness1'], substances=['nicoTine'],
+                               recommended_age=0, doses=10, doses_left=6,
+                               expiration_date=date(2099, 12, 31), recipients=[0])
+
+
+def assert_replica(follower, system):
+    assert follower.medicines() == system.medicines()
+    assert follower.users() == system.users()
+
+
+def test_feed_follower_applies_changes(tmp_path):
+    system = make_system(tmp_path)
+    feed = ChangeFeed(system, str(tmp_path / 'feed.jsonl'))
+    feed.write_snapshot(str(tmp_path / 'snapshot.json'))
+    follower = Follower(str(tmp_path / 'feed.jsonl'), str(tmp_path / 'snapshot.json'))
+    first = add_medicine(system, 'First')
+    second = add_medicine(system, 'Second')
+    system.set_note(first, 0, 'Note')
+    system.take_dose(second, system.users()[0])
+    system.add_prescription(0, 'First', 1, 2)
+    with system.transaction():
+        system.del_medicine(second)
+        # Takes the ID of the deleted medicine, one record describes both changes
+        add_medicine(system, 'Third')
+    assert feed.seq() == 6
+
+    assert follower.lag()[0] == 6
+    assert follower.poll() == 6
+    assert follower.seq() == 6
+    assert_replica(follower, system)
+    assert follower.users_database().prescriptions_on(2)[0][0] == 0
+    assert follower.lag()[0] == 0
+    assert follower.poll() == 0
+
+    system.undo()
+    follower.poll()
+    assert_replica(follower, system)
+
+
+def test_feed_follower_starts_from_snapshot(tmp_path):
+    system = make_system(tmp_path)
+    feed = ChangeFeed(system, str(tmp_path / 'feed.jsonl'))
+    for number in range(5):
+        add_medicine(system, f'Medicine{number}')
+    feed.write_snapshot(str(tmp_path / 'snapshot.json'))
+    system.del_medicine(0)
+    feed.close()
+
+    # Numbering continues in a reopened feed
+    feed = ChangeFeed(system, str(tmp_path / 'feed.jsonl'))
+    system.set_note(1, 0, 'Note')
+    assert feed.seq() == 7
+
+    follower = Follower(str(tmp_path / 'feed.jsonl'), str(tmp_path / 'snapshot.json'))
+    assert follower.seq() == 5
+    assert len(follower.medicines()) == 5
+    assert follower.poll() == 2
+    assert_replica(follower, system)
+
+
+def test_feed_follower_thread(tmp_path):
+    system = make_system(tmp_path)
+    feed = ChangeFeed(system, str(tmp_path / 'feed.jsonl'))
+    feed.write_snapshot(str(tmp_path / 'snapshot.json'))
+    follower = Follower(str(tmp_path / 'feed.jsonl'), str(tmp_path / 'snapshot.json'))
+    follower.follow(0.01)
+    add_medicine(system, 'First')
+    for _ in range(500):
+        if follower.seq() == 1:
+            break
+        time.sleep(0.01)
+    follower.stop()
+    behind, seconds = follower.lag()
+    assert behind == 0
+    assert 0 <= seconds < 5
+    assert_replica(follower, system)
+
+
+def test_feed_numbering_continues_after_long_record(tmp_path, monkeypatch):
+    monkeypatch.setattr('medihelp.feed._BLOCK_SIZE', 16)
+    path = str(tmp_path / 'feed.jsonl')
+    long_record = {'seq': 41, 'time': 0, 'kind': 'medicines', 'key': None, 'payload': ['x' * 1000] * 200}
+    with open(path, 'w') as file:
+        file.write(json.dumps({'seq': 40, 'time': 0, 'kind': 'user', 'key': 0, 'payload': None}) + '\n')
+        file.write(json.dumps(long_record) + '\n')
+        # Record still being written
+        file.write('{"seq": 42, "ti')
+    feed = ChangeFeed(make_system(tmp_path), path)
+    assert feed.seq() == 41
+    feed.close()
+    with open(path, 'w') as file:
+        file.write(json.dumps(long_record))
+    assert ChangeFeed(make_system(tmp_path), path).seq() == 41
+
+
+def test_feed_follower_thread_survives_errors(tmp_path):
+    system = make_system(tmp_path)
+    feed = ChangeFeed(system, str(tmp_path / 'feed.jsonl'))
+    follower = Follower(str(tmp_path / 'feed.jsonl'))
+    poll = follower.poll
+    calls = []
+
+    def failing_poll():
+        calls.append(None)
+        if len(calls) == 1:
+            raise OSError('Feed is not available')
+        return poll()
+    follower.poll = failing_poll
+    follower.follow(0.01)
+    add_medicine(system, 'First')
+    for _ in range(500):
+        if follower.seq() == 1:
+            break
+        time.sleep(0.01)
+    follower.stop()
+    assert len(calls) > 1
+    assert follower.seq() == feed.seq()
@@ -0,0 +1,118 @@
+from medihelp.file_lock import locked
+from medihelp.errors import FileLockTimeoutError, DataLoadingError
+from medihelp.system import System
+from medihelp.user import User
+from datetime import date
+from pytest import raises
+import multiprocessing
+import time
+
+
+USERS = 50
+
+
+def make_system(tmp_path):
+    system = System(users_file_path=str(tmp_path / 'users.json'))
+    for id in range(USERS):
+        system.users_database().add_user(User(id, name=f'User{id}', birth_date=date(1982, 7, 12)))
+    system.save_users_data()
+    for number in range(USERS):
+        system.add_medicine(name=f'Medicine{number}', manufacturer='polfarm',
+                            illnesses=['Illness1'], substances=['nicoTine'],
+                            recommended_age=0, doses=1000, doses_left=1000,
+                            expiration_date=date(2099, 12, 31))
+    system.save_medicines_database(str(tmp_path / 'medicines.csv'))
+    return system
+
+
+def test_file_lock_exclusive_excludes_shared(tmp_path):
+    path = str(tmp_path / 'users.json')
+    open(path, 'w').close()
+    with locked(path, True):
+        with raises(FileLockTimeoutError):
+            with locked(path, False, timeout=0.05):
+                pass
+    with locked(path, False):
+        # Many readers at once
+        with locked(path, False, timeout=0.05):
+            with raises(FileLockTimeoutError):
+                with locked(path, True, timeout=0.05):
+                    pass
+
+
+def test_file_lock_missing_file_not_locked(tmp_path):
+    path = tmp_path / 'users.json'
+    with locked(str(path), True):
+        with locked(str(path), False, timeout=0.05):
+            pass
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_file_lock_system_timeout(tmp_path):
+    make_system(tmp_path)
+    system = System(lock_timeout=0.05)
+    with locked(str(tmp_path / 'users.json'), True):
+        with raises(DataLoadingError) as error:
+            system.load_users_data(str(tmp_path / 'users.json'))
+    assert type(error.value.__cause__) is FileLockTimeoutError
+
+
+def writer(path, stop, counter):
+    system = System()
+    system.load_users_data(str(path / 'users.json'))
+    system.load_medicines_database_from(str(path / 'medicines.csv'))
+    user = system.users()[0]
+    number = 0
+    while not stop.is_set():
+        system.change_user(0, f'Name{number % 100}', user.birth_date(), [], [])
+        system.set_note(number % USERS, 0, f'Note {number}')
+        system.save_medicines_database()
+        number += 1
+    counter.value = number
+
+
+def reader(path, stop, counter, errors):
+    number = 0
+    while not stop.is_set():
+        system = System()
+        try:
+            system.load_users_data(str(path / 'users.json'))
+            system.load_medicines_database_from(str(path / 'medicines.csv'))
+            if len(system.users()) != USERS or len(system.medicines()) != USERS:
+                errors.put((len(system.users()), len(system.medicines())))
+                break
+        except Exception as e:
+            # Process can't exit before its queued items are consumed, so only the first error is sent
+            errors.put(repr(e.__cause__ or e))
+            break
+        number += 1
+    counter.value = number
+
+
+def test_file_lock_multiprocess_stress(tmp_path):
+    make_system(tmp_path)
+    context = multiprocessing.get_context('spawn')
+    stop = context.Event()
+    errors = context.Queue()
+    writes = [context.Value('i', 0) for _ in range(2)]
+    reads = [context.Value('i', 0) for _ in range(4)]
+    processes = [context.Process(target=writer, args=(tmp_path, stop, counter)) for counter in writes]
+    processes += [context.Process(target=reader, args=(tmp_path, stop, counter, errors)) for counter in reads]
+    for process in processes:
+        process.start()
+    time.sleep(2)
+    stop.set()
+    for process in processes:
+        process.join(30)
+    found = []
+    while not errors.empty():
+        found.append(errors.get())
+
+    assert found == []
+    assert all(process.exitcode == 0 for process in processes)
+    assert sum(counter.value for counter in writes) > 0
+    assert sum(counter.value for counter in reads) > 0
+    system = System()
+    system.load_users_data(str(tmp_path / 'users.json'))
+    system.load_medicines_database_from(str(tmp_path / 'medicines.csv'))
+    assert len(system.users()) == USERS
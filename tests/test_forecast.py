@@ -0,0 +1,71 @@
+from medihelp.system import System
+from medihelp.user import User
+from medihelp.prescription import Prescription
+from datetime import date, timedelta
+import builtins
+from io import StringIO
+
+
+def create_system(monkeypatch):
+    # Very important, otherwise the test will override data/users.json file !!!
+    def fake_open(path, mode, *args, **kwargs):
+        return StringIO()
+    monkeypatch.setattr(builtins, 'open', fake_open)
+
+    system = System()
+    system.users_database().add_user(User(0, name='Dad', birth_date=date(1982, 7, 12),
+                                          prescriptions=[Prescription(0, 'Apap', 2, 1),
+                                                         Prescription(1, 'Apap', 5, 3)]))
+    system.users_database().add_user(User(1, name='Mom', birth_date=date(1985, 8, 4),
+                                          prescriptions=[Prescription(0, 'Apap', 7, 2)]))
+    return system
+
+
+def add_medicine(system, name, doses_left, expiration_date=date(2099, 1, 1)):
+    return system.add_medicine(name=name, manufacturer='Polfarm', illnesses=['cold'],
+                               substances=['paracetamolum'], recommended_age=0, doses=100,
+                               doses_left=doses_left, expiration_date=expiration_date,
+                               recipients=[0, 1])
+
+
+def test_forecast_run_out_dates(monkeypatch):
+    system = create_system(monkeypatch)
+    first = add_medicine(system, 'apap', 14, date(2098, 1, 1))
+    second = add_medicine(system, 'Apap', 28)
+    expired = add_medicine(system, 'Apap', 28, date(2000, 1, 1))
+    other = add_medicine(system, 'Ibuprom', 10)
+    forecast = system.forecast()
+    today = date.today()
+    assert forecast.weekly_demand('apap') == 14
+    # 14 doses a week - 2 a day. Boxes are used in the order of expiration dates.
+    assert forecast.run_out_date(first) == today + timedelta(days=7)
+    assert forecast.run_out_date(second) == today + timedelta(days=21)
+    assert forecast.run_out_date(expired) is None
+    assert forecast.run_out_date(other) is None
+    assert forecast.running_low(10) == [(first, today + timedelta(days=7))]
+
+
+def test_forecast_updated_incrementally(monkeypatch):
+    system = create_system(monkeypatch)
+    medicine_id = add_medicine(system, 'Apap', 14)
+    forecast = system.forecast()
+    today = date.today()
+    assert forecast.run_out_date(medicine_id) == today + timedelta(days=7)
+
+    system.del_prescription(1, 0)
+    assert forecast.weekly_demand('Apap') == 7
+    assert forecast.run_out_date(medicine_id) == today + timedelta(days=14)
+
+    system.add_prescription(1, 'ibuprom', 7, 4)
+    ibuprom_id = add_medicine(system, 'Ibuprom', 3)
+    assert forecast.run_out_date(ibuprom_id) == today + timedelta(days=3)
+
+    user = system.users()[0]
+    system.take_dose(medicine_id, user)
+    assert forecast.run_out_dates()[medicine_id] == today + timedelta(days=13)
+
+    system.change_medicine(medicine_id, 'Other', 'Polfarm', ['cold'], ['x'], 0, 100, 13, date(2099, 1, 1), [0])
+    assert forecast.run_out_date(medicine_id) is None
+
+    system.del_medicine(ibuprom_id)
+    assert ibuprom_id not in forecast.run_out_dates()
@@ -604,3 +604,19 @@ def test_medicine_take_doses_non_recipient(monkeypatch):
     dad = User(0, name='Dad', birth_date=date(1980, 1, 2))
     with raises(UserIsNotARecipientWarning):
         medicine.take_doses(3, dad)
+
+
+def test_medicine_copy():
+    medicine = Medicine(id=0, name='Ivermectin', manufacturer='polfarm',
+                        illnesses=['Illness1'], substances=['nicoTine'],
+                        recommended_age=0, doses=10, doses_left=6,
+                        expiration_date=date(2099, 12, 31), recipients=[0],
+                        notes={0: 'Note'})
+    copy = medicine.copy()
+    assert copy == medicine
+    copy.set_note(0, 'Changed')
+    copy.add_recipient(1)
+    copy.restore_doses(1)
+    assert medicine.note(0) == 'Note'
+    assert medicine.recipients() == {0}
+    assert medicine.doses_left() == 6
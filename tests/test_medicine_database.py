@@ -68,6 +68,21 @@ def test_medicinesdatabase_delete_medicine_wrong_id():
         database.delete_medicine(0)
 
 
+def test_medicinesdatabase_free_id():
+    database = MedicinesDatabase()
+    for id in [0, 1, 2, 4]:
+        database.add_medicine(Medicine(id, name='Ivermectin', manufacturer='polfarm',
+                                       illnesses=['Illness1'], substances=['nicoTine'],
+                                       recommended_age=0, doses=10, doses_left=10,
+                                       expiration_date=date(2025, 12, 31), recipients=[]))
+    assert database.free_id() == 3
+    assert database.free_id() == 3
+    database.delete_medicine(1)
+    assert database.free_id() == 1
+    database.clear()
+    assert database.free_id() == 0
+
+
 def test_medicinesdatabase_write_to_file_read_from_file():
     database = MedicinesDatabase()
     date_instance1 = date(2025, 12, 31)
@@ -146,3 +161,162 @@ def test_medicinesdatabase_read_from_file_malformed_incorrect_row_empty_name():
     file_handler.name = 'file'
     with raises(MalformedDataError):
         database.read_from_file(file_handler)
+
+
+def test_medicinesdatabase_write_to_file_uses_cached_rows():
+    data = '''id,name,manufacturer,illnesses,recipients,substances,recommended_age,doses,doses_left,expiration_date,notes
+1,Paracetamol,Usdrugs,{'cold'},{0},{'weed'},12,5,5,2026-01-03,{}
+0,Ivermectin,Polfarm,{'illness1'},"{0, 1}",{'caffeine'},0,10,6,2025-12-31,{1: 'Hello'}
+'''
+    database = MedicinesDatabase()
+    database.read_from_file(StringIO(data))
+    assert not database.is_dirty(0)
+    assert not database.is_dirty(1)
+
+    # Serializing a medicine again must not be needed for unchanged rows
+    database.medicines()[0]._doses_left = 5
+    file_handler = StringIO()
+    database.write_to_file(file_handler)
+    lines = file_handler.getvalue().splitlines()
+    assert lines[1].startswith('0,Ivermectin') and ',6,2025-12-31,' in lines[1]
+    assert lines[2] == "1,Paracetamol,Usdrugs,{'cold'},{0},{'weed'},12,5,5,2026-01-03,{}"
+
+    database.mark_dirty(0)
+    assert database.is_dirty(0)
+    file_handler = StringIO()
+    database.write_to_file(file_handler)
+    assert ',5,2025-12-31,' in file_handler.getvalue().splitlines()[1]
+    assert not database.is_dirty(0)
+
+
+def test_medicinesdatabase_add_and_delete_medicine_dirty():
+    database = MedicinesDatabase()
+    medicine1 = Medicine(3, name='Ivermectin', manufacturer='polfarm',
+                         illnesses=['Illness1'], substances=['nicoTine'],
+                         recommended_age=0, doses=10, doses_left=6,
+                         expiration_date=date(2025, 12, 31), recipients=[0])
+    medicine2 = Medicine(1, name='Paracetamol', manufacturer='usdrugs',
+                         illnesses=['cold'], substances=['weed'],
+                         recommended_age=12, doses=5, doses_left=5,
+                         expiration_date=date(2026, 1, 3), recipients=[0])
+    database.add_medicine(medicine1)
+    database.add_medicine(medicine2)
+    assert database.is_dirty(3)
+    file_handler = StringIO()
+    database.write_to_file(file_handler)
+    ids = [line.split(',')[0] for line in file_handler.getvalue().splitlines()[1:]]
+    assert ids == ['1', '3']
+
+    database.delete_medicine(1)
+    file_handler = StringIO()
+    database.write_to_file(file_handler)
+    ids = [line.split(',')[0] for line in file_handler.getvalue().splitlines()[1:]]
+    assert ids == ['3']
+
+
+def test_medicinesdatabase_map_file(tmp_path):
+    path = tmp_path / 'medicines.csv'
+    path.write_text('''id,name,manufacturer,illnesses,recipients,substances,recommended_age,doses,doses_left,expiration_date,notes
+0,Ivermectin,Polfarm,"{'illness2', 'illness1'}","{0, 1, 2}","{'caffeine', 'nicotine'}",0,10,6,2025-12-31,"{1: 'Hello World1'}"
+1,Paracetamol,Usdrugs,{'cold'},{0},"{'weed', 'stuff'}",12,5,5,2026-01-03,{}
+2,Apap,Usdrugs,{'cold'},{0},{'paracetamol'},12,5,5,2026-01-03,{}
+''', encoding='utf-8')
+    database = MedicinesDatabase()
+    database.map_file(str(path), cache_size=1)
+    assert database.is_lazy()
+    assert len(database.medicines()) == 3
+    assert 1 in database.medicines().keys()
+    assert 5 not in database.medicines().keys()
+    medicine = database.medicines().get(0)
+    assert medicine.name() == 'Ivermectin'
+    assert medicine.notes() == {1: 'Hello World1'}
+    assert database.medicines().get(5) is None
+    assert not database.is_dirty(0)
+
+    # Modified medicine is pinned and survives eviction from the cache
+    medicine.set_note(2, 'Note')
+    database.mark_dirty(0)
+    database.medicines().get(1)
+    database.medicines().get(2)
+    assert database.medicines()[0] is medicine
+
+    database.delete_medicine(2)
+    file_handler = StringIO()
+    database.write_to_file(file_handler)
+    lines = file_handler.getvalue().splitlines()
+    assert len(lines) == 3
+    assert "2: 'Note'" in lines[1]
+    assert lines[2] == "1,Paracetamol,Usdrugs,{'cold'},{0},\"{'weed', 'stuff'}\",12,5,5,2026-01-03,{}"
+
+    database.clear()
+    assert not database.is_lazy()
+    assert database.medicines() == {}
+
+
+def test_medicinesdatabase_map_file_newline_in_field(tmp_path):
+    path = tmp_path / 'medicines.csv'
+    path.write_text('''id,name,manufacturer,illnesses,recipients,substances,recommended_age,doses,doses_left,expiration_date,notes
+0,Ivermectin,Polfarm,"{'illness2',
+ 'illness1'}","{0, 1, 2}","{'caffeine', 'nicotine'}",0,10,6,2025-12-31,"{1: 'Hello ""World""'}"
+1,Paracetamol,Usdrugs,{'cold'},{0},"{'weed', 'stuff'}",12,5,5,2026-01-03,{}
+''', encoding='utf-8')
+    eager = MedicinesDatabase()
+    with open(path) as file:
+        eager.read_from_file(file)
+    database = MedicinesDatabase()
+    database.map_file(str(path))
+    assert sorted(database.medicines().keys()) == [0, 1]
+    assert database.medicines()[0].illnesses() == {'illness1', 'illness2'}
+    assert database.medicines()[0].notes() == {1: 'Hello "World"'}
+    assert database.medicines() == eager.medicines()
+    assert database.medicines()[1].name() == 'Paracetamol'
+
+
+def test_medicinesdatabase_map_file_malformed(tmp_path):
+    path = tmp_path / 'medicines.csv'
+    path.write_text('''id,name,manufacturer,illnesses,recipients,substances,recommended_age,doses,doses_left,expiration_date,notes
+0,,Polfarm,{'cold'},{0},{'caffeine'},0,10,6,2025-12-31,{}
+x,Apap,Usdrugs,{'cold'},{0},{'paracetamol'},12,5,5,2026-01-03,{}
+''', encoding='utf-8')
+    database = MedicinesDatabase()
+    with raises(MalformedDataError):
+        database.map_file(str(path))
+
+
+def test_medicinesdatabase_map_file_malformed_row_on_access(tmp_path):
+    path = tmp_path / 'medicines.csv'
+    path.write_text('''id,name,manufacturer,illnesses,recipients,substances,recommended_age,doses,doses_left,expiration_date,notes
+0,,Polfarm,{'cold'},{0},{'caffeine'},0,10,6,2025-12-31,{}
+''', encoding='utf-8')
+    database = MedicinesDatabase()
+    database.map_file(str(path))
+    with raises(MalformedDataError):
+        database.medicines()[0]
+
+
+def test_medicine_database_snapshot_copy_on_write():
+    database = MedicinesDatabase()
+    for id in range(3):
+        database.add_medicine(Medicine(id=id, name='Ivermectin', manufacturer='polfarm',
+                                       illnesses=['Illness1'], substances=['nicoTine'],
+                                       recommended_age=0, doses=10, doses_left=6,
+                                       expiration_date=date(2099, 12, 31), recipients=[0]))
+    snapshot = database.snapshot()
+    # Taking a snapshot without changes in between is O(1) and returns the same object
+    assert database.snapshot() is snapshot
+    shared = database.medicines()[1]
+
+    medicine = database.writable_medicine(1)
+    assert medicine is not shared
+    assert database.writable_medicine(1) is medicine
+    medicine.restore_doses(2)
+    database.delete_medicine(0)
+    assert snapshot[1].doses_left() == 6
+    assert 0 in snapshot
+    assert database.medicines()[1].doses_left() == 8
+    assert 0 not in database.medicines()
+    # Records not modified since the snapshot are shared
+    assert database.medicines()[2] is snapshot[2]
+
+    database.clear()
+    assert len(snapshot) == 3
@@ -0,0 +1,60 @@
+from medihelp.occurrences import first_date, occurrence_count, iter_occurrences, list_occurrences, Occurrence
+from medihelp.system import System
+from medihelp.user import User
+from medihelp.prescription import Prescription
+from medihelp.errors import UserDoesNotExistError
+from datetime import date, timedelta
+from pytest import raises
+
+
+def create_users():
+    return [User(0, name='Dad', birth_date=date(1982, 7, 12),
+                 prescriptions=[Prescription(0, 'Apap', 2, 1), Prescription(1, 'Magnez', 1, 7)]),
+            User(1, name='Mom', birth_date=date(1985, 8, 4),
+                 prescriptions=[Prescription(0, 'Witamina', 1, 1)])]
+
+
+def test_first_date_and_count():
+    # 2026-10-19 is Monday
+    assert first_date(1, date(2026, 10, 19)) == date(2026, 10, 19)
+    assert first_date(7, date(2026, 10, 19)) == date(2026, 10, 25)
+    assert occurrence_count(1, date(2026, 10, 19), date(2026, 11, 2)) == 3
+    assert occurrence_count(7, date(2026, 10, 19), date(2026, 10, 24)) == 0
+    assert occurrence_count(3, date(2026, 1, 1), date(2026, 12, 31)) == 52
+
+
+def test_occurrences_over_a_month():
+    users = create_users()
+    occurrences = list_occurrences(users, date(2026, 10, 19), date(2026, 10, 31))
+    assert occurrences == [
+        Occurrence(date(2026, 10, 19), 0, 0, 'Apap', 2),
+        Occurrence(date(2026, 10, 19), 1, 0, 'Witamina', 1),
+        Occurrence(date(2026, 10, 25), 0, 1, 'Magnez', 1),
+        Occurrence(date(2026, 10, 26), 0, 0, 'Apap', 2),
+        Occurrence(date(2026, 10, 26), 1, 0, 'Witamina', 1),
+    ]
+    assert list(iter_occurrences(users, date(2026, 10, 19), date(2026, 10, 31))) == occurrences
+
+
+def test_occurrences_over_years():
+    users = create_users()
+    start = date(2026, 1, 1)
+    end = date(2028, 12, 31)
+    occurrences = list_occurrences(users, start, end)
+    assert len(occurrences) == 2 * 156 + 157
+    assert all(occurrence.date.isoweekday() == (7 if occurrence.medicine_name == 'Magnez' else 1)
+               for occurrence in occurrences)
+    assert all(start <= occurrence.date <= end for occurrence in occurrences)
+    assert next(iter_occurrences(users, start, end)) == occurrences[0]
+
+
+def test_system_occurrences():
+    system = System()
+    for user in create_users():
+        system.users_database().add_user(user)
+    occurrences = system.occurrences([1], date(2026, 10, 1), date(2026, 10, 31))
+    assert [occurrence.date for occurrence in occurrences] == [date(2026, 10, 5) + timedelta(days=7 * i)
+                                                               for i in range(4)]
+    assert len(list(system.iter_occurrences(None, date(2026, 10, 1), date(2026, 10, 31)))) == 12
+    with raises(UserDoesNotExistError):
+        system.occurrences([5], date(2026, 10, 1), date(2026, 10, 31))
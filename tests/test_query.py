@@ -0,0 +1,78 @@
+from medihelp.query import Query, field, expired
+from medihelp.system import System
+from medihelp.user import User
+from datetime import date
+from pytest import fixture, raises
+
+
+@fixture
+def system():
+    system = System()
+    for id in range(3):
+        system.users_database().add_user(User(id, name=f'User{id}', birth_date=date(1982, 7, 12)))
+    for number in range(40):
+        system.add_medicine(name=f'Medicine{number % 4}', manufacturer=f'maker{number % 2}',
+                            illnesses=['Illness1'],
+                            substances=['Paracetamolum'] if number % 10 == 0 else ['cukier', f'substance{number}'],
+                            recommended_age=number % 20, doses=10, doses_left=number % 10 + 1,
+                            expiration_date=date(2000 + number, 1, 1), recipients=[number % 3])
+    return system
+
+
+def naive(system, predicate):
+    return [medicine for medicine in system.medicines().values() if predicate.matches(medicine)]
+
+
+def test_query_uses_most_selective_index(system):
+    predicate = (~expired(date(2015, 6, 1)) & field('substances').contains('paracetamolum')
+                 & (field('recommended_age') <= 12) & field('recipients').contains(2))
+    query = Query(predicate)
+    assert query.explain(system).splitlines()[0] == \
+        "Index lookup: substances contains 'paracetamolum' (estimated 4 of 40 rows)"
+    result = query.execute(system)
+    assert [medicine.id() for medicine in result] == [20]
+    assert result == sorted(naive(system, predicate), key=lambda medicine: medicine.id())
+
+
+def test_query_range_index_sort_and_limit(system):
+    query = Query(field('expiration_date') >= date(2035, 1, 1)).where(field('manufacturer') == 'MAKER1')
+    assert 'expiration_date >= ' in query.explain(system).splitlines()[0]
+    query.order_by('doses_left', descending=True).limit(2)
+    assert [medicine.id() for medicine in query.execute(system)] == [39, 37]
+    assert query.explain(system).splitlines()[-2:] == ['Sort: doses_left descending', 'Limit: 2']
+
+
+def test_query_scan_without_index(system):
+    query = Query((field('doses_left') == 1) | ~field('recipients').contains(0))
+    assert query.explain(system).startswith('Scan all medicines (40 rows)')
+    assert query.execute(system) == sorted(naive(system, query._predicate), key=lambda medicine: medicine.id())
+    query = Query(field('recipients').contains(0) | (field('name') == 'medicine1'))
+    assert query.explain(system).startswith('Index lookup')
+    assert len(query.execute(system)) == 21
+
+
+def test_query_index_follows_changes(system):
+    query = Query(field('substances').contains('paracetamolum'))
+    assert len(query.execute(system)) == 4
+    system.del_medicine(0)
+    system.change_medicine(1, name='New', manufacturer='maker', illnesses=['Illness1'],
+                           substances=['paracetamolum'], recommended_age=0, doses=10, doses_left=10,
+                           expiration_date=date(2099, 1, 1), recipients=[])
+    assert [medicine.id() for medicine in query.execute(system)] == [1, 10, 20, 30]
+    system.undo()
+    assert [medicine.id() for medicine in query.execute(system)] == [10, 20, 30]
+
+
+def test_query_unknown_field():
+    with raises(ValueError):
+        field('colour')
+    with raises(ValueError):
+        field('name').contains('x')
+
+
+def test_query_combines_comparisons_of_one_field(system):
+    query = Query(~expired(date(2010, 6, 1)) & (field('expiration_date') < date(2013, 1, 1)))
+    assert query.explain(system).splitlines()[0] == \
+        "Index lookup: expiration_date >= datetime.date(2010, 6, 1) AND " \
+        "expiration_date < datetime.date(2013, 1, 1) (estimated 2 of 40 rows)"
+    assert [medicine.id() for medicine in query.execute(system)] == [11, 12]
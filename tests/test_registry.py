@@ -0,0 +1,133 @@
+from medihelp.registry import SystemRegistry
+from medihelp.system import System
+from medihelp.user import User
+from datetime import date
+from pytest import fixture, raises
+from medihelp.errors import DataLoadingError, SystemClosedError
+import threading
+import shutil
+import time
+
+
+def make_household(path):
+    path.mkdir()
+    system = System(users_file_path=str(path / 'users.json'))
+    system.users_database().add_user(User(0, name='Dad', birth_date=date(1982, 7, 12)))
+    system.save_users_data()
+    system.add_medicine(name='Ivermectin', manufacturer='polfarm',
+                        illnesses=['Illness1'], substances=['nicoTine'],
+                        recommended_age=0, doses=10, doses_left=6,
+                        expiration_date=date(2099, 12, 31))
+    system.save_medicines_database(str(path / 'medicines.csv'))
+    return path
+
+
+@fixture
+def households(tmp_path):
+    return [make_household(tmp_path / f'household{i}') for i in range(3)]
+
+
+def test_registry_loads_lazily_once(households):
+    registry = SystemRegistry()
+    assert len(registry) == 0
+    system = registry.get(households[0])
+    assert registry.get(str(households[0]) + '/') is system
+    assert len(registry) == 1
+    assert system.medicines()[0].name() == 'Ivermectin'
+
+
+def test_registry_shares_vocabulary(households):
+    registry = SystemRegistry()
+    first = registry.get(households[0]).medicines()[0]
+    second = registry.get(households[1]).medicines()[0]
+    assert first is not second
+    assert next(iter(first.substances())) is next(iter(second.substances()))
+    assert first.manufacturer() is second.manufacturer()
+
+
+def test_registry_evicts_least_recently_used_and_saves(households):
+    registry = SystemRegistry(max_systems=2)
+    system = registry.get(households[0])
+    registry.get(households[1])
+    system.set_note(0, 0, 'Unsaved')
+    registry.get(households[0])
+    registry.get(households[2])
+    assert households[1] not in registry
+    registry.get(households[1])
+    assert households[0] not in registry
+    # Unsaved note was saved on eviction
+    assert registry.get(households[0]).medicines()[0].note(0) == 'Unsaved'
+
+
+def test_registry_evict_idle(households):
+    registry = SystemRegistry()
+    registry.get(households[0])
+    registry.get(households[1])
+    time.sleep(0.05)
+    registry.get(households[0])
+    assert registry.evict_idle(0.04) == [str(households[1])]
+    assert registry.data_dirs() == [str(households[0])]
+    registry.close()
+    assert len(registry) == 0
+
+
+def test_registry_missing_household(tmp_path):
+    registry = SystemRegistry()
+    with raises(DataLoadingError):
+        registry.get(tmp_path / 'nothing')
+    assert len(registry) == 0
+
+
+def test_registry_evicted_system_rejects_changes(households):
+    registry = SystemRegistry()
+    system = registry.get(households[0])
+    system.set_note(0, 0, 'Saved')
+    registry.evict(households[0])
+    with raises(SystemClosedError):
+        system.set_note(0, 0, 'Lost')
+    # Data can still be read
+    assert system.medicines()[0].note(0) == 'Saved'
+    assert registry.get(households[0]).medicines()[0].note(0) == 'Saved'
+
+
+def test_registry_failed_eviction_keeps_both(households):
+    registry = SystemRegistry(max_systems=1)
+    system = registry.get(households[0])
+    system.set_note(0, 0, 'Unsaved')
+    # Medicines file can't be written anymore
+    (households[0] / 'medicines.csv').unlink()
+    (households[0] / 'medicines.csv').mkdir()
+    second = registry.get(households[1])
+    assert registry.data_dirs() == [str(households[0]), str(households[1])]
+    assert not system.closed()
+    system.set_note(0, 0, 'Still open')
+    shutil.rmtree(households[0] / 'medicines.csv')
+    assert registry.get(households[2]) is not second
+    assert registry.data_dirs() == [str(households[2])]
+    assert system.closed()
+
+
+def test_registry_slow_household_does_not_block_others(households, monkeypatch):
+    registry = SystemRegistry()
+    load = registry._load
+    loading = threading.Event()
+    release = threading.Event()
+
+    def slow_load(key):
+        if key == str(households[0]):
+            loading.set()
+            release.wait(5)
+        return load(key)
+    monkeypatch.setattr(registry, '_load', slow_load)
+    results = []
+    thread = threading.Thread(target=lambda: results.append(registry.get(households[0])))
+    thread.start()
+    loading.wait(5)
+    try:
+        assert registry.get(households[1]).medicines()[0].name() == 'Ivermectin'
+        assert registry.data_dirs() == [str(households[1])]
+    finally:
+        release.set()
+        thread.join()
+    assert registry.get(households[0]) is results[0]
+    assert registry._tenant_locks == {}
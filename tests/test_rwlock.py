@@ -0,0 +1,169 @@
+from medihelp.rwlock import RWLock
+from medihelp.system import System
+from medihelp.user import User
+from datetime import date
+from pytest import raises
+import threading
+import time
+
+
+def test_rwlock_many_readers():
+    lock = RWLock()
+    inside = []
+    barrier = threading.Barrier(3)
+
+    def reader():
+        with lock.read_lock():
+            inside.append(1)
+            # All readers have to be inside at the same time to pass the barrier
+            barrier.wait(timeout=5)
+
+    threads = [threading.Thread(target=reader) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(inside) == 3
+
+
+def test_rwlock_writer_excludes_readers():
+    lock = RWLock()
+    events = []
+    lock.acquire_write()
+
+    def reader():
+        with lock.read_lock():
+            events.append('read')
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    time.sleep(0.05)
+    events.append('write')
+    lock.release_write()
+    thread.join()
+    assert events == ['write', 'read']
+
+
+def test_rwlock_reentrant():
+    lock = RWLock()
+    with lock.write_lock():
+        with lock.write_lock():
+            with lock.read_lock():
+                assert lock.is_writer()
+        assert lock.is_writer()
+    assert not lock.is_writer()
+    with lock.read_lock():
+        with lock.read_lock():
+            with raises(RuntimeError):
+                lock.acquire_write()
+    with raises(RuntimeError):
+        lock.release_read()
+
+
+def test_rwlock_system_stress(record_property):
+    system = System()
+    system.users_database().add_user(User(0, name='Dad', birth_date=date(1982, 7, 12)))
+    count = 20
+    for number in range(count):
+        system.add_medicine(name='Ivermectin', manufacturer='polfarm',
+                            illnesses=['Illness1'], substances=['nicoTine'],
+                            recommended_age=0, doses=1000, doses_left=1000,
+                            expiration_date=date(2099, 12, 31), recipients=[0])
+    user = system.users()[0]
+    stop = threading.Event()
+    errors = []
+    reads = []
+    writes = []
+
+    def reader():
+        done = 0
+        while not stop.is_set():
+            with system.read_lock():
+                medicines = system.medicines()
+                # Writers keep the number of medicines and the total number of doses constant
+                if len(medicines) != count:
+                    errors.append(len(medicines))
+                if sum(medicine.doses_left() for medicine in medicines.values()) != count * 1000:
+                    errors.append('doses')
+            snapshot = system.medicines_snapshot()
+            if any(id != medicine.id() for id, medicine in snapshot.items()):
+                errors.append('snapshot')
+            done += 1
+        reads.append(done)
+
+    def writer():
+        done = 0
+        while not stop.is_set():
+            with system.transaction():
+                ids = sorted(system.medicines().keys())
+                old_id = ids[done % len(ids)]
+                system.del_medicine(old_id)
+                system.add_medicine(name='Ivermectin', manufacturer='polfarm',
+                                    illnesses=['Illness1'], substances=['nicoTine'],
+                                    recommended_age=0, doses=1000, doses_left=1000,
+                                    expiration_date=date(2099, 12, 31), recipients=[0])
+                first, second = ids[0], ids[-1]
+                system.take_dose(first, user)
+                system.medicines_database().writable_medicine(second).restore_doses(1)
+            with system.transaction():
+                system.medicines_database().writable_medicine(second).take_doses(1, user)
+                system.medicines_database().writable_medicine(first).restore_doses(1)
+            done += 1
+        writes.append(done)
+
+    threads = [threading.Thread(target=reader) for _ in range(8)]
+    threads += [threading.Thread(target=writer) for _ in range(2)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(0.5)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    # Throughput is reported in the JUnit XML report (pytest --junitxml) instead of the output
+    record_property('reads_per_second', round(sum(reads) / elapsed))
+    record_property('writes_per_second', round(sum(writes) / elapsed))
+
+    assert errors == []
+    assert len(reads) == 8 and len(writes) == 2
+    # Neither readers nor writers were starved
+    assert all(count > 0 for count in reads)
+    assert all(count > 0 for count in writes)
+
+
+def test_rwlock_system_snapshot_not_affected_by_writes():
+    system = System()
+    id = system.add_medicine(name='Ivermectin', manufacturer='polfarm',
+                             illnesses=['Illness1'], substances=['nicoTine'],
+                             recommended_age=0, doses=10, doses_left=10,
+                             expiration_date=date(2099, 12, 31))
+    snapshot = system.medicines_snapshot()
+    system.del_medicine(id)
+    assert id in snapshot
+    with raises(TypeError):
+        snapshot[5] = None
+
+
+def test_rwlock_system_snapshot_inside_read_lock():
+    system = System()
+    system.add_medicine(name='Ivermectin', manufacturer='polfarm',
+                        illnesses=['Illness1'], substances=['nicoTine'],
+                        recommended_age=0, doses=10, doses_left=10,
+                        expiration_date=date(2099, 12, 31))
+    held = threading.Event()
+    release = threading.Event()
+
+    def reader():
+        with system.read_lock():
+            held.set()
+            release.wait(5)
+    thread = threading.Thread(target=reader)
+    thread.start()
+    held.wait(5)
+    # Another reader holds the lock, taking snapshots doesn't wait for it
+    with system.read_lock():
+        assert len(system.medicines_snapshot()) == 1
+        assert len(system.users_snapshot()) == 0
+    release.set()
+    thread.join()
@@ -0,0 +1,105 @@
+from medihelp.scheduler import ReminderScheduler, Reminder, next_occurrence
+from medihelp.system import System
+from medihelp.user import User
+from medihelp.prescription import Prescription
+from datetime import date, datetime, time
+import builtins
+from io import StringIO
+
+
+# Monday
+NOW = datetime(2026, 10, 19, 9, 0)
+
+
+def create_system(monkeypatch):
+    # Very important, otherwise the test will override data/users.json file !!!
+    def fake_open(path, mode, *args, **kwargs):
+        return StringIO()
+    monkeypatch.setattr(builtins, 'open', fake_open)
+
+    system = System()
+    system.users_database().add_user(User(0, name='Dad', birth_date=date(1982, 7, 12),
+                                          prescriptions=[Prescription(0, 'Apap', 2, 1),
+                                                         Prescription(1, 'Magnez', 1, 3)]))
+    system.users_database().add_user(User(1, name='Mom', birth_date=date(1985, 8, 4),
+                                          prescriptions=[Prescription(0, 'Witamina', 1, 2)]))
+    return system
+
+
+def test_next_occurrence():
+    assert next_occurrence(1, time(8), NOW) == datetime(2026, 10, 26, 8)
+    assert next_occurrence(1, time(10), NOW) == datetime(2026, 10, 19, 10)
+    assert next_occurrence(7, time(8), NOW) == datetime(2026, 10, 25, 8)
+
+
+def test_scheduler_next_due(monkeypatch):
+    system = create_system(monkeypatch)
+    scheduler = ReminderScheduler(system, time(8), clock=lambda: NOW)
+    assert scheduler.next_due(3) == [Reminder(datetime(2026, 10, 20, 8), 1, 0, 'Witamina', 1),
+                                     Reminder(datetime(2026, 10, 21, 8), 0, 1, 'Magnez', 1),
+                                     Reminder(datetime(2026, 10, 26, 8), 0, 0, 'Apap', 2)]
+    assert len(scheduler.next_due(10)) == 3
+    assert len(scheduler.next_due(3)) == 3
+
+
+def test_scheduler_pop_due_reschedules(monkeypatch):
+    system = create_system(monkeypatch)
+    scheduler = ReminderScheduler(system, time(8), clock=lambda: NOW)
+    fired = []
+    scheduler.add_callback(fired.append)
+    assert scheduler.pop_due(datetime(2026, 10, 20, 7)) == []
+    due = scheduler.pop_due(datetime(2026, 10, 21, 8))
+    assert [(reminder.user_id, reminder.prescription_id) for reminder in due] == [(1, 0), (0, 1)]
+    assert fired == due
+    assert scheduler.next_due(1)[0].time == datetime(2026, 10, 26, 8)
+    assert scheduler.next_due(3)[2] == Reminder(datetime(2026, 10, 28, 8), 0, 1, 'Magnez', 1)
+
+
+def test_scheduler_pop_due_after_missed_weeks(monkeypatch):
+    system = create_system(monkeypatch)
+    scheduler = ReminderScheduler(system, time(8), clock=lambda: NOW)
+    # Computer was asleep for almost four weeks, every prescription is reminded of once
+    due = scheduler.pop_due(datetime(2026, 11, 15, 12))
+    assert sorted((reminder.user_id, reminder.prescription_id) for reminder in due) == [(0, 0), (0, 1), (1, 0)]
+    assert scheduler.pop_due(datetime(2026, 11, 15, 12)) == []
+    assert scheduler.next_due(1)[0].time == datetime(2026, 11, 16, 8)
+
+
+def test_scheduler_follows_prescription_changes(monkeypatch):
+    system = create_system(monkeypatch)
+    scheduler = ReminderScheduler(system, time(8), clock=lambda: NOW)
+    system.change_prescription(1, 0, 'Witamina', 1, 5)
+    system.add_prescription(0, 'Nowy', 3, 1)
+    system.del_prescription(0, 1)
+    assert scheduler.next_due(5) == [Reminder(datetime(2026, 10, 23, 8), 1, 0, 'Witamina', 1),
+                                     Reminder(datetime(2026, 10, 26, 8), 0, 0, 'Apap', 2),
+                                     Reminder(datetime(2026, 10, 26, 8), 0, 2, 'Nowy', 3)]
+
+
+class FakeWidget:
+    def __init__(self):
+        self.timers = {}
+
+    def after(self, ms, function):
+        self.timers[len(self.timers)] = (ms, function)
+        return len(self.timers) - 1
+
+    def after_cancel(self, after_id):
+        del self.timers[after_id]
+
+
+def test_scheduler_attach(monkeypatch):
+    system = create_system(monkeypatch)
+    scheduler = ReminderScheduler(system, time(8), clock=lambda: datetime(2026, 10, 20, 7, 59))
+    widget = FakeWidget()
+    scheduler.attach(widget)
+    assert list(widget.timers.values())[0][0] == 60 * 1000
+    system.del_prescription(1, 0)
+    assert len(widget.timers) == 1
+    assert list(widget.timers.values())[0][0] == 3600 * 1000
+
+
+def test_system_scheduler(monkeypatch):
+    system = create_system(monkeypatch)
+    assert system.scheduler() is system.scheduler()
+    assert len(system.scheduler().next_due(5)) == 3
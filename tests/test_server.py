@@ -0,0 +1,100 @@
+from medihelp.server import MedihelpServer
+from medihelp.user import User
+from medihelp.prescription import Prescription
+from datetime import date
+from pytest import fixture
+import http.client
+import threading
+import json
+
+
+@fixture
+def server(empty_system):
+    system = empty_system
+    system.users_database().add_user(User(0, name='Dad', birth_date=date(1982, 7, 12),
+                                          prescriptions=[Prescription(0, 'Ivermectin', 1, 3)]))
+    system.add_medicine(name='Ivermectin', manufacturer='polfarm',
+                        illnesses=['Illness1'], substances=['nicoTine'],
+                        recommended_age=0, doses=10, doses_left=6,
+                        expiration_date=date(2099, 12, 31), recipients=[0])
+    server = MedihelpServer(('127.0.0.1', 0), system)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def request(connection, method, path, body=None):
+    data = json.dumps(body) if body is not None else None
+    connection.request(method, path, body=data)
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def test_server_medicines(server):
+    # All requests are sent over one persistent connection
+    connection = http.client.HTTPConnection(*server.server_address)
+    status, medicines = request(connection, 'GET', '/medicines')
+    assert status == 200
+    assert [medicine['name'] for medicine in medicines] == ['Ivermectin']
+
+    status, result = request(connection, 'POST', '/medicines', {
+        'name': 'Apap', 'manufacturer': 'usp', 'illnesses': ['ból'], 'substances': ['paracetamol'],
+        'recommended_age': 12, 'doses': 10, 'doses_left': 10, 'expiration_date': '2099-01-01',
+        'recipients': [0]})
+    assert status == 200
+    id = result['id']
+
+    status, medicine = request(connection, 'POST', f'/medicines/{id}/take_dose', {'user_id': 0})
+    assert status == 200
+    assert medicine['doses_left'] == 9
+
+    status, medicine = request(connection, 'PUT', f'/medicines/{id}/notes/0', {'content': 'Dobre'})
+    assert medicine['notes'] == {'0': 'Dobre'}
+    status, medicine = request(connection, 'DELETE', f'/medicines/{id}/notes/0')
+    assert medicine['notes'] == {}
+
+    status, result = request(connection, 'DELETE', f'/medicines/{id}')
+    assert status == 200
+    status, result = request(connection, 'GET', f'/medicines/{id}')
+    assert status == 404
+    assert 'error' in result
+    connection.close()
+
+
+def test_server_users_and_errors(server):
+    connection = http.client.HTTPConnection(*server.server_address)
+    status, user = request(connection, 'POST', '/users/0/prescriptions',
+                           {'medicine_name': 'Apap', 'dosage': 2, 'weekday': 5})
+    assert status == 200
+    assert len(user['prescriptions']) == 2
+    status, user = request(connection, 'PUT', '/users/0/prescriptions/1',
+                           {'medicine_name': 'Apap', 'dosage': 1, 'weekday': 6})
+    assert user['prescriptions'][1]['weekday'] == 6
+    status, user = request(connection, 'DELETE', '/users/0/prescriptions/1')
+    assert len(user['prescriptions']) == 1
+    status, users = request(connection, 'GET', '/users')
+    assert [user['name'] for user in users] == ['Dad']
+
+    assert request(connection, 'POST', '/users/0/prescriptions', {'dosage': 2})[0] == 400
+    assert request(connection, 'POST', '/users/0/prescriptions',
+                   {'medicine_name': 'Apap', 'dosage': 2, 'weekday': 9})[0] == 400
+    assert request(connection, 'GET', '/users/7')[0] == 404
+    assert request(connection, 'GET', '/nothing')[0] == 404
+    assert request(connection, 'DELETE', '/users')[0] == 405
+    assert request(connection, 'POST', '/save')[0] == 400
+    connection.close()
+
+
+def test_server_invalid_content_length_closes_connection(server):
+    for length in ['abc', '-5']:
+        connection = http.client.HTTPConnection(*server.server_address)
+        connection.putrequest('POST', '/medicines')
+        connection.putheader('Content-Length', length)
+        connection.endheaders(b'{}')
+        response = connection.getresponse()
+        assert response.status == 400
+        assert json.loads(response.read()) == {'error': 'Invalid Content-Length'}
+        assert response.getheader('Connection') == 'close'
+        connection.close()
@@ -0,0 +1,190 @@
+from medihelp.sync import MerkleTree, RemoteTree, diff, serve, sync, sync_files, merge_medicine
+from medihelp.system import System
+from medihelp.medicine import Medicine
+from medihelp.user import User
+from datetime import date
+from multiprocessing import Pipe
+from pytest import fixture
+import threading
+
+
+def make_medicine(id, doses_left=10, notes=None, manufacturer='polfarm'):
+    return Medicine(id, name=f'Medicine{id}', manufacturer=manufacturer,
+                    illnesses=['Illness1'], substances=['nicoTine'],
+                    recommended_age=0, doses=10, doses_left=doses_left,
+                    expiration_date=date(2099, 12, 31), recipients=[0], notes=notes)
+
+
+def make_system(count):
+    system = System()
+    for id in range(2):
+        system.users_database().add_user(User(id, name=f'User{id}', birth_date=date(1982, 7, 12)))
+    for id in range(count):
+        system.medicines_database().add_medicine(make_medicine(id))
+    return system
+
+
+class CountingConnection:
+    def __init__(self, connection):
+        self.connection = connection
+        self.requests = 0
+
+    def send(self, request):
+        self.requests += 1
+        self.connection.send(request)
+
+    def recv(self):
+        return self.connection.recv()
+
+
+@fixture
+def remote_of():
+    threads = []
+    remotes = []
+
+    def connect(system):
+        local_end, remote_end = Pipe()
+        thread = threading.Thread(target=serve, args=(remote_end, system))
+        thread.start()
+        threads.append(thread)
+        remote = RemoteTree(CountingConnection(local_end))
+        remotes.append(remote)
+        return remote
+    yield connect
+    for remote in remotes:
+        remote.close()
+    for thread in threads:
+        thread.join()
+
+
+def test_merkle_tree_diff():
+    first = MerkleTree([make_medicine(id) for id in range(1000)], depth=6)
+    second = MerkleTree([make_medicine(id) for id in range(1000)], depth=6)
+    assert first.root() == second.root()
+    assert diff(first, second) == []
+    second.update(17, make_medicine(17, doses_left=3))
+    second.update(500, None)
+    second.update(1000, make_medicine(1000))
+    assert first.root() != second.root()
+    assert diff(first, second) == [17, 500, 1000]
+    first.update(17, make_medicine(17, doses_left=3))
+    first.update(500, None)
+    first.update(1000, make_medicine(1000))
+    assert first.root() == second.root()
+
+
+def test_merkle_tree_for_system_follows_changes():
+    system = make_system(10)
+    tree = MerkleTree.for_system(system)
+    system.set_note(3, 0, 'Note')
+    system.del_medicine(4)
+    assert tree.root() == MerkleTree(system.medicines().values()).root()
+
+
+def test_merge_medicine_three_way():
+    base = make_medicine(0, doses_left=10, notes={0: 'Base', 1: 'Base'})
+    local = make_medicine(0, doses_left=8, notes={0: 'Local', 1: 'Base', 2: 'New'})
+    remote = make_medicine(0, doses_left=7, notes={1: 'Remote'}, manufacturer='other')
+    merged, conflicts = merge_medicine(base, local, remote)
+    assert merged.doses_left() == 5
+    assert merged.notes() == {0: 'Local', 1: 'Remote', 2: 'New'}
+    assert merged.manufacturer() == 'Other'
+    # Note 0 was changed locally and deleted remotely
+    assert conflicts == ['notes[0]']
+
+
+def test_merge_medicine_without_base():
+    # Two different medicines added under the same ID are not merged
+    merged, conflicts = merge_medicine(None, make_medicine(0, doses_left=8), make_medicine(0, doses_left=7))
+    assert merged == make_medicine(0, doses_left=8)
+    assert conflicts == ['id']
+    assert merge_medicine(None, make_medicine(0), make_medicine(0)) == (make_medicine(0), [])
+    assert merge_medicine(None, None, make_medicine(1))[0] == make_medicine(1)
+    assert merge_medicine(make_medicine(1), None, make_medicine(1)) == (None, [])
+
+
+def test_sync_two_systems(remote_of):
+    first = make_system(2000)
+    second = make_system(2000)
+    base = first.medicines_snapshot()
+    first.set_note(10, 0, 'First')
+    first.del_medicine(20)
+    second.set_note(10, 1, 'Second')
+    second.set_note(1500, 1, 'Second')
+
+    remote = remote_of(second)
+    result = sync(first, remote, base)
+    assert result.changed == [10, 1500]
+    assert result.conflicts == {}
+    # Only the differing branches of the tree were requested
+    assert remote._connection.requests < 20
+    assert not first.medicines_file_saved()
+
+    result = sync(second, remote_of(first), result.base)
+    assert result.changed == [10, 20]
+    assert MerkleTree(first.medicines().values()).root() == MerkleTree(second.medicines().values()).root()
+    assert first.medicines()[10].notes() == {0: 'First', 1: 'Second'}
+
+
+def test_sync_doses_taken_at_both_sites(remote_of):
+    first = make_system(100)
+    second = make_system(100)
+    base = first.medicines_snapshot()
+    for _ in range(2):
+        first.take_dose(5, first.users()[0])
+    for _ in range(3):
+        second.take_dose(5, second.users()[0])
+
+    result = sync(first, remote_of(second), base)
+    assert first.medicines()[5].doses_left() == 5
+    result = sync(second, remote_of(first), result.base)
+    assert result.changed == [5]
+    assert second.medicines()[5].doses_left() == 5
+    assert sync(first, remote_of(second), first.medicines_snapshot()).changed == []
+
+
+def test_sync_medicines_added_at_both_sites(remote_of):
+    first = make_system(3)
+    second = make_system(3)
+    base = first.medicines_snapshot()
+    first.add_medicine(name='Apap', manufacturer='polfarm', illnesses=['cold'], substances=['paracetamolum'],
+                       recommended_age=0, doses=10, doses_left=10, expiration_date=date(2099, 12, 31))
+    second.add_medicine(name='Ibuprom', manufacturer='usp', illnesses=['cold'], substances=['ibuprofenum'],
+                        recommended_age=0, doses=20, doses_left=20, expiration_date=date(2098, 1, 1))
+    assert first.medicines()[3].name() == 'Apap' and second.medicines()[3].name() == 'Ibuprom'
+
+    result = sync(first, remote_of(second), base)
+    assert result.conflicts == {3: ['id']}
+    assert result.changed == [4]
+    assert first.medicines()[3].name() == 'Apap'
+    assert first.medicines()[4].name() == 'Ibuprom'
+    assert first.medicines()[4].doses_left() == 20
+
+    sync(second, remote_of(first), result.base)
+    assert MerkleTree(first.medicines().values()).root() == MerkleTree(second.medicines().values()).root()
+    assert [second.medicines()[id].name() for id in (3, 4)] == ['Apap', 'Ibuprom']
+
+
+def test_sync_files(tmp_path):
+    first = make_system(50)
+    first.save_medicines_database(str(tmp_path / 'first.csv'))
+    first.save_medicines_database(str(tmp_path / 'second.csv'))
+    base = first.medicines_snapshot()
+    first.take_dose(1, first.users()[0])
+    first.save_medicines_database(str(tmp_path / 'first.csv'))
+    second = System()
+    second.users_database().add_user(User(0, name='User0', birth_date=date(1982, 7, 12)))
+    second.load_medicines_database_from(str(tmp_path / 'second.csv'))
+    second.take_dose(1, second.users()[0])
+    second.take_dose(1, second.users()[0])
+    second.del_medicine(2)
+    second.save_medicines_database()
+
+    first_result, second_result = sync_files(str(tmp_path / 'first.csv'), str(tmp_path / 'second.csv'), base)
+    assert first_result.changed == [1, 2]
+    assert second_result.changed == [1]
+    for name in ['first.csv', 'second.csv']:
+        system = System()
+        system.load_medicines_database_from(str(tmp_path / name))
+        assert system.medicines()[1].doses_left() == 7
+        assert 2 not in system.medicines()
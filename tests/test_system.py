@@ -4,12 +4,15 @@ from medihelp.prescription import Prescription
 from medihelp.users_database import UsersDatabase
 from medihelp.user import User
 from medihelp.errors import (DataLoadingError,
+                             DataSavingError,
                              NoFileOpenedError,
                              MedicineDoesNotExistError,
-                             UserDoesNotExistError)
+                             UserDoesNotExistError,
+                             TransactionInProgressError)
 from datetime import date
 from pytest import raises
 from io import StringIO
+import medihelp.system
 import builtins
 
 
@@ -188,6 +191,18 @@ def test_system_load_users_data_error(monkeypatch):
         system.load_users_data()
 
 
+def test_system_load_users_data_error_keeps_path(empty_system, tmp_path):
+    system = empty_system
+    system.users_database().add_user(User(0, name='Dad', birth_date=date(1982, 7, 12)))
+    system.save_users_data()
+    (tmp_path / 'other.json').write_text('Malformed data')
+    with raises(DataLoadingError):
+        system.load_users_data(str(tmp_path / 'other.json'))
+    assert system.users_file_path() == str(tmp_path / 'users.json')
+    system.save_users_data()
+    assert (tmp_path / 'other.json').read_text() == 'Malformed data'
+
+
 def test_system_medicines_database_loaded(monkeypatch):
     # Create fake file
     data = '''id,name,manufacturer,illnesses,recipients,substances,recommended_age,doses,doses_left,expiration_date,notes
@@ -311,6 +326,50 @@ def test_system_save_medicines_database_2(monkeypatch):
     assert system.medicines_file_saved() is True
 
 
+def test_system_save_medicines_database_failed_write(tmp_path, monkeypatch):
+    system = System()
+    system.add_medicine(name='Ivermectin', manufacturer='polfarm',
+                        illnesses=['Illness1'], substances=['nicoTine'],
+                        recommended_age=0, doses=10, doses_left=10,
+                        expiration_date=date(2099, 12, 31), recipients=[])
+
+    class BrokenFile(StringIO):
+        def write(self, data):
+            raise OSError('No space left on device')
+    monkeypatch.setattr(medihelp.system, 'open_data_file', lambda path, mode: BrokenFile())
+    with raises(DataSavingError):
+        system.save_medicines_database(str(tmp_path / 'medicines.csv'))
+    assert system.medicines_file_saved() is False
+
+
+def test_system_save_medicines_database_changed_during_write(tmp_path, monkeypatch):
+    system = System()
+    id = system.add_medicine(name='Ivermectin', manufacturer='polfarm',
+                             illnesses=['Illness1'], substances=['nicoTine'],
+                             recommended_age=0, doses=10, doses_left=10,
+                             expiration_date=date(2099, 12, 31), recipients=[])
+    path = str(tmp_path / 'medicines.csv')
+    original_open = medihelp.system.open_data_file
+    changed = []
+
+    def open_and_change(path, mode):
+        # Another thread changes the database while the file is written
+        if not changed:
+            changed.append(id)
+            system.set_note(id, 0, 'Note')
+        return original_open(path, mode)
+    system.users_database().add_user(User(0, name='Dad', birth_date=date(1982, 7, 12)))
+    monkeypatch.setattr(medihelp.system, 'open_data_file', open_and_change)
+    system.save_medicines_database(path)
+    assert system.medicines_file_saved() is False
+    # The note was made after the snapshot was taken
+    loaded = System()
+    loaded.load_medicines_database_from(path)
+    assert loaded.medicines()[id].notes() == {}
+    system.save_medicines_database()
+    assert system.medicines_file_saved() is True
+
+
 def test_system_set_note_typical():
     user = User(0,
                 name='Dad',
@@ -802,3 +861,293 @@ def test_system_change_perscription_typical(monkeypatch):
                                dosage=2, weekday=1)
     presc_new = Prescription(id=0, medicine_name='new_name', dosage=2, weekday=1)
     assert system.users()[1].prescriptions()[0] == presc_new
+
+
+def test_system_take_dose_marks_medicine_dirty():
+    user = User(0, name='Dad', birth_date=date(1982, 7, 12))
+    system = System()
+    system.users_database().add_user(user)
+    id = system.add_medicine(name='Ivermectin', manufacturer='polfarm',
+                             illnesses=['Illness1'], substances=['nicoTine'],
+                             recommended_age=0, doses=10, doses_left=6,
+                             expiration_date=date(2099, 12, 31), recipients=[0])
+    system.medicines_database().write_to_file(StringIO())
+    assert not system.medicines_database().is_dirty(id)
+    system.take_dose(id, user)
+    assert system.medicines_database().is_dirty(id)
+    system.medicines_database().write_to_file(StringIO())
+    system.set_note(id, 0, 'Note')
+    assert system.medicines_database().is_dirty(id)
+
+
+def test_system_load_medicines_database_lazily_and_save(tmp_path):
+    path = tmp_path / 'medicines.csv'
+    path.write_text('''id,name,manufacturer,illnesses,recipients,substances,recommended_age,doses,doses_left,expiration_date,notes
+0,Ivermectin,Polfarm,{'cold'},"{0, 1}",{'caffeine'},0,10,6,2099-12-31,{}
+1,Paracetamol,Usdrugs,{'cold'},{0},{'weed'},12,5,5,2099-01-03,{}
+''', encoding='utf-8')
+    user = User(0, name='Dad', birth_date=date(1982, 7, 12))
+    system = System()
+    system.users_database().add_user(user)
+    system.load_medicines_database_from(str(path), lazy=True)
+    assert system.medicines_database().is_lazy()
+    system.take_dose(1, user)
+    system.save_medicines_database()
+    system.load_medicines_database_from(str(path))
+    assert not system.medicines_database().is_lazy()
+    assert system.medicines()[1].doses_left() == 4
+    assert system.medicines()[0].doses_left() == 6
+
+
+def test_system_change_listener():
+    changes = []
+    system = System()
+    system.add_change_listener(lambda kind, key: changes.append((kind, key)))
+    system.users_database().add_user(User(0, name='Dad', birth_date=date(1982, 7, 12)))
+    id = system.add_medicine(name='Ivermectin', manufacturer='polfarm',
+                             illnesses=['Illness1'], substances=['nicoTine'],
+                             recommended_age=0, doses=10, doses_left=6,
+                             expiration_date=date(2099, 12, 31), recipients=[0])
+    system.set_note(id, 0, 'Note')
+    system.del_medicine(id)
+    assert changes == [('medicine', id), ('medicine', id), ('medicine', id)]
+
+
+def test_system_prescription_index_maintained(monkeypatch):
+    # Very important, otherwise the test will override data/users.json file !!!
+    def fake_open(path, mode, *args, **kwargs):
+        return StringIO()
+    monkeypatch.setattr(builtins, 'open', fake_open)
+
+    user0 = User(id=1,
+                 name='Dad',
+                 birth_date=date(1982, 7, 12),
+                 prescriptions=[Prescription(id=0, medicine_name='med3', dosage=3, weekday=4)])
+    database = UsersDatabase()
+    database.add_user(user0)
+    system = System()
+    system._users_database = database
+
+    system.add_prescription(user_id=1, medicine_name='med1', dosage=1, weekday=4)
+    assert [p.medicine_name() for _, p in database.prescriptions_on(4)] == ['Med3', 'Med1']
+    system.change_prescription(user_id=1, prescription_id=0, medicine_name='med2', dosage=2, weekday=1)
+    assert [p.medicine_name() for _, p in database.prescriptions_on(4)] == ['Med1']
+    assert [p.medicine_name() for _, p in database.prescriptions_on(1)] == ['Med2']
+    assert database.prescriptions_of_medicine('med3') == []
+    system.change_user(user_id=1, name='Father', birth_date=date(1982, 7, 12),
+                       illnesses=[], allergies=[])
+    assert [user_id for user_id, _ in database.prescriptions_on(1)] == [1]
+    system.del_prescription(user_id=1, prescription_id=1)
+    assert database.prescriptions_on(4) == []
+    assert database.prescriptions_of_medicine('med1') == []
+
+
+def test_system_transaction_commit(monkeypatch):
+    # Very important, otherwise the test will override data/users.json file !!!
+    saves = []
+
+    def fake_open(path, mode, *args, **kwargs):
+        saves.append(path)
+        return StringIO()
+    monkeypatch.setattr(builtins, 'open', fake_open)
+
+    changes = []
+    system = System()
+    system.add_change_listener(lambda kind, key: changes.append((kind, key)))
+    system.users_database().add_user(User(0, name='Dad', birth_date=date(1982, 7, 12)))
+    with system.transaction():
+        id = system.add_medicine(name='Ivermectin', manufacturer='polfarm',
+                                 illnesses=['Illness1'], substances=['nicoTine'],
+                                 recommended_age=0, doses=10, doses_left=6,
+                                 expiration_date=date(2099, 12, 31), recipients=[0])
+        system.set_note(id, 0, 'Note')
+        system.add_prescription(user_id=0, medicine_name='Ivermectin', dosage=1, weekday=2)
+        system.add_prescription(user_id=0, medicine_name='Ivermectin', dosage=1, weekday=3)
+        assert changes == []
+        assert saves == []
+    assert changes == [('medicine', id), ('user', 0)]
+    assert len(saves) == 1
+    assert system.medicines()[id].note(0) == 'Note'
+    assert len(system.users()[0].prescriptions()) == 2
+
+
+def test_system_save_inside_transaction(empty_system, tmp_path):
+    system = empty_system
+    system.users_database().add_user(User(0, name='Dad', birth_date=date(1982, 7, 12)))
+    system.save_users_data()
+    id = system.add_medicine(name='Ivermectin', manufacturer='polfarm',
+                             illnesses=['Illness1'], substances=['nicoTine'],
+                             recommended_age=0, doses=10, doses_left=6,
+                             expiration_date=date(2099, 12, 31))
+    path = str(tmp_path / 'medicines.csv')
+    system.save_medicines_database(path)
+    with raises(UserDoesNotExistError):
+        with system.transaction():
+            system.set_note(id, 0, 'Rolled back')
+            with raises(TransactionInProgressError):
+                system.save_medicines_database()
+            with raises(TransactionInProgressError):
+                system.save_users_data()
+            raise UserDoesNotExistError(5)
+    assert system.medicines_file_saved()
+    other = System()
+    other.load_medicines_database_from(path)
+    assert other.medicines()[id].notes() == {}
+
+
+def test_system_transaction_rollback(monkeypatch):
+    # Very important, otherwise the test will override data/users.json file !!!
+    saves = []
+
+    def fake_open(path, mode, *args, **kwargs):
+        saves.append(path)
+        return StringIO()
+    monkeypatch.setattr(builtins, 'open', fake_open)
+
+    changes = []
+    system = System()
+    user = User(0, name='Dad', birth_date=date(1982, 7, 12),
+                prescriptions=[Prescription(id=0, medicine_name='med3', dosage=3, weekday=4)])
+    system.users_database().add_user(user)
+    id = system.add_medicine(name='Ivermectin', manufacturer='polfarm',
+                             illnesses=['Illness1'], substances=['nicoTine'],
+                             recommended_age=0, doses=10, doses_left=6,
+                             expiration_date=date(2099, 12, 31), recipients=[0],
+                             notes={0: 'Old note'})
+    system.save_medicines_database('medicines.csv')
+    saves.clear()
+    system.add_change_listener(lambda kind, key: changes.append((kind, key)))
+
+    with raises(UserDoesNotExistError):
+        with system.transaction():
+            system.take_dose(id, user)
+            system.set_note(id, 0, 'New note')
+            system.change_prescription(user_id=0, prescription_id=0, medicine_name='med1', dosage=1, weekday=1)
+            system.change_user(user_id=0, name='Father', birth_date=date(1982, 7, 12),
+                               illnesses=[], allergies=[])
+            system.del_medicine(id)
+            system.del_prescription(user_id=5, prescription_id=0)
+    assert changes == []
+    assert saves == []
+    assert system.medicines_file_saved()
+    assert system.medicines()[id].doses_left() == 6
+    assert system.medicines()[id].note(0) == 'Old note'
+    assert system.users()[0].name() == 'Dad'
+    assert system.users()[0].prescriptions()[0] == Prescription(id=0, medicine_name='med3', dosage=3, weekday=4)
+    assert system.users_database().prescriptions_on(1) == []
+
+
+def test_system_change_perscription_wrong_user():
+    system = System()
+    with raises(UserDoesNotExistError):
+        system.change_prescription(user_id=1, prescription_id=0, medicine_name='med1', dosage=1, weekday=1)
+
+
+def test_system_change_medicine_invalid_data_keeps_medicine():
+    system = System()
+    id = system.add_medicine(name='Ivermectin', manufacturer='polfarm',
+                             illnesses=['Illness1'], substances=['nicoTine'],
+                             recommended_age=0, doses=10, doses_left=6,
+                             expiration_date=date(2099, 12, 31), recipients=[0])
+    with raises(Exception):
+        system.change_medicine(medicine_id=id, name='Paracetamol', manufacturer='usdrugs',
+                               illnesses=['cold'], substances=['stuff'],
+                               recommended_age=12, doses=5, doses_left=-1,
+                               expiration_date=date(2099, 1, 3), recipients=[0])
+    assert system.medicines()[id].name() == 'Ivermectin'
+
+
+def test_system_undo_redo(monkeypatch):
+    # Very important, otherwise the test will override data/users.json file !!!
+    def fake_open(path, mode, *args, **kwargs):
+        return StringIO()
+    monkeypatch.setattr(builtins, 'open', fake_open)
+
+    changes = []
+    system = System()
+    user = User(0, name='Dad', birth_date=date(1982, 7, 12))
+    system.users_database().add_user(user)
+    system.add_change_listener(lambda kind, key: changes.append((kind, key)))
+    assert not system.can_undo()
+    assert not system.undo()
+
+    id = system.add_medicine(name='Ivermectin', manufacturer='polfarm',
+                             illnesses=['Illness1'], substances=['nicoTine'],
+                             recommended_age=0, doses=10, doses_left=6,
+                             expiration_date=date(2099, 12, 31), recipients=[0])
+    system.set_note(id, 0, 'Note')
+    system.take_dose(id, user)
+    with system.transaction():
+        system.add_prescription(user_id=0, medicine_name='Ivermectin', dosage=1, weekday=2)
+        system.change_user(user_id=0, name='Father', birth_date=date(1982, 7, 12),
+                           illnesses=[], allergies=[])
+    system.del_medicine(id)
+
+    assert system.undo()
+    assert system.medicines()[id].doses_left() == 5
+    assert system.undo()
+    assert system.users()[0].name() == 'Dad'
+    assert system.users()[0].prescriptions() == {}
+    assert system.undo()
+    assert system.medicines()[id].doses_left() == 6
+    assert system.undo()
+    assert system.medicines()[id].note(0) is None
+    changes.clear()
+    assert system.undo()
+    assert id not in system.medicines()
+    assert changes == [('medicine', id)]
+    assert not system.can_undo()
+
+    assert system.redo()
+    assert system.redo()
+    assert system.medicines()[id].note(0) == 'Note'
+    assert system.redo()
+    assert system.redo()
+    assert system.users()[0].name() == 'Father'
+    assert len(system.users()[0].prescriptions()) == 1
+    assert system.medicines()[id].doses_left() == 5
+
+    # A new change forgets undone transactions
+    system.undo()
+    assert system.can_redo()
+    system.del_note(id, 0)
+    assert not system.can_redo()
+
+
+def test_system_undo_redo_failed_replay_keeps_history(empty_system, tmp_path):
+    system = empty_system
+    system.users_database().add_user(User(0, name='Dad', birth_date=date(1982, 7, 12)))
+    system.save_users_data()
+    system.add_prescription(0, 'Apap', 1, 3)
+    # Users data can't be saved while users.json is a directory
+    (tmp_path / 'users.json').unlink()
+    (tmp_path / 'users.json').mkdir()
+    with raises(DataSavingError):
+        system.undo()
+    assert system.can_undo()
+    assert len(system.users()[0].prescriptions()) == 1
+
+    (tmp_path / 'users.json').rmdir()
+    assert system.undo()
+    assert system.users()[0].prescriptions() == {}
+    (tmp_path / 'users.json').unlink()
+    (tmp_path / 'users.json').mkdir()
+    with raises(DataSavingError):
+        system.redo()
+    assert system.can_redo()
+    assert system.users()[0].prescriptions() == {}
+
+
+def test_system_undo_depth():
+    system = System(undo_depth=2)
+    for number in range(3):
+        system.add_medicine(name='Ivermectin', manufacturer='polfarm',
+                            illnesses=['Illness1'], substances=['nicoTine'],
+                            recommended_age=0, doses=10, doses_left=6,
+                            expiration_date=date(2099, 12, 31))
+    assert system.undo()
+    assert system.undo()
+    assert not system.undo()
+    assert list(system.medicines().keys()) == [0]
+    system.set_undo_depth(5)
+    assert system.undo_depth() == 5
@@ -326,3 +326,14 @@ def test_user_age_no_birthday_this_year(monkeypatch):
     monkeypatch.setattr('medihelp.user.date', MockDate)
     user = User(0, name='Dad', birth_date=date(1980, 12, 7))
     assert user.age() == 43
+
+
+def test_user_copy():
+    user = User(0, name='Dad', birth_date=date(1982, 7, 12), illnesses=['cold'],
+                prescriptions=[Prescription(id=0, medicine_name='med3', dosage=3, weekday=4)])
+    copy = user.copy()
+    assert copy == user
+    copy.add_illness('flu')
+    copy.remove_prescription(0)
+    assert user.illnesses() == {'cold'}
+    assert 0 in user.prescriptions()
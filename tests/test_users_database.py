@@ -1,12 +1,14 @@
 from medihelp.users_database import UsersDatabase
 from medihelp.user import User
 from medihelp.prescription import Prescription
+from medihelp.serialization import user_to_dict
 from medihelp.errors import (MalformedDataError,
                              IdAlreadyInUseError,
                              NoSuchIdInTheDatabaseError)
 from datetime import date
 from io import StringIO
 from pytest import raises
+import json
 
 
 def test_users_database_create():
@@ -178,3 +180,115 @@ def test_users_database_read_from_file_malformed_data_attribute_missing():
     database = UsersDatabase()
     with raises(MalformedDataError):
         database.read_from_file(file)
+
+
+def test_users_database_prescription_index():
+    user0 = User(0,
+                 name='Dad',
+                 birth_date=date(1982, 7, 12),
+                 prescriptions=[Prescription(id=0, medicine_name='med3', dosage=3, weekday=4),
+                                Prescription(id=1, medicine_name='med1', dosage=1, weekday=1)])
+    user1 = User(1,
+                 name='Mom',
+                 birth_date=date(1985, 8, 4),
+                 prescriptions=[Prescription(id=0, medicine_name='med3', dosage=2, weekday=1)])
+
+    database = UsersDatabase()
+    database.add_user(user0)
+    database.add_user(user1)
+    assert database.prescriptions_on(1) == [(0, user0.prescriptions()[1]), (1, user1.prescriptions()[0])]
+    assert database.prescriptions_on(4) == [(0, user0.prescriptions()[0])]
+    assert database.prescriptions_on(7) == []
+    assert [user_id for user_id, _ in database.prescriptions_of_medicine('med3')] == [0, 1]
+
+    user1.add_prescription(Prescription(id=1, medicine_name='med2', dosage=1, weekday=4))
+    assert [user_id for user_id, _ in database.prescriptions_on(4)] == [0, 1]
+    user0.remove_prescription(0)
+    assert [user_id for user_id, _ in database.prescriptions_on(4)] == [1]
+    assert [user_id for user_id, _ in database.prescriptions_of_medicine('med3')] == [1]
+
+    database.delete_user(1)
+    assert database.prescriptions_on(4) == []
+    assert database.prescriptions_of_medicine('med3') == []
+    assert database.prescriptions_of_medicine('med2') == []
+    user1.add_prescription(Prescription(id=2, medicine_name='med2', dosage=1, weekday=4))
+    assert database.prescriptions_on(4) == []
+
+    database.clear()
+    assert database.prescriptions_on(1) == []
+
+
+def test_users_database_name_index_and_version():
+    user0 = User(0, name='Dad', birth_date=date(1982, 7, 12))
+    user1 = User(1, name='Mom', birth_date=date(1985, 8, 4))
+
+    database = UsersDatabase()
+    version = database.version()
+    database.add_user(user0)
+    database.add_user(user1)
+    assert database.version() > version
+    assert database.name_to_id() == {'Dad': 0, 'Mom': 1}
+    assert database.id_of('Mom') == 1
+    assert database.id_of('Son') is None
+    assert database.names_of([1, 0, 5], default='?') == ['Mom', 'Dad', '?']
+
+    # Changes of prescriptions don't invalidate data derived from users and their names
+    version = database.version()
+    prescriptions_version = database.prescriptions_version()
+    user1.add_prescription(Prescription(id=0, medicine_name='med3', dosage=3, weekday=4))
+    assert database.version() == version
+    assert database.prescriptions_version() > prescriptions_version
+
+    version = database.version()
+    database.delete_user(0)
+    assert database.version() > version
+    assert database.name_to_id() == {'Mom': 1}
+
+    database.clear()
+    assert database.name_to_id() == {}
+
+
+def test_users_database_snapshot_copy_on_write():
+    user0 = User(0, name='Dad', birth_date=date(1982, 7, 12),
+                 prescriptions=[Prescription(id=0, medicine_name='med3', dosage=3, weekday=4)])
+    database = UsersDatabase()
+    database.add_user(user0)
+    snapshot = database.snapshot()
+    assert database.snapshot() is snapshot
+
+    user = database.writable_user(0)
+    assert user is not user0
+    user.add_prescription(Prescription(id=1, medicine_name='med1', dosage=1, weekday=4))
+    database.add_user(User(1, name='Mom', birth_date=date(1985, 8, 4)))
+    assert list(snapshot[0].prescriptions().keys()) == [0]
+    assert 1 not in snapshot
+    # The copy keeps the prescription index up to date
+    assert [p.medicine_name() for _, p in database.prescriptions_on(4)] == ['Med3', 'Med1']
+    user0.add_prescription(Prescription(id=2, medicine_name='med2', dosage=1, weekday=5))
+    assert database.prescriptions_on(5) == []
+
+
+def test_users_database_write_to_file_cache():
+    database = UsersDatabase()
+    database.add_user(User(0, name='Dad', birth_date=date(1982, 7, 12), illnesses={'cold'},
+                           prescriptions=[Prescription(id=0, medicine_name='med1', dosage=1, weekday=2)]))
+    database.add_user(User(1, name='Mom', birth_date=date(1985, 8, 4)))
+
+    def written():
+        file = StringIO()
+        database.write_to_file(file)
+        expected = StringIO()
+        json.dump([user_to_dict(user) for user in database.users().values()], expected, indent=4)
+        assert file.getvalue() == expected.getvalue()
+        return file.getvalue()
+
+    written()
+    database.writable_user(0).add_prescription(Prescription(id=1, medicine_name='med2', dosage=2, weekday=7))
+    assert 'Med2' in written()
+    # Changed directly on the user object, without writable_user
+    database.users()[0].add_prescription(Prescription(id=2, medicine_name='med3', dosage=1, weekday=1))
+    assert 'Med3' in written()
+    database.delete_user(1)
+    assert 'Mom' not in written()
+    database.clear()
+    assert written() == '[]'
@@ -0,0 +1,183 @@
+from medihelp.watcher import FileWatcher
+from medihelp.system import System
+from medihelp.user import User
+from datetime import date
+from pytest import fixture
+import threading
+import os
+
+
+def add_medicine(system, name):
+    return system.add_medicine(name=name, manufacturer='polfarm',
+                               illnesses=['Illness1'], substances=['nicoTine'],
+                               recommended_age=0, doses=10, doses_left=6,
+                               expiration_date=date(2099, 12, 31), recipients=[0])
+
+
+def open_system(path):
+    system = System()
+    system.load_users_data(str(path / 'users.json'))
+    system.load_medicines_database_from(str(path / 'medicines.csv'))
+    return system
+
+
+def touch_later(path):
+    # Changes made within one tick of the file system clock are still noticed thanks to size and ctime,
+    #   but the time is moved forward to make the test independent of that
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+@fixture
+def data_dir(tmp_path, empty_system):
+    system = empty_system
+    system.users_database().add_user(User(0, name='Dad', birth_date=date(1982, 7, 12)))
+    system.save_users_data()
+    add_medicine(system, 'First')
+    add_medicine(system, 'Second')
+    system.save_medicines_database(str(tmp_path / 'medicines.csv'))
+    return tmp_path
+
+
+def test_watcher_merges_external_changes(data_dir):
+    system = open_system(data_dir)
+    watcher = FileWatcher(system)
+    assert watcher.check() == ([], [])
+
+    other = open_system(data_dir)
+    other.take_dose(0, other.users()[0])
+    other.del_medicine(1)
+    add_medicine(other, 'Third')
+    other.save_medicines_database()
+    touch_later(data_dir / 'medicines.csv')
+
+    changes = watcher.check()
+    assert sorted(changes.merged) == [('medicine', 0), ('medicine', 1)]
+    assert changes.conflicts == []
+    assert system.medicines()[0].doses_left() == 5
+    assert system.medicines()[1].name() == 'Third'
+    assert system.medicines_file_saved()
+    assert watcher.check() == ([], [])
+
+
+def test_watcher_ignores_own_saves(data_dir):
+    system = open_system(data_dir)
+    watcher = FileWatcher(system)
+    system.set_note(0, 0, 'Local')
+    system.save_medicines_database()
+    system.add_prescription(0, 'First', 1, 1)
+    assert watcher.check() == ([], [])
+
+
+def test_watcher_reports_conflicts(data_dir):
+    system = open_system(data_dir)
+    watcher = FileWatcher(system)
+    conflicts = []
+    watcher.add_conflict_listener(conflicts.append)
+    system.set_note(0, 0, 'Local')
+
+    other = open_system(data_dir)
+    other.set_note(0, 0, 'Remote')
+    other.set_note(1, 0, 'Remote')
+    other.save_medicines_database()
+    touch_later(data_dir / 'medicines.csv')
+
+    changes = watcher.check()
+    assert changes.merged == [('medicine', 1)]
+    assert changes.conflicts == [('medicine', 0)]
+    assert conflicts == [[('medicine', 0)]]
+    assert watcher.conflicts() == [('medicine', 0)]
+    # Local version is kept
+    assert system.medicines()[0].note(0) == 'Local'
+    assert system.medicines()[1].note(0) == 'Remote'
+
+
+def test_watcher_merges_users(data_dir):
+    system = open_system(data_dir)
+    watcher = FileWatcher(system)
+    other = open_system(data_dir)
+    other.users_database().add_user(User(1, name='Mom', birth_date=date(1984, 1, 2)))
+    other.add_prescription(0, 'First', 2, 3)
+    touch_later(data_dir / 'users.json')
+
+    changes = watcher.check()
+    assert sorted(changes.merged) == [('user', 0), ('user', 1)]
+    assert system.users()[1].name() == 'Mom'
+    assert system.users_database().prescriptions_on(3)[0][0] == 0
+    assert not system.can_undo()
+
+
+def test_watcher_truncated_file_removes_nothing(data_dir):
+    system = open_system(data_dir)
+    watcher = FileWatcher(system)
+    path = data_dir / 'medicines.csv'
+    content = path.read_bytes()
+    other = open_system(data_dir)
+    other.take_dose(0, other.users()[0])
+    other.save_medicines_database()
+    complete = path.read_bytes()
+    # File caught in the middle of the second row by a program which doesn't lock it
+    path.write_bytes(complete[:content.index(b'\n', content.index(b'\n') + 1) + 5])
+
+    changes = watcher.check()
+    assert changes.merged == [('medicine', 0)]
+    assert sorted(system.medicines()) == [0, 1]
+
+    path.write_bytes(complete)
+    assert watcher.check() == ([], [])
+    assert system.medicines()[0].doses_left() == 5
+    assert sorted(system.medicines()) == [0, 1]
+
+
+def test_watcher_change_made_during_check_is_not_lost(data_dir, monkeypatch):
+    system = open_system(data_dir)
+    watcher = FileWatcher(system)
+    other = open_system(data_dir)
+    other.set_note(0, 0, 'Remote')
+    other.save_medicines_database()
+    touch_later(data_dir / 'medicines.csv')
+
+    snapshot = system.medicines_snapshot
+    editors = []
+
+    def edit_while_comparing():
+        # Another thread (e.g. the server) changes the medicine right after the watcher looked at it
+        records = snapshot()
+        editor = threading.Thread(target=system.set_note, args=(0, 0, 'Local'))
+        editor.start()
+        editor.join(0.2)
+        editors.append(editor)
+        return records
+    monkeypatch.setattr(system, 'medicines_snapshot', edit_while_comparing)
+    assert watcher.check().merged == [('medicine', 0)]
+    editors[0].join()
+    assert system.medicines()[0].note(0) == 'Local'
+
+
+class FakeWidget:
+    def __init__(self):
+        self.timers = []
+
+    def after(self, ms, function):
+        self.timers.append((ms, function))
+        return len(self.timers) - 1
+
+
+def test_watcher_attach_checks_in_main_loop(data_dir):
+    system = open_system(data_dir)
+    watcher = FileWatcher(system)
+    merges = []
+    watcher.add_merge_listener(merges.append)
+    widget = FakeWidget()
+    watcher.attach(widget, 0.5)
+    assert widget.timers[0][0] == 500
+
+    other = open_system(data_dir)
+    other.set_note(0, 0, 'Remote')
+    other.save_medicines_database()
+    touch_later(data_dir / 'medicines.csv')
+    widget.timers[0][1]()
+    assert merges == [[('medicine', 0)]]
+    assert system.medicines()[0].note(0) == 'Remote'
+    # Timer is armed again for the next check
+    assert len(widget.timers) == 2